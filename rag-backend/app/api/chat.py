@@ -1,17 +1,67 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from typing import AsyncGenerator
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from app.schemas.chat import ChatRequest
 from app.services.chat_service import ChatService
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# How often an open stream checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def _cancel_on_disconnect(request: Request, events: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """
+    Relay events until the client disconnects, then cancel the pending step so
+    the upstream embedding or generation call is dropped instead of finishing
+    for nobody
+    """
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if step not in done:
+                logger.info("Chat client disconnected, cancelling generation")
+                return
+            try:
+                yield step.result()
+            except StopAsyncIteration:
+                return
+    finally:
+        watcher.cancel()
+        # The generator can only be closed once the step running it has stopped
+        if step is not None and not step.done():
+            step.cancel()
+            await asyncio.wait({step})
+        await events.aclose()
+
 
 @router.post("/chat/stream")
-def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """
     流式问答接口
     返回 JSON Lines 格式的数据流
+    stream_mode=delta 时 answer 事件只包含新增文本，completed 事件包含完整回答
+    客户端断开连接后立即取消上游调用
+    doc_id / doc_ids 限定检索范围，threshold 过滤相似度过低的片段
     """
+    doc_ids = request.doc_ids or ([request.doc_id] if request.doc_id else None)
     return StreamingResponse(
-        ChatService.chat_stream(request.question, request.top_k),
+        _cancel_on_disconnect(
+            http_request,
+            ChatService.chat_stream(
+                request.question, request.top_k, request.stream_mode, doc_ids, request.threshold
+            )
+        ),
         media_type="application/x-ndjson"
     )
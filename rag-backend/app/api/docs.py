@@ -1,20 +1,20 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query, BackgroundTasks
 from fastapi.responses import FileResponse
-from app.services.doc_service import DocService
-from app.schemas.doc import UploadResponse, DocListResponse
+from app.services.doc_service import DocService, SUPPORTED_EXTS
+from app.schemas.doc import UploadResponse, BulkUploadResponse, DocListResponse
 
 router = APIRouter()
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_document(file: UploadFile = File(...)):
     """
-    文档上传与解析接口
+    文档上传接口 (立即返回任务ID，解析与向量化在后台执行)
     """
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
     
     # Simple extension check
-    allowed_exts = [".pdf", ".docx", ".doc", ".md", ".markdown", ".txt"]
+    allowed_exts = list(SUPPORTED_EXTS)
     import os
     ext = os.path.splitext(file.filename)[1].lower()
     if ext not in allowed_exts:
@@ -22,6 +22,14 @@ async def upload_document(file: UploadFile = File(...)):
 
     return await DocService.process_doc(file)
 
+@router.post("/upload/bulk", response_model=BulkUploadResponse)
+async def upload_documents(files: list[UploadFile] = File(...)):
+    """
+    批量上传接口 (支持多个文件及 zip/tar 压缩包，作为一个任务处理，所有分块一次写入索引；
+    各文件结果见 /api/jobs/{job_id} 的 files 字段)
+    """
+    return await DocService.process_bulk(files)
+
 @router.get("/docs/list", response_model=DocListResponse)
 async def list_documents(
     page: int = Query(1, ge=1, description="Page number"),
@@ -34,7 +42,7 @@ async def list_documents(
     return DocService.get_doc_list(page=page, size=size, keyword=keyword)
 
 @router.post("/docs/reindex/{doc_id}")
-async def reindex_document(doc_id: str):
+def reindex_document(doc_id: str):
     """
     重新索引指定文档
     """
@@ -43,11 +51,30 @@ async def reindex_document(doc_id: str):
         raise HTTPException(status_code=500, detail="Reindexing failed")
     return {"status": "success", "message": "Document reindexed"}
 
+@router.post("/docs/rebuild")
+async def rebuild_index():
+    """
+    全量重建向量索引 (修复用途，会重新向量化所有文档；中断后再次调用会从检查点继续)
+    """
+    if not DocService.schedule_rebuild():
+        return {"status": "success", "message": "Index rebuild already running"}
+    return {"status": "success", "message": "Index rebuild scheduled"}
+
+@router.get("/docs/rebuild")
+def get_rebuild_status():
+    """
+    查询全量重建进度 (state: idle | running | swapping | completed | failed | interrupted)
+    """
+    return DocService.rebuild_status()
+
 @router.get("/docs/content/{doc_id}")
-async def get_doc_content(doc_id: str):
-    """Get parsed content of a document"""
-    content = DocService.get_doc_content(doc_id)
-    return {"content": content}
+def get_doc_content(
+    doc_id: str,
+    offset: int = Query(0, ge=0, description="Start character offset"),
+    limit: int = Query(100000, ge=1, le=1000000, description="Max characters to return")
+):
+    """Get parsed content of a document (paged by character offset)"""
+    return DocService.get_doc_content(doc_id, offset=offset, limit=limit)
 
 @router.get("/docs/file/{doc_id}")
 async def get_doc_file(doc_id: str):
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+from app.schemas.job import JobStatus
+from app.services.job_service import JobService
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    查询文档处理任务进度 (阶段、分块数量、各阶段耗时)
+    任务只保存在创建它的 worker 进程内存中，多进程部署时需要会话保持；文档状态始终可通过文档列表查询
+    """
+    job = JobService.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -12,21 +12,82 @@ class Settings(BaseSettings):
     # Storage
     UPLOAD_DIR: str = "data/docs"
     VECTOR_DB_DIR: str = "data/vector_db"
+    PARSED_DIR: str = "data/parsed"
+    DOC_REGISTRY_PATH: str = "data/registry.sqlite"
     
     # Model (Alibaba)
     DASHSCOPE_API_KEY: Optional[str] = None
     EMBEDDING_MODEL: str = "text-embedding-v1"
     LLM_MODEL: str = "qwen-turbo"
+    LLM_CONTEXT_WINDOW: int = 8192  # tokens the model accepts, prompt plus answer
+    LLM_MAX_OUTPUT_TOKENS: int = 1500  # reserved for (and capping) the answer
+    MODEL_PROVIDER: str = "dashscope"  # dashscope | local (offline stand-ins for benchmarks and development)
+    LOCAL_EMBEDDING_DIM: int = 1536
+    LOCAL_TOKEN_DELAY_MS: float = 0.0  # simulated generation latency per streamed chunk
+    LOCAL_PREFILL_MS_PER_1K_TOKENS: float = 0.0  # simulated prompt processing before the first chunk
+    
+    # Embedding Pipeline
+    EMBEDDING_BATCH_SIZE: int = 25
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_RATE_LIMIT: float = 10.0  # requests per second, 0 disables
+    EMBEDDING_MAX_RETRIES: int = 3
+    
+    # Embedding Cache
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    
+    # Query Embedding Cache
+    QUERY_CACHE_MAX_ENTRIES: int = 1024
+    QUERY_CACHE_TTL: int = 3600  # seconds
+    QUERY_BATCH_WINDOW_MS: float = 5.0  # wait for concurrent misses to share one request
+    
+    # Answer Cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 512
+    ANSWER_CACHE_TTL: int = 3600  # seconds
+    ANSWER_CACHE_SIMILARITY: float = 0.97  # min cosine similarity of the questions to reuse an answer
+    
+    # Ingestion
+    INGEST_WORKERS: int = 2
+    PARSE_WORKERS: int = 2
+    UPLOAD_SYNC_INTERVAL: int = 300  # seconds between full upload dir reconciliations
+    AUTO_INDEX_NEW_FILES: bool = False  # index files dropped into UPLOAD_DIR directly
+    BULK_MAX_FILES: int = 1000  # documents taken from one bulk upload, archives included
+    BULK_MAX_FILE_MB: int = 100  # largest document taken from a bulk upload (archive entries unpacked)
+    BULK_MAX_TOTAL_MB: int = 1024  # unpacked size of all documents of one bulk upload
+    REBUILD_BATCH_SIZE: int = 256  # chunks embedded and staged at a time by a full rebuild
+    REBUILD_CHECKPOINT_INTERVAL: int = 30  # seconds between rebuild progress checkpoints
     
     # RAG
     CHUNK_SIZE: int = 500
     CHUNK_OVERLAP: int = 50
     TOP_K: int = 3
-    SIMILARITY_THRESHOLD: float = 0.7
+    SIMILARITY_THRESHOLD: float = 0.6  # minimum cosine similarity of a retrieved chunk
+    CONTEXT_MAX_TOKENS: int = 3000  # estimated tokens of retrieved text put into the prompt
+    CONTEXT_DEDUP_THRESHOLD: float = 0.9  # share of a passage found in a better one that makes it a duplicate
+    SEARCH_WORKERS: int = 4  # threads for vector search off the event loop
+    
+    # Vector Index
+    INDEX_TYPE: str = "flat"  # flat | ivf_flat | ivf_pq | hnsw
+    INDEX_MIN_VECTORS: int = 10000  # exact Flat below this many vectors
+    INDEX_NLIST: int = 1024
+    INDEX_NPROBE: int = 16
+    INDEX_PQ_M: int = 16
+    INDEX_PQ_NBITS: int = 8
+    INDEX_HNSW_M: int = 32
+    INDEX_EF_CONSTRUCTION: int = 40
+    INDEX_EF_SEARCH: int = 64
+    SHARD_MAX_VECTORS: int = 50000  # a new shard is opened once the active one is this full
+    SHARD_SEARCH_WORKERS: int = 4  # threads searching shards in parallel
+    SNAPSHOTS_RETAINED: int = 3  # index snapshots kept for readers before garbage collection
 
     class Config:
         env_file = ".env"
 
+    def model_ready(self) -> bool:
+        """Whether embeddings and generation can run: local stand-ins or a DashScope key"""
+        return self.MODEL_PROVIDER == "local" or bool(self.DASHSCOPE_API_KEY)
+
     @classmethod
     def load_from_yaml(cls, path: str = "config/app.yaml"):
         if os.path.exists(path):
@@ -37,13 +98,96 @@ class Settings(BaseSettings):
                 settings_dict = {}
                 if "model" in config_data:
                     model_conf = config_data["model"]
+                    if "provider" in model_conf:
+                        settings_dict["MODEL_PROVIDER"] = model_conf["provider"]
+                    local_conf = model_conf.get("local") or {}
+                    for key, field in [("embedding_dim", "LOCAL_EMBEDDING_DIM"),
+                                       ("token_delay_ms", "LOCAL_TOKEN_DELAY_MS"),
+                                       ("prefill_ms_per_1k_tokens", "LOCAL_PREFILL_MS_PER_1K_TOKENS")]:
+                        if key in local_conf:
+                            settings_dict[field] = local_conf[key]
                     if "embedding" in model_conf:
-                        settings_dict["EMBEDDING_MODEL"] = model_conf["embedding"].get("model_name")
+                        embedding_conf = model_conf["embedding"]
+                        settings_dict["EMBEDDING_MODEL"] = embedding_conf.get("model_name")
+                        for key, field in [("batch_size", "EMBEDDING_BATCH_SIZE"),
+                                           ("concurrency", "EMBEDDING_CONCURRENCY"),
+                                           ("rate_limit", "EMBEDDING_RATE_LIMIT"),
+                                           ("max_retries", "EMBEDDING_MAX_RETRIES")]:
+                            if key in embedding_conf:
+                                settings_dict[field] = embedding_conf[key]
                     if "llm" in model_conf:
                         settings_dict["LLM_MODEL"] = model_conf["llm"].get("model_name")
+                        for key, field in [("context_window", "LLM_CONTEXT_WINDOW"),
+                                           ("max_output_tokens", "LLM_MAX_OUTPUT_TOKENS")]:
+                            if key in model_conf["llm"]:
+                                settings_dict[field] = model_conf["llm"][key]
                 
                 if "vector_db" in config_data:
                     settings_dict["VECTOR_DB_DIR"] = config_data["vector_db"].get("path")
+                    if "similarity_threshold" in config_data["vector_db"]:
+                        settings_dict["SIMILARITY_THRESHOLD"] = config_data["vector_db"]["similarity_threshold"]
+                    for key, field in [("search_workers", "SEARCH_WORKERS"),
+                                       ("shard_max_vectors", "SHARD_MAX_VECTORS"),
+                                       ("shard_search_workers", "SHARD_SEARCH_WORKERS"),
+                                       ("snapshots_retained", "SNAPSHOTS_RETAINED")]:
+                        if key in config_data["vector_db"]:
+                            settings_dict[field] = config_data["vector_db"][key]
+                    index_conf = config_data["vector_db"].get("index") or {}
+                    for key, field in [("type", "INDEX_TYPE"),
+                                       ("min_vectors", "INDEX_MIN_VECTORS"),
+                                       ("nlist", "INDEX_NLIST"),
+                                       ("nprobe", "INDEX_NPROBE"),
+                                       ("pq_m", "INDEX_PQ_M"),
+                                       ("pq_nbits", "INDEX_PQ_NBITS"),
+                                       ("hnsw_m", "INDEX_HNSW_M"),
+                                       ("ef_construction", "INDEX_EF_CONSTRUCTION"),
+                                       ("ef_search", "INDEX_EF_SEARCH")]:
+                        if key in index_conf:
+                            settings_dict[field] = index_conf[key]
+                
+                if "embedding_cache" in config_data:
+                    for key, field in [("path", "EMBEDDING_CACHE_PATH"),
+                                       ("max_entries", "EMBEDDING_CACHE_MAX_ENTRIES")]:
+                        if key in config_data["embedding_cache"]:
+                            settings_dict[field] = config_data["embedding_cache"][key]
+                
+                if "query_cache" in config_data:
+                    for key, field in [("max_entries", "QUERY_CACHE_MAX_ENTRIES"),
+                                       ("ttl", "QUERY_CACHE_TTL"),
+                                       ("batch_window_ms", "QUERY_BATCH_WINDOW_MS")]:
+                        if key in config_data["query_cache"]:
+                            settings_dict[field] = config_data["query_cache"][key]
+                
+                if "answer_cache" in config_data:
+                    for key, field in [("enabled", "ANSWER_CACHE_ENABLED"),
+                                       ("max_entries", "ANSWER_CACHE_MAX_ENTRIES"),
+                                       ("ttl", "ANSWER_CACHE_TTL"),
+                                       ("similarity", "ANSWER_CACHE_SIMILARITY")]:
+                        if key in config_data["answer_cache"]:
+                            settings_dict[field] = config_data["answer_cache"][key]
+                
+                if "ingest" in config_data:
+                    for key, field in [("workers", "INGEST_WORKERS"),
+                                       ("parse_workers", "PARSE_WORKERS"),
+                                       ("sync_interval", "UPLOAD_SYNC_INTERVAL"),
+                                       ("auto_index", "AUTO_INDEX_NEW_FILES"),
+                                       ("bulk_max_files", "BULK_MAX_FILES"),
+                                       ("bulk_max_file_mb", "BULK_MAX_FILE_MB"),
+                                       ("bulk_max_total_mb", "BULK_MAX_TOTAL_MB")]:
+                        if key in config_data["ingest"]:
+                            settings_dict[field] = config_data["ingest"][key]
+                
+                if "rebuild" in config_data:
+                    for key, field in [("batch_size", "REBUILD_BATCH_SIZE"),
+                                       ("checkpoint_interval", "REBUILD_CHECKPOINT_INTERVAL")]:
+                        if key in config_data["rebuild"]:
+                            settings_dict[field] = config_data["rebuild"][key]
+                
+                if "context" in config_data:
+                    for key, field in [("max_tokens", "CONTEXT_MAX_TOKENS"),
+                                       ("dedup_threshold", "CONTEXT_DEDUP_THRESHOLD")]:
+                        if key in config_data["context"]:
+                            settings_dict[field] = config_data["context"][key]
                 
                 if "splitter" in config_data:
                     settings_dict["CHUNK_SIZE"] = config_data["splitter"].get("chunk_size")
@@ -0,0 +1,183 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Metric:
+    """
+    One metric family in the Prometheus text exposition format, keyed by label
+    values. Thread-safe; rendered by MetricsRegistry.render().
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: Optional[tuple] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a running total kept elsewhere (e.g. cache statistics)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [cumulative bucket counts, sum, count]
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{self._labels(key, ('le', repr(float(bound))))} {n}")
+                lines.append(f"{self.name}_bucket{self._labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+                lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metric families; collectors refresh mirrored values right before a scrape"""
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_duration_seconds", "Duration of one pipeline stage", ("pipeline", "stage")
+))
+CHAT_REQUESTS = REGISTRY.register(Counter(
+    "rag_chat_requests_total", "Chat requests by outcome", ("outcome",)
+))
+CHAT_STREAMS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "rag_chat_streams_in_flight", "Chat answers currently streaming"
+))
+CHUNKS_EMBEDDED = REGISTRY.register(Counter(
+    "rag_chunks_embedded_total", "Chunks embedded and written to the index", ("pipeline",)
+))
+DOCS_INGESTED = REGISTRY.register(Counter(
+    "rag_docs_ingested_total", "Ingestion jobs by outcome", ("outcome",)
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "rag_cache_lookups_total", "Embedding, query and answer cache lookups", ("cache", "result")
+))
+INDEX_VECTORS = REGISTRY.register(Gauge(
+    "rag_index_vectors", "Vectors in the current index snapshot"
+))
+INDEX_SHARDS = REGISTRY.register(Gauge(
+    "rag_index_shards", "Shards in the current index snapshot"
+))
+INDEX_SNAPSHOT = REGISTRY.register(Gauge(
+    "rag_index_snapshot", "Version of the current index snapshot"
+))
+
+
+class StageTimer:
+    """
+    Times the stages of one pipeline run: each stage is observed in
+    STAGE_SECONDS and kept (in milliseconds) for the caller to report.
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.start = time.perf_counter()
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = round(seconds * 1000, 1)
+        STAGE_SECONDS.observe(seconds, pipeline=self.pipeline, stage=name)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
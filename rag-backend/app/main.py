@@ -1,13 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import docs, chat
+from app.api import docs, chat, jobs
 from app.core.config import get_settings
+from app.core.metrics import REGISTRY, CACHE_LOOKUPS, INDEX_VECTORS, INDEX_SHARDS, INDEX_SNAPSHOT
+from app.services.job_service import JobService
+from app.services.chat_service import ChatService
+from app.services.doc_service import DocService
+from app.services.dashscope_async import DashScopeAsync
+from app.services.vector_store import VectorStoreManager
+from app.services.answer_cache import get_answer_cache
+from app.services.upload_watcher import UploadWatcher
 
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    UploadWatcher.start()
+    DocService.resume_rebuild()
+    DocService.resume_ingestion()
+    yield
+    UploadWatcher.stop()
+    JobService.shutdown()
+    ChatService.shutdown()
+    VectorStoreManager.shutdown()
+    await DashScopeAsync.aclose()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS
@@ -23,6 +46,7 @@ app.add_middleware(
 # Mount under /api
 app.include_router(docs.router, prefix="/api", tags=["docs"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
 
 @app.get("/api/status")
 async def get_system_status():
@@ -30,13 +54,42 @@ async def get_system_status():
     Check system readiness status
     """
     from app.core.config import get_settings
+    from app.services.doc_service import DocService
+    from app.services.doc_registry import DocRegistry
     settings = get_settings()
     
     return {
-        "is_model_ready": bool(settings.DASHSCOPE_API_KEY),
-        "api_key_configured": bool(settings.DASHSCOPE_API_KEY)
+        "is_model_ready": settings.model_ready(),
+        "model_provider": settings.MODEL_PROVIDER,
+        "api_key_configured": bool(settings.DASHSCOPE_API_KEY),
+        "embedding_cache": VectorStoreManager.get_embedding_cache().stats(),
+        "query_cache": VectorStoreManager.get_query_embedder().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "vector_store": VectorStoreManager.stats(),
+        "dedup": {"hits": DocService.dedup_hits, **DocRegistry.dedup_stats()}
     }
 
+def _collect_metrics():
+    """Mirror the caches' and the index's own counters into the registry"""
+    stats = VectorStoreManager.stats()
+    INDEX_VECTORS.set(stats["vectors"])
+    INDEX_SHARDS.set(len(stats["shards"]))
+    INDEX_SNAPSHOT.set(stats["snapshot"])
+    for cache, cache_stats in (("embedding", VectorStoreManager.get_embedding_cache().stats()),
+                               ("query", VectorStoreManager.get_query_embedder().stats()),
+                               ("answer", get_answer_cache().stats())):
+        CACHE_LOOKUPS.set_total(cache_stats["hits"], cache=cache, result="hit")
+        CACHE_LOOKUPS.set_total(cache_stats["misses"], cache=cache, result="miss")
+
+REGISTRY.add_collector(_collect_metrics)
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus metrics: stage latencies, chunks embedded, cache hits, index size, in-flight streams
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     return {"message": "RAG Backend Service is running"}
@@ -1,11 +1,16 @@
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 class ChatRequest(BaseModel):
     question: str
     doc_id: Optional[str] = None
+    # Restrict retrieval to these documents (doc_id is shorthand for one)
+    doc_ids: Optional[List[str]] = None
     top_k: Optional[int] = 3
-    threshold: Optional[float] = 0.5
+    # Minimum cosine similarity of a retrieved chunk; defaults to vector_db.similarity_threshold
+    threshold: Optional[float] = None
+    # "delta": answer events carry only new text; "full": the whole answer so far
+    stream_mode: Literal["delta", "full"] = "delta"
     
 class ChatResponse(BaseModel):
     answer: str
@@ -4,7 +4,15 @@ from typing import Optional
 class UploadResponse(BaseModel):
     status: str
     doc_id: str
-    length: int
+    length: Optional[int] = None
+    job_id: Optional[str] = None
+    message: Optional[str] = None
+
+class BulkUploadResponse(BaseModel):
+    status: str
+    job_id: Optional[str] = None
+    accepted: int = 0
+    rejected: list[str] = []
     message: Optional[str] = None
 
 class DocItem(BaseModel):
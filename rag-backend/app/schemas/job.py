@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List
+
+class FileResult(BaseModel):
+    """Outcome of one file of a bulk upload"""
+    name: str
+    doc_id: Optional[str] = None
+    status: str  # indexed / parsed / linked / skipped / failed / cancelled
+    chunks: int = 0
+    error: Optional[str] = None
+
+class JobStatus(BaseModel):
+    id: str
+    doc_id: Optional[str] = None  # unset for bulk uploads, see files
+    name: str
+    status: str = "pending"  # pending / running / completed / failed / cancelled
+    stage: str = "queued"    # queued / extracting / parsing / embedding / completed / failed / cancelled
+    chunks_total: int = 0
+    chunks_indexed: int = 0
+    error: Optional[str] = None
+    timings: Dict[str, float] = Field(default_factory=dict)  # seconds per stage
+    files: List[FileResult] = Field(default_factory=list)  # per-file results of a bulk upload
+    created_at: float
+    finished_at: Optional[float] = None
@@ -0,0 +1,154 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Optional
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    In-process LRU/TTL cache of generated answers.
+
+    An answer is reused for a question whose embedding is within `similarity`
+    (cosine) of the cached question's, provided the search returned the same
+    chunks in the same order and the same LLM model would answer it, so the
+    prompt would carry the same context. Chunks are identified together with
+    their vector IDs, which change whenever a chunk is rewritten, so an answer
+    stops matching once any worker process reindexes a document it drew on; the
+    process doing the write also drops such entries right away (invalidate_docs).
+    Shared by the event loop and the ingestion threads, hence the lock.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, similarity: float = 0.97):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped by every invalidation; answers generated across one are not stored
+        self.version = 0
+        self._next_id = 0
+        # Entry ID -> entry, least recently used first
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        # (model, chunk IDs) -> IDs of the entries answering from that context
+        self._by_key: dict[tuple, list[int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: list[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, vector: list[float], chunk_ids: list[str], model: str) -> Optional[dict]:
+        """The cached entry ({"parts", "context", ...}) answering a near-identical question, or None"""
+        query = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            best, best_similarity = None, self.similarity
+            for entry_id in list(self._by_key.get((model, tuple(chunk_ids)), ())):
+                entry = self._entries[entry_id]
+                if now - entry["created"] >= self.ttl:
+                    self._remove(entry_id)
+                    continue
+                similarity = float(np.dot(query, entry["vector"]))
+                if similarity >= best_similarity:
+                    best, best_similarity = entry_id, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best]
+
+    def put(
+        self,
+        vector: list[float],
+        chunk_ids: list[str],
+        model: str,
+        doc_ids: Iterable[str],
+        parts: list[str],
+        context: dict,
+        version: int
+    ):
+        """
+        Store an answer generated from the given chunks. `version` is the cache
+        version read before retrieval; if documents were invalidated since, the
+        answer may rest on stale chunks and is not stored.
+        """
+        key = (model, tuple(chunk_ids))
+        query = self._unit(vector)
+        with self._lock:
+            if version != self.version:
+                return
+            # A near-identical question already cached for this context is replaced
+            for entry_id in list(self._by_key.get(key, ())):
+                if float(np.dot(query, self._entries[entry_id]["vector"])) >= self.similarity:
+                    self._remove(entry_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "key": key,
+                "vector": query,
+                "doc_ids": frozenset(doc_ids),
+                "parts": list(parts),
+                "context": context,
+                "created": time.monotonic()
+            }
+            self._by_key.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_docs(self, doc_ids: Iterable[str]):
+        """Drop every answer drawing on any of these (source) documents"""
+        doc_ids = set(doc_ids)
+        with self._lock:
+            self.version += 1
+            stale = [entry_id for entry_id, entry in self._entries.items() if entry["doc_ids"] & doc_ids]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers for documents {sorted(doc_ids)}")
+
+    def clear(self):
+        """Drop every answer, e.g. once a full rebuild has re-chunked all documents"""
+        with self._lock:
+            self.version += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_key.clear()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        siblings = self._by_key[entry["key"]]
+        siblings.remove(entry_id)
+        if not siblings:
+            del self._by_key[entry["key"]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+@lru_cache()
+def get_answer_cache() -> AnswerCache:
+    return AnswerCache(
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+        ttl=settings.ANSWER_CACHE_TTL,
+        similarity=settings.ANSWER_CACHE_SIMILARITY
+    )
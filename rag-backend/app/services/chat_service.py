@@ -1,131 +1,258 @@
 import json
+import time
+import asyncio
 import logging
-import os
-from typing import Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, Optional
 from app.core.config import get_settings
-from langchain_community.embeddings import DashScopeEmbeddings
-from langchain_community.vectorstores import FAISS
-from dashscope import Generation
+from app.core.metrics import StageTimer, CHAT_REQUESTS, CHAT_STREAMS_IN_FLIGHT
+from app.services.vector_store import VectorStoreManager
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.context_builder import ContextBuilder
+from app.services.answer_cache import get_answer_cache
+from app.services.local_models import LocalGeneration
+from dashscope import AioGeneration
 from http import HTTPStatus
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
 class ChatService:
+    # FAISS search is CPU-bound; a small dedicated pool keeps it off the event
+    # loop without letting searches crowd out the default threadpool
+    _search_executor: Optional[ThreadPoolExecutor] = None
+    _local_generation: Optional[LocalGeneration] = None
+
+    @classmethod
+    def search_executor(cls) -> ThreadPoolExecutor:
+        if cls._search_executor is None:
+            cls._search_executor = ThreadPoolExecutor(
+                max_workers=settings.SEARCH_WORKERS, thread_name_prefix="search"
+            )
+        return cls._search_executor
+
+    @classmethod
+    def shutdown(cls):
+        if cls._search_executor is not None:
+            cls._search_executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def generation(cls):
+        """Streaming generation provider: DashScope, or the offline stand-in (configured once)"""
+        if settings.MODEL_PROVIDER == "local":
+            if cls._local_generation is None:
+                cls._local_generation = LocalGeneration(
+                    token_delay=settings.LOCAL_TOKEN_DELAY_MS / 1000,
+                    prefill_delay=settings.LOCAL_PREFILL_MS_PER_1K_TOKENS / 1000
+                )
+            return cls._local_generation
+        return AioGeneration
+
+    @staticmethod
+    def similarity(distance: float) -> float:
+        """Cosine similarity from a squared L2 distance (embeddings are unit-normalized)"""
+        return 1.0 - distance / 2.0
+
     @staticmethod
-    def chat_stream(question: str, top_k: int = 3) -> Generator[str, None, None]:
+    async def chat_stream(
+        question: str,
+        top_k: int = 3,
+        stream_mode: str = "delta",
+        doc_ids: Optional[list[str]] = None,
+        threshold: Optional[float] = None
+    ) -> AsyncGenerator[str, None]:
         """
         Streaming chat generation with RAG
+        With doc_ids, only those documents' chunks are searched; hits less similar
+        than threshold (default SIMILARITY_THRESHOLD) are dropped before prompting.
+        In "delta" mode each answer event carries only the newly generated text and
+        the completed event carries the full answer; "full" mode resends the answer
+        so far in every answer event.
+        A question near-identical to an earlier one that retrieves the same chunks
+        is answered from the answer cache: the stored answer is replayed through
+        the same events without calling the model, and "cached" is true.
+        Nothing here blocks the event loop: loading the index, registry queries and
+        searches run in the search executor. Cancelling the consuming task stops
+        the upstream embedding or generation call it is waiting on.
         Yields JSON strings:
         - {"step": "init", "message": "..."}
         - {"step": "retrieving", "message": "..."}
         - {"step": "retrieved", "data": [...], "message": "..."}
         - {"step": "generating", "message": "..."}
         - {"step": "answer", "data": "...", "done": False}
-        - {"step": "completed", "message": "...", "done": True}
+        - {"step": "completed", "message": "...", "data": "<full answer>", "done": True,
+           "timings": {"load": ms, "query_embed": ms, "search": ms, "first_token": ms, ...},
+           "context": {"chunks": n, "passages": n, "tokens": estimated prompt tokens},
+           "cached": bool}
         - {"step": "error", "message": "..."}
+        Stage timings are also exported as metrics; first_token and total are
+        measured from the start of the request, the others per stage.
         """
-        # Step 1: Initialize
-        yield json.dumps({"step": "init", "message": "正在初始化问答服务..."}) + "\n"
-        
+        timer = StageTimer("chat")
+        # Stays "cancelled" if the client goes away before an outcome is reached
+        outcome = "cancelled"
+        CHAT_STREAMS_IN_FLIGHT.inc()
         try:
+            # Step 1: Initialize
+            yield json.dumps({"step": "init", "message": "正在初始化问答服务..."}) + "\n"
+
             # Step 2: Load Vector Store
             yield json.dumps({"step": "retrieving", "message": "正在加载知识库..."}) + "\n"
             
-            if not settings.DASHSCOPE_API_KEY:
+            if not settings.model_ready():
+                outcome = "unavailable"
                 yield json.dumps({"step": "error", "message": "未配置API Key"}) + "\n"
                 return
 
-            # Check if vector db exists
-            if not os.path.exists(settings.VECTOR_DB_DIR) or not os.listdir(settings.VECTOR_DB_DIR):
-                 # Auto-rebuild check
-                 from app.services.doc_service import DocService, DOCS_METADATA
-                 indexed_docs = [d for d in DOCS_METADATA if d.get("status") == "已索引"]
-                 
-                 if indexed_docs:
-                     yield json.dumps({"step": "retrieving", "message": "检测到索引丢失，正在尝试重建..."}) + "\n"
-                     try:
-                         # Trigger sync rebuild for immediate use
-                         # Note: Rebuild might be slow, but better than error
-                         # For this specific flow, we'll try to rebuild in-place or fail
-                         DocService.rebuild_index() 
-                         
-                         if not os.path.exists(settings.VECTOR_DB_DIR) or not os.listdir(settings.VECTOR_DB_DIR):
-                             yield json.dumps({"step": "error", "message": "知识库重建失败，请重新上传文档"}) + "\n"
-                             return
-                     except Exception as e:
-                         yield json.dumps({"step": "error", "message": f"重建索引异常: {e}"}) + "\n"
-                         return
-                 else:
-                     yield json.dumps({"step": "error", "message": "知识库为空，请先上传文档"}) + "\n"
-                     return
-
-            embeddings = DashScopeEmbeddings(
-                model=settings.EMBEDDING_MODEL,
-                dashscope_api_key=settings.DASHSCOPE_API_KEY
-            )
-            
-            try:
-                # Allow dangerous deserialization as we trust our own data
-                vector_store = FAISS.load_local(
-                    settings.VECTOR_DB_DIR, 
-                    embeddings,
-                    allow_dangerous_deserialization=True
+            # The store is loaded once per process; keep this reference for the
+            # whole request so a concurrent index swap never affects it. Loading
+            # (or reloading a new snapshot) reads from disk, so it runs off the loop
+            loop = asyncio.get_running_loop()
+            with timer.stage("load"):
+                vector_store = await loop.run_in_executor(ChatService.search_executor(), VectorStoreManager.get_store)
+            if vector_store is None:
+                outcome = "unavailable"
+                # Never rebuild inside a request: start it in the background and
+                # let this question fail fast; later ones find the new snapshot
+                indexed = await loop.run_in_executor(
+                    ChatService.search_executor(), lambda: DocRegistry.count(status="已索引")
                 )
-            except Exception as e:
-                logger.error(f"Failed to load vector store: {e}")
-                yield json.dumps({"step": "error", "message": f"知识库加载失败: {str(e)}"}) + "\n"
+                if indexed > 0:
+                    DocService.schedule_rebuild()
+                    yield json.dumps({"step": "error", "message": "检测到索引丢失，正在后台重建，请稍后再试"}) + "\n"
+                else:
+                    yield json.dumps({"step": "error", "message": "知识库为空，请先上传文档"}) + "\n"
                 return
 
             # Step 3: Search
             yield json.dumps({"step": "retrieving", "message": f"正在检索相关文档 (Top {top_k})..."}) + "\n"
             
-            # Sync search is fine as this generator runs in a thread
-            docs = vector_store.similarity_search_with_score(question, k=top_k)
+            vector_ids = None
+            if doc_ids:
+                # Scoped questions search only the documents' own vectors
+                with timer.stage("scope"):
+                    vector_ids = await loop.run_in_executor(
+                        ChatService.search_executor(), DocService.vector_ids_for, doc_ids
+                    )
+                if not vector_ids:
+                    outcome = "unavailable"
+                    yield json.dumps({"step": "error", "message": "指定的文档不存在或尚未索引"}) + "\n"
+                    return
+
+            answer_cache = get_answer_cache() if settings.ANSWER_CACHE_ENABLED else None
+            # Read before searching: an answer generated across an invalidation is not stored
+            cache_version = answer_cache.version if answer_cache else None
+            with timer.stage("query_embed"):
+                query_vector = await VectorStoreManager.embed_query(question)
+            with timer.stage("search"):
+                docs = await loop.run_in_executor(
+                    ChatService.search_executor(),
+                    lambda: vector_store.similarity_search_with_score_by_vector(query_vector, k=top_k, vector_ids=vector_ids)
+                )
             
-            relevant_content = []
+            min_similarity = settings.SIMILARITY_THRESHOLD if threshold is None else threshold
+            relevant_chunks = []
             sources = []
             for doc, score in docs:
-                # Score: lower is better for L2
-                relevant_content.append(doc.page_content)
+                # Score: lower is better for L2; weak matches only dilute the prompt
+                similarity = ChatService.similarity(score)
+                if similarity < min_similarity:
+                    continue
+                relevant_chunks.append(doc)
                 sources.append({
                     "content": doc.page_content[:200] + "...", 
                     "score": float(score), 
+                    "similarity": round(similarity, 4),
                     "source": doc.metadata.get("name", "unknown"),
                     "page": doc.metadata.get("page", 0)
                 })
             
-            yield json.dumps({"step": "retrieved", "data": sources, "message": f"检索到 {len(docs)} 个相关片段"}) + "\n"
+            yield json.dumps({"step": "retrieved", "data": sources, "message": f"检索到 {len(sources)} 个相关片段"}) + "\n"
             
-            if not relevant_content:
+            if not relevant_chunks:
+                outcome = "no_match"
                 yield json.dumps({"step": "answer", "data": "很抱歉，在现有知识库中未找到与您问题相关的答案。建议您：\n1. 尝试更换关键词\n2. 确认已上传相关文档\n3. 检查问题描述是否准确", "done": True}) + "\n"
                 return
 
+            if any(doc.id is None for doc in relevant_chunks):
+                answer_cache = None
+            # Rewritten chunks get new vector IDs, so answers cached before a reindex by
+            # any worker process no longer match, even where no invalidation reached
+            chunk_ids = [f"{doc.id}@{doc.metadata['vector_id']}" for doc in relevant_chunks]
+            cached = answer_cache.get(query_vector, chunk_ids, settings.LLM_MODEL) if answer_cache else None
+            if cached is not None:
+                # Same context for the same question: replay the stored answer as it was streamed
+                yield json.dumps({"step": "generating", "message": "已找到相同问题的回答"}) + "\n"
+                timer.record("first_token", timer.elapsed())
+                answer = ""
+                for part in cached["parts"]:
+                    answer += part
+                    data = part if stream_mode == "delta" else answer
+                    yield json.dumps({"step": "answer", "data": data, "done": False}) + "\n"
+                timer.record("total", timer.elapsed())
+                outcome = "cached"
+                yield json.dumps({
+                    "step": "completed", "message": "回答完成", "data": answer, "done": True,
+                    "timings": timer.timings, "context": cached["context"], "cached": True
+                }) + "\n"
+                return
+
             # Step 4: Generate Answer
             yield json.dumps({"step": "generating", "message": "正在生成回答..."}) + "\n"
             
-            context = "\n\n".join(relevant_content)
-            prompt = f"请基于以下参考内容回答用户的问题。如果参考内容不足以回答，请委婉告知用户并说明原因。不要编造事实。\n\n参考内容：\n{context}\n\n用户问题：{question}"
+            # Overlapping chunks are merged and repeats dropped so the prompt
+            # carries each passage once, within the token budget
+            with timer.stage("context"):
+                context = ContextBuilder.build(question, relevant_chunks)
             
-            # Call DashScope
-            responses = Generation.call(
+            # Call DashScope; incremental output returns only the new text per chunk
+            generation_start = time.perf_counter()
+            responses = await ChatService.generation().call(
                 model=settings.LLM_MODEL,
-                prompt=prompt,
+                prompt=context["prompt"],
                 api_key=settings.DASHSCOPE_API_KEY,
                 stream=True,
+                incremental_output=True,
+                max_tokens=settings.LLM_MAX_OUTPUT_TOKENS,
                 result_format='message'
             )
             
-            for response in responses:
+            parts = []
+            async for response in responses:
                 if response.status_code == HTTPStatus.OK:
-                    content = response.output.choices[0].message.content
-                    # DashScope stream returns full content so far
-                    yield json.dumps({"step": "answer", "data": content, "done": False}) + "\n"
+                    delta = response.output.choices[0].message.content
+                    if not delta:
+                        continue
+                    if not parts:
+                        timer.record("first_token", timer.elapsed())
+                    parts.append(delta)
+                    data = delta if stream_mode == "delta" else "".join(parts)
+                    yield json.dumps({"step": "answer", "data": data, "done": False}) + "\n"
                 else:
+                    outcome = "error"
                     yield json.dumps({"step": "error", "message": f"模型调用失败: {response.message}"}) + "\n"
+            timer.record("generate", time.perf_counter() - generation_start)
+            timer.record("total", timer.elapsed())
             
-            yield json.dumps({"step": "completed", "message": "回答完成", "done": True}) + "\n"
+            context_stats = {"chunks": context["chunks"], "passages": len(context["passages"]), "tokens": context["tokens"]}
+            if outcome != "error":
+                outcome = "completed"
+                if answer_cache and parts:
+                    answer_cache.put(
+                        query_vector, chunk_ids, settings.LLM_MODEL,
+                        {doc.metadata.get("doc_id") for doc in relevant_chunks},
+                        parts, context_stats, cache_version
+                    )
+            yield json.dumps({
+                "step": "completed", "message": "回答完成", "data": "".join(parts), "done": True,
+                "timings": timer.timings, "context": context_stats, "cached": False
+            }) + "\n"
 
         except Exception as e:
+            outcome = "error"
             logger.error(f"Chat error: {e}")
             yield json.dumps({"step": "error", "message": f"系统异常: {str(e)}"}) + "\n"
+        finally:
+            CHAT_STREAMS_IN_FLIGHT.dec()
+            CHAT_REQUESTS.inc(outcome=outcome)
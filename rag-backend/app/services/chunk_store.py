@@ -0,0 +1,166 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Iterable
+from langchain_core.documents import Document
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+class ChunkStore:
+    """
+    Chunk text and metadata keyed by FAISS vector ID, in SQLite next to the index.
+
+    Search reads only the rows of the top-k hits, so no process ever holds the
+    corpus as Python objects. Vector IDs come from AUTOINCREMENT and are never
+    reused: an index file older than the rows simply misses on newer IDs.
+    Each row also records the index shard holding its vector.
+    """
+    _local = threading.local()
+
+    @staticmethod
+    def path() -> str:
+        return os.path.join(settings.VECTOR_DB_DIR, "chunks.sqlite")
+
+    @classmethod
+    def _conn(cls) -> sqlite3.Connection:
+        conn = getattr(cls._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(settings.VECTOR_DB_DIR):
+                os.makedirs(settings.VECTOR_DB_DIR, exist_ok=True)
+            conn = sqlite3.connect(cls.path(), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " vector_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " chunk_id TEXT,"
+                " doc_id TEXT,"
+                " text TEXT NOT NULL,"
+                " metadata TEXT NOT NULL,"
+                " shard TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks(doc_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_shard ON chunks(shard)")
+            conn.commit()
+            cls._local.conn = conn
+        return conn
+
+    @classmethod
+    def add(cls, chunks: list[Document], shard: str) -> list[int]:
+        """Store chunks of `shard` and return their new vector IDs, in order"""
+        conn = cls._conn()
+        ids = []
+        with conn:
+            for chunk in chunks:
+                cursor = conn.execute(
+                    "INSERT INTO chunks (chunk_id, doc_id, text, metadata, shard) VALUES (?, ?, ?, ?, ?)",
+                    (chunk.id, chunk.metadata.get("doc_id"), chunk.page_content,
+                     json.dumps(chunk.metadata, ensure_ascii=False), shard)
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    @classmethod
+    def get_many(cls, vector_ids: Iterable[int]) -> dict[int, Document]:
+        vector_ids = [int(i) for i in vector_ids]
+        if not vector_ids:
+            return {}
+        placeholders = ",".join("?" * len(vector_ids))
+        rows = cls._conn().execute(
+            f"SELECT vector_id, chunk_id, text, metadata FROM chunks WHERE vector_id IN ({placeholders})",
+            vector_ids
+        ).fetchall()
+        return {
+            vector_id: Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+            for vector_id, chunk_id, text, metadata in rows
+        }
+
+    @classmethod
+    def doc_vector_ids(cls, doc_id: str) -> list[int]:
+        rows = cls._conn().execute("SELECT vector_id FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+        return [r[0] for r in rows]
+
+    @classmethod
+    def shards_of(cls, vector_ids: list[int]) -> dict[str, list[int]]:
+        """Group vector IDs by the shard holding them"""
+        by_shard: dict[str, list[int]] = {}
+        conn = cls._conn()
+        for i in range(0, len(vector_ids), 500):
+            batch = [int(v) for v in vector_ids[i:i + 500]]
+            rows = conn.execute(
+                f"SELECT vector_id, shard FROM chunks WHERE vector_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for vector_id, shard in rows:
+                by_shard.setdefault(shard, []).append(vector_id)
+        return by_shard
+
+    @classmethod
+    def shard_vector_ids(cls, shard: str) -> list[int]:
+        rows = cls._conn().execute("SELECT vector_id FROM chunks WHERE shard = ? ORDER BY vector_id", (shard,)).fetchall()
+        return [r[0] for r in rows]
+
+    @classmethod
+    def set_shard(cls, vector_ids: list[int], shard: str):
+        conn = cls._conn()
+        with conn:
+            for i in range(0, len(vector_ids), 500):
+                batch = [int(v) for v in vector_ids[i:i + 500]]
+                conn.execute(
+                    f"UPDATE chunks SET shard = ? WHERE vector_id IN ({','.join('?' * len(batch))})", (shard, *batch)
+                )
+
+    @classmethod
+    def delete(cls, vector_ids: list[int]):
+        conn = cls._conn()
+        with conn:
+            for i in range(0, len(vector_ids), 500):
+                batch = vector_ids[i:i + 500]
+                conn.execute(f"DELETE FROM chunks WHERE vector_id IN ({','.join('?' * len(batch))})", batch)
+
+    @classmethod
+    def max_vector_id(cls) -> int:
+        return cls._conn().execute("SELECT COALESCE(MAX(vector_id), 0) FROM chunks").fetchone()[0]
+
+    @classmethod
+    def chunks_after(cls, vector_id: int, exclude_shards: Iterable[str] = ()) -> list[Document]:
+        """Chunks stored after vector_id outside exclude_shards, oldest first"""
+        exclude_shards = list(exclude_shards)
+        rows = cls._conn().execute(
+            "SELECT chunk_id, text, metadata FROM chunks WHERE vector_id > ?"
+            f" AND shard NOT IN ({','.join('?' * len(exclude_shards))})"
+            " ORDER BY vector_id", (vector_id, *exclude_shards)
+        ).fetchall()
+        return [Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)) for chunk_id, text, metadata in rows]
+
+    @classmethod
+    def count_by_shard(cls, shards: list[str]) -> dict[str, int]:
+        rows = cls._conn().execute(
+            f"SELECT shard, COUNT(*) FROM chunks WHERE shard IN ({','.join('?' * len(shards))}) GROUP BY shard", shards
+        ).fetchall()
+        return {shard: 0 for shard in shards} | dict(rows)
+
+    @classmethod
+    def delete_shard_rows_after(cls, shards: list[str], vector_id: int):
+        """Drop rows of `shards` newer than vector_id (written after a staging checkpoint)"""
+        conn = cls._conn()
+        with conn:
+            conn.execute(
+                f"DELETE FROM chunks WHERE vector_id > ? AND shard IN ({','.join('?' * len(shards))})",
+                (vector_id, *shards)
+            )
+
+    @classmethod
+    def delete_outside_shards(cls, shards: list[str]):
+        """Keep only the rows of `shards`, after a rebuilt index replaced all others"""
+        conn = cls._conn()
+        with conn:
+            conn.execute(
+                f"DELETE FROM chunks WHERE shard NOT IN ({','.join('?' * len(shards))})", shards
+            )
+
+    @classmethod
+    def count(cls) -> int:
+        return cls._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
@@ -0,0 +1,125 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Callable, List, Iterable, Iterator
+from app.core.config import get_settings
+from app.utils.doc_parser import DocParser, PARSER_VERSION
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Characters of joined document text kept decoded for paged previews
+TEXT_CACHE_MAX_CHARS = 20_000_000
+
+
+class ContentStore:
+    """
+    Parsed-text sidecar files.
+
+    Each document's parsed pages are written once as gzipped JSON keyed by the
+    file's sha256 and the parser version, so previews, reindexing and rebuilds
+    read the stored text instead of parsing the original file again.
+    The joined text of recently previewed documents is also kept decoded, so
+    paging through a preview does not decompress the whole sidecar per page.
+    """
+    # sha256 -> joined text, least recently used first
+    _texts: "OrderedDict[str, str]" = OrderedDict()
+    _text_chars = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def _path(file_hash: str) -> str:
+        return os.path.join(settings.PARSED_DIR, f"{file_hash}.v{PARSER_VERSION}.json.gz")
+
+    @staticmethod
+    def load(file_hash: str) -> Optional[List[dict]]:
+        path = ContentStore._path(file_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)["pages"]
+        except Exception as e:
+            logger.warning(f"Discarding unreadable parsed text {path}: {e}")
+            return None
+
+    @staticmethod
+    def save(file_hash: str, pages: List[dict]):
+        if not os.path.exists(settings.PARSED_DIR):
+            os.makedirs(settings.PARSED_DIR, exist_ok=True)
+        path = ContentStore._path(file_hash)
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"parser_version": PARSER_VERSION, "pages": pages}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def delete(file_hash: str):
+        path = ContentStore._path(file_hash)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                logger.warning(f"Failed to delete parsed text {path}: {e}")
+
+    @staticmethod
+    def iter_pages(doc_meta: dict, parse_fn: Callable[[str], Iterable[dict]] = DocParser.iter_pages) -> Iterator[dict]:
+        """
+        Yield the parsed pages of a document.
+        On a miss, pages are streamed from parse_fn as they are parsed and the
+        sidecar is written once the last page is through.
+        Documents registered before hashing existed get their hash filled in.
+        """
+        if not doc_meta.get("hash"):
+            doc_meta["hash"] = ContentStore.file_hash(doc_meta["path"])
+        pages = ContentStore.load(doc_meta["hash"])
+        if pages is not None:
+            yield from pages
+            return
+        pages = []
+        for page in parse_fn(doc_meta["path"]):
+            pages.append(page)
+            yield page
+        ContentStore.save(doc_meta["hash"], pages)
+
+    @classmethod
+    def get_text(cls, doc_meta: dict) -> str:
+        """The joined text of a document (as DocParser.join_pages), decoded once for repeated reads"""
+        if not doc_meta.get("hash"):
+            doc_meta["hash"] = ContentStore.file_hash(doc_meta["path"])
+        file_hash = doc_meta["hash"]
+        with cls._lock:
+            text = cls._texts.get(file_hash)
+            if text is not None:
+                cls._texts.move_to_end(file_hash)
+                return text
+        # Same hash, same content: a concurrent miss decoding it too is only wasted work
+        text = DocParser.join_pages(ContentStore.get_pages(doc_meta))
+        if len(text) > TEXT_CACHE_MAX_CHARS:
+            return text
+        with cls._lock:
+            if file_hash not in cls._texts:
+                cls._texts[file_hash] = text
+                cls._text_chars += len(text)
+                while cls._text_chars > TEXT_CACHE_MAX_CHARS:
+                    _, evicted = cls._texts.popitem(last=False)
+                    cls._text_chars -= len(evicted)
+        return text
+
+    @staticmethod
+    def get_pages(doc_meta: dict, parse_fn: Callable[[str], Iterable[dict]] = DocParser.iter_pages) -> List[dict]:
+        """Return the parsed pages of a document, parsing and storing them on a miss"""
+        return list(ContentStore.iter_pages(doc_meta, parse_fn))
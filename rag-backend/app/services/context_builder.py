@@ -0,0 +1,187 @@
+import re
+import math
+import logging
+from typing import Optional
+from langchain_core.documents import Document
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = "请基于以下参考内容回答用户的问题。如果参考内容不足以回答，请委婉告知用户并说明原因。不要编造事实。\n\n参考内容：\n{context}\n\n用户问题：{question}"
+CONTEXT_SEPARATOR = "\n\n"
+
+# Chunks of a page this close together (only trimmed whitespace between) are one passage
+ADJACENT_GAP = 2
+# Characters per shingle when comparing passages for near-duplicates
+SHINGLE_SIZE = 4
+# Passages cut to fit the budget are dropped rather than kept this short
+MIN_PASSAGE_TOKENS = 32
+
+# CJK characters, runs of letters, or any other single non-space character (digits included)
+TOKEN_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]|[A-Za-z]+|\S")
+SENTENCE_END_RE = re.compile(r"[。！？!?；;…\n]|\.\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local estimate of the model's token count: one token per CJK character,
+    digit or symbol and one per four letters of a word. Qwen tokenizes numbers
+    one digit per token and encodes common Chinese at fewer tokens than
+    characters, so on Chinese text it tends to overcount; it is an estimate,
+    not a bound, and rare English words can take more than it allows.
+    """
+    return sum(_piece_tokens(piece) for piece in TOKEN_RE.findall(text))
+
+
+def _piece_tokens(piece: str) -> int:
+    return math.ceil(len(piece) / 4) if piece[0].isascii() and piece[0].isalpha() else 1
+
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into the prompt context.
+
+    Overlapping or adjacent chunks of the same page are merged back into one
+    passage using their stored character offsets, passages that (nearly)
+    repeat a better-ranked one are dropped, and the rest are packed in rank
+    order into CONTEXT_MAX_TOKENS, never letting the prompt plus the reserved
+    answer exceed LLM_CONTEXT_WINDOW.
+    """
+
+    @staticmethod
+    def build(question: str, chunks: list[Document]) -> dict:
+        """
+        chunks are ranked best first. Returns {"prompt", "passages", "chunks",
+        "tokens"}: the prompt, the passages packed into it, the chunks they came
+        from and the estimated prompt tokens.
+        """
+        passages = ContextBuilder.merge(chunks)
+        passages = ContextBuilder.drop_near_duplicates(passages)
+
+        overhead = estimate_tokens(PROMPT_TEMPLATE.format(context="", question=""))
+        window = settings.LLM_CONTEXT_WINDOW - settings.LLM_MAX_OUTPUT_TOKENS - overhead
+        question_tokens = estimate_tokens(question)
+        if question_tokens > window:
+            logger.warning(f"Question of ~{question_tokens} tokens exceeds the context window, truncating it")
+            question = ContextBuilder.truncate(question, window)
+            question_tokens = estimate_tokens(question)
+        budget = min(settings.CONTEXT_MAX_TOKENS, window - question_tokens)
+
+        packed = ContextBuilder.pack(passages, budget)
+        context = CONTEXT_SEPARATOR.join(p["text"] for p in packed)
+        return {
+            "prompt": PROMPT_TEMPLATE.format(context=context, question=question),
+            "passages": packed,
+            "chunks": sum(p["chunks"] for p in packed),
+            "tokens": overhead + question_tokens + sum(p["tokens"] for p in packed),
+        }
+
+    @staticmethod
+    def merge(chunks: list[Document]) -> list[dict]:
+        """
+        Passages in rank order (the rank of their best chunk). Chunks without
+        offsets (indexed before offsets were stored) stay passages of their own.
+        """
+        passages: list[dict] = []
+        by_page: dict[tuple, list[dict]] = {}
+        for rank, chunk in enumerate(chunks):
+            meta = chunk.metadata
+            passage = {
+                "text": chunk.page_content,
+                "doc_id": meta.get("doc_id"),
+                "name": meta.get("name", "unknown"),
+                "page": meta.get("page", 0),
+                "start": meta.get("start"),
+                "end": meta.get("end"),
+                "rank": rank,
+                "chunks": 1,
+            }
+            if passage["start"] is None or passage["end"] is None:
+                passages.append(passage)
+            else:
+                by_page.setdefault((passage["doc_id"], passage["page"]), []).append(passage)
+
+        for page_chunks in by_page.values():
+            page_chunks.sort(key=lambda p: p["start"])
+            current = page_chunks[0]
+            for nxt in page_chunks[1:]:
+                if nxt["start"] > current["end"] + ADJACENT_GAP:
+                    passages.append(current)
+                    current = nxt
+                elif nxt["end"] > current["end"]:
+                    if nxt["start"] >= current["end"]:
+                        current["text"] += "\n" + nxt["text"]
+                    else:
+                        current["text"] += nxt["text"][current["end"] - nxt["start"]:]
+                    current["end"] = nxt["end"]
+                    current["rank"] = min(current["rank"], nxt["rank"])
+                    current["chunks"] += nxt["chunks"]
+                else:
+                    # Contained in the current passage
+                    current["rank"] = min(current["rank"], nxt["rank"])
+                    current["chunks"] += nxt["chunks"]
+            passages.append(current)
+        passages.sort(key=lambda p: p["rank"])
+        return passages
+
+    @staticmethod
+    def drop_near_duplicates(passages: list[dict]) -> list[dict]:
+        """
+        Drop passages whose shingles are mostly (CONTEXT_DEDUP_THRESHOLD) found in
+        a better-ranked passage already kept, e.g. the same paragraph in two documents.
+        """
+        kept, kept_shingles = [], []
+        for passage in passages:
+            shingles = ContextBuilder.shingles(passage["text"])
+            if any(
+                len(shingles & other) >= settings.CONTEXT_DEDUP_THRESHOLD * len(shingles)
+                for other in kept_shingles
+            ):
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def pack(passages: list[dict], budget: int) -> list[dict]:
+        """Passages in rank order up to `budget` tokens; the first one that does not fit is cut to the rest"""
+        packed = []
+        separator = estimate_tokens(CONTEXT_SEPARATOR)
+        for passage in passages:
+            joint = separator if packed else 0
+            tokens = estimate_tokens(passage["text"])
+            if tokens + joint > budget:
+                if budget - joint < MIN_PASSAGE_TOKENS:
+                    break
+                passage["text"] = ContextBuilder.truncate(passage["text"], budget - joint)
+                tokens = estimate_tokens(passage["text"])
+            passage["tokens"] = tokens + joint
+            packed.append(passage)
+            budget -= tokens + joint
+        return packed
+
+    @staticmethod
+    def truncate(text: str, budget: int) -> str:
+        """The longest prefix of text within `budget` tokens, ending at a sentence where possible"""
+        end = 0
+        tokens = 0
+        for match in TOKEN_RE.finditer(text):
+            tokens += _piece_tokens(match.group())
+            if tokens > budget:
+                break
+            end = match.end()
+        sentence_end: Optional[int] = None
+        for match in SENTENCE_END_RE.finditer(text, 0, end):
+            sentence_end = match.end()
+        # Fall back to the hard cut when the last sentence ends too early
+        if sentence_end is not None and sentence_end >= end // 2:
+            end = sentence_end
+        return text[:end].rstrip()
+
+    @staticmethod
+    def shingles(text: str) -> set[int]:
+        text = "".join(text.split())
+        if len(text) <= SHINGLE_SIZE:
+            return {hash(text)}
+        return {hash(text[i:i + SHINGLE_SIZE]) for i in range(len(text) - SHINGLE_SIZE + 1)}
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Optional
+import httpx
+import dashscope
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TEXT_EMBEDDING_PATH = "/services/embeddings/text-embedding/text-embedding"
+
+
+class DashScopeAsync:
+    """
+    Non-blocking DashScope calls for the chat path.
+
+    One pooled httpx.AsyncClient is shared by all requests, so an open chat
+    holds no thread while it waits on the API and a cancelled request drops
+    its upstream connection right away.
+    """
+    _client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                base_url=dashscope.base_http_api_url,
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return cls._client
+
+    @classmethod
+    async def embed_queries(cls, texts: list[str], model: str) -> list[list[float]]:
+        """Embed a batch of questions (text_type=query) in one request"""
+        payload = {"model": model, "input": {"texts": texts}, "parameters": {"text_type": "query"}}
+        headers = {"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"}
+        attempt = 0
+        while True:
+            try:
+                response = await cls.client().post(TEXT_EMBEDDING_PATH, json=payload, headers=headers)
+                # Client errors (bad key, bad input) are not worth retrying
+                if response.status_code in (400, 401):
+                    raise ValueError(f"Query embedding rejected: {response.status_code} {response.text}")
+                response.raise_for_status()
+                items = response.json()["output"]["embeddings"]
+                return [item["embedding"] for item in sorted(items, key=lambda item: item["text_index"])]
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if attempt >= settings.EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = 0.5 * (2 ** attempt)
+                logger.warning(f"Query embedding failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    @classmethod
+    async def aclose(cls):
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
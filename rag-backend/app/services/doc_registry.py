@@ -0,0 +1,222 @@
+import os
+import json
+import sqlite3
+import threading
+import logging
+from typing import Optional
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Pre-registry metadata file, imported once on first start
+LEGACY_METADATA_FILE = os.path.join(settings.UPLOAD_DIR, "metadata.json")
+
+# source_id: document whose file, parsed text and vectors this one shares (dedup); NULL means itself
+DOC_FIELDS = ["id", "name", "upload_time", "status", "size", "path", "hash", "source_id"]
+
+
+class DocRegistry:
+    """
+    SQLite-backed document registry.
+
+    Runs in WAL mode so readers never block the writer and several worker
+    processes can share it; every update is its own transaction. Each thread
+    gets its own connection.
+    """
+    _local = threading.local()
+    _init_lock = threading.Lock()
+    _initialized = False
+
+    @classmethod
+    def _conn(cls) -> sqlite3.Connection:
+        conn = getattr(cls._local, "conn", None)
+        if conn is None:
+            cls._ensure_schema()
+            conn = cls._connect()
+            cls._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        parent = os.path.dirname(settings.DOC_REGISTRY_PATH)
+        if parent and not os.path.exists(parent):
+            os.makedirs(parent, exist_ok=True)
+        conn = sqlite3.connect(settings.DOC_REGISTRY_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @classmethod
+    def _ensure_schema(cls):
+        if cls._initialized:
+            return
+        with cls._init_lock:
+            if cls._initialized:
+                return
+            conn = cls._connect()
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS docs ("
+                    " id TEXT PRIMARY KEY,"
+                    " name TEXT NOT NULL,"
+                    " upload_time TEXT NOT NULL,"
+                    " status TEXT NOT NULL,"
+                    " size INTEGER,"
+                    " path TEXT,"
+                    " hash TEXT,"
+                    " source_id TEXT)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_upload_time ON docs(upload_time)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_name ON docs(name COLLATE NOCASE)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_status ON docs(status)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_hash ON docs(hash)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_path ON docs(path)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_source_id ON docs(source_id)")
+            cls._migrate_legacy(conn)
+            conn.close()
+            cls._initialized = True
+
+    @staticmethod
+    def _migrate_legacy(conn: sqlite3.Connection):
+        """Import metadata.json once, then rename it so it is not imported again"""
+        if not os.path.exists(LEGACY_METADATA_FILE):
+            return
+        try:
+            with open(LEGACY_METADATA_FILE, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO docs (id, name, upload_time, status, size, path, hash, source_id) "
+                    "VALUES (:id, :name, :upload_time, :status, :size, :path, :hash, :source_id)",
+                    [{field: d.get(field) for field in DOC_FIELDS} for d in legacy]
+                )
+            os.replace(LEGACY_METADATA_FILE, LEGACY_METADATA_FILE + ".migrated")
+            logger.info(f"Migrated {len(legacy)} documents from metadata.json")
+        except Exception as e:
+            logger.error(f"Failed to migrate metadata.json: {e}")
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[dict]:
+        return dict(row) if row is not None else None
+
+    @classmethod
+    def get(cls, doc_id: str) -> Optional[dict]:
+        row = cls._conn().execute("SELECT * FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        return cls._to_dict(row)
+
+    @classmethod
+    def add(cls, doc_meta: dict):
+        conn = cls._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO docs (id, name, upload_time, status, size, path, hash, source_id) "
+                "VALUES (:id, :name, :upload_time, :status, :size, :path, :hash, :source_id)",
+                {field: doc_meta.get(field) for field in DOC_FIELDS}
+            )
+
+    @classmethod
+    def add_if_absent(cls, doc_meta: dict) -> bool:
+        """Insert unless the ID is taken; returns whether the record was added"""
+        conn = cls._conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO docs (id, name, upload_time, status, size, path, hash, source_id) "
+                "VALUES (:id, :name, :upload_time, :status, :size, :path, :hash, :source_id)",
+                {field: doc_meta.get(field) for field in DOC_FIELDS}
+            )
+        return cursor.rowcount > 0
+
+    @classmethod
+    def get_by_path(cls, path: str) -> Optional[dict]:
+        row = cls._conn().execute("SELECT * FROM docs WHERE path = ?", (path,)).fetchone()
+        return cls._to_dict(row)
+
+    @classmethod
+    def update(cls, doc_id: str, **fields):
+        unknown = set(fields) - set(DOC_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown document fields: {unknown}")
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = cls._conn()
+        with conn:
+            conn.execute(f"UPDATE docs SET {assignments} WHERE id = ?", (*fields.values(), doc_id))
+
+    @classmethod
+    def delete(cls, doc_id: str) -> Optional[dict]:
+        """Remove a document and return the removed record"""
+        conn = cls._conn()
+        with conn:
+            row = conn.execute("SELECT * FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+        return cls._to_dict(row)
+
+    @classmethod
+    def list_page(cls, page: int = 1, size: int = 6, keyword: str = "") -> tuple[int, list[dict]]:
+        """One page of documents, newest first, optionally filtered by name"""
+        where, params = "", []
+        if keyword:
+            where = "WHERE name LIKE ? ESCAPE '\\'"
+            escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        conn = cls._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM docs {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM docs {where} ORDER BY upload_time DESC, rowid DESC LIMIT ? OFFSET ?",
+            (*params, size, (page - 1) * size)
+        ).fetchall()
+        return total, [dict(r) for r in rows]
+
+    @classmethod
+    def list_all(cls, statuses: Optional[list[str]] = None) -> list[dict]:
+        if statuses:
+            placeholders = ",".join("?" * len(statuses))
+            rows = cls._conn().execute(
+                f"SELECT * FROM docs WHERE status IN ({placeholders}) ORDER BY rowid", statuses
+            ).fetchall()
+        else:
+            rows = cls._conn().execute("SELECT * FROM docs ORDER BY rowid").fetchall()
+        return [dict(r) for r in rows]
+
+    @classmethod
+    def count(cls, status: Optional[str] = None) -> int:
+        if status:
+            return cls._conn().execute("SELECT COUNT(*) FROM docs WHERE status = ?", (status,)).fetchone()[0]
+        return cls._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    @classmethod
+    def count_by_hash(cls, file_hash: str) -> int:
+        return cls._conn().execute("SELECT COUNT(*) FROM docs WHERE hash = ?", (file_hash,)).fetchone()[0]
+
+    @classmethod
+    def find_by_hash(cls, file_hash: str, status: str) -> Optional[dict]:
+        """
+        A document with this content hash and status: the original when it still
+        exists, otherwise a linked one that outlived it (its source_id still names
+        the shared vectors)
+        """
+        row = cls._conn().execute(
+            "SELECT * FROM docs WHERE hash = ? AND status = ? ORDER BY source_id IS NOT NULL LIMIT 1",
+            (file_hash, status)
+        ).fetchone()
+        return cls._to_dict(row)
+
+    @classmethod
+    def count_by_source(cls, source_id: str) -> int:
+        """Documents backed by source_id's file and vectors (including the source itself)"""
+        return cls._conn().execute(
+            "SELECT COUNT(*) FROM docs WHERE id = ? OR source_id = ?", (source_id, source_id)
+        ).fetchone()[0]
+
+    @classmethod
+    def dedup_stats(cls) -> dict:
+        linked, saved = cls._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM docs WHERE source_id IS NOT NULL"
+        ).fetchone()
+        return {"linked_docs": linked, "bytes_saved": saved}
+
+    @classmethod
+    def known_paths(cls) -> set[str]:
+        return {r[0] for r in cls._conn().execute("SELECT path FROM docs").fetchall()}
@@ -1,177 +1,645 @@
 import os
+import time
 import uuid
-import shutil
-import json
+import hashlib
+import tarfile
+import zipfile
+import threading
+import aiofiles
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import IO, Iterable, Iterator, Optional
 from fastapi import UploadFile, HTTPException
 from app.core.config import get_settings
+from app.core.metrics import StageTimer, STAGE_SECONDS, CHUNKS_EMBEDDED
 from app.utils.doc_parser import DocParser
-from app.schemas.doc import UploadResponse, DocItem, DocListResponse
-from langchain_text_splitters import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
-from langchain_community.embeddings import DashScopeEmbeddings
-from langchain_community.vectorstores import FAISS
+from app.utils.text_splitter import get_text_splitter, get_markdown_splitter
+from app.schemas.doc import UploadResponse, BulkUploadResponse, DocItem, DocListResponse
+from app.schemas.job import JobStatus, FileResult
 from langchain_core.documents import Document
+from app.services.vector_store import VectorStoreManager
+from app.services.chunk_store import ChunkStore
+from app.services.staging_index import StagingIndex
+from app.services.job_service import JobService, JobCancelled
+from app.services.content_store import ContentStore
+from app.services.doc_registry import DocRegistry
+from app.services.answer_cache import get_answer_cache
+from app.services.file_lock import FileLock
 import logging
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-METADATA_FILE = os.path.join(settings.UPLOAD_DIR, "metadata.json")
-
-def load_metadata():
-    if os.path.exists(METADATA_FILE):
-        try:
-            with open(METADATA_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Failed to load metadata: {e}")
-            return []
-    return []
-
-def save_metadata(metadata):
-    try:
-        with open(METADATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"Failed to save metadata: {e}")
-
-DOCS_METADATA = load_metadata()
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SUPPORTED_EXTS = (".pdf", ".docx", ".doc", ".md", ".markdown", ".txt")
+ARCHIVE_EXTS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
 
 class DocService:
+    # Uploads served by linking to already indexed identical content (since start)
+    dedup_hits: int = 0
+    # Held while a full rebuild runs; a second request does not start another one
+    _rebuild_lock = threading.Lock()
+    # Progress of the running or last rebuild, for GET /docs/rebuild
+    _rebuild_status: dict = {"state": "idle"}
+    # Held for the life of the process that requeued interrupted ingestion
+    _recovery_lock: Optional[FileLock] = None
+
     @staticmethod
     async def process_doc(file: UploadFile) -> UploadResponse:
-        # 1. Save File
+        """
+        Save the upload and queue it for ingestion.
+        Parsing, splitting and embedding run in the job pool; poll /api/jobs/{job_id} for progress.
+        """
+        # 1. Save File (copied in chunks so the event loop stays free, hashed on the way)
         if not os.path.exists(settings.UPLOAD_DIR):
             os.makedirs(settings.UPLOAD_DIR)
         
-        file_ext = os.path.splitext(file.filename)[1].lower()
         doc_id = str(uuid.uuid4())
-        safe_filename = f"{doc_id}_{file.filename}"
-        file_path = os.path.join(settings.UPLOAD_DIR, safe_filename)
+        # Written under a hidden name first so the upload watcher ignores it until registered
+        partial_path = os.path.join(settings.UPLOAD_DIR, f".{doc_id}.part")
+        sha = hashlib.sha256()
+        timer = StageTimer("upload")
         
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            with timer.stage("save"):
+                async with aiofiles.open(partial_path, "wb") as buffer:
+                    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                        sha.update(chunk)
+                        await buffer.write(chunk)
         except Exception as e:
             logger.error(f"File save error: {e}")
             raise HTTPException(status_code=500, detail="File save failed")
 
-        # 2. Parse Content
+        # 2. Deduplicate and register
+        doc_meta, original = DocService._register_upload(doc_id, file.filename, partial_path, sha.hexdigest())
+        if original:
+            return UploadResponse(
+                status="success",
+                doc_id=doc_id,
+                message="Duplicate content linked to existing document"
+            )
+
+        # 3. Queue Ingestion
+        job = JobService.submit(doc_id, file.filename, lambda job: DocService.ingest_doc(doc_meta, job))
+
+        return UploadResponse(
+            status="processing",
+            doc_id=doc_id,
+            job_id=job.id,
+            message="Document queued for processing"
+        )
+
+    @staticmethod
+    def _register_upload(doc_id: str, name: str, partial_path: str, file_hash: str,
+                         original: Optional[dict] = None) -> tuple[dict, Optional[dict]]:
+        """
+        Register a saved upload and move it into place.
+        Identical content that is already indexed (or `original`, an earlier file
+        of the same bulk upload) is linked to the existing file, parsed text and
+        vectors instead of being processed again; the original is returned too.
+        """
+        original = original or DocRegistry.find_by_hash(file_hash, status="已索引")
+        if original:
+            os.remove(partial_path)
+            doc_meta = {
+                "id": doc_id,
+                "name": name,
+                "upload_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                "status": original["status"],
+                "size": original["size"],
+                "path": original["path"],
+                "hash": file_hash,
+                "source_id": DocService._source_id(original)
+            }
+            DocRegistry.add(doc_meta)
+            DocService.dedup_hits += 1
+            logger.info(f"{name} duplicates {original['name']}, linked without re-indexing")
+            return doc_meta, original
+
+        doc_meta = {
+            "id": doc_id,
+            "name": name,
+            "upload_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "status": "处理中",
+            "size": os.path.getsize(partial_path),
+            "path": os.path.join(settings.UPLOAD_DIR, f"{doc_id}_{name}"),
+            "hash": file_hash
+        }
+        DocRegistry.add(doc_meta)
+        os.replace(partial_path, doc_meta["path"])
+        return doc_meta, None
+
+    @staticmethod
+    async def process_bulk(files: list[UploadFile]) -> BulkUploadResponse:
+        """
+        Save a set of uploads (documents, or zip/tar archives of them) and queue
+        them as one ingestion job; poll /api/jobs/{job_id} for per-file results.
+        Starlette has already spooled each upload to a temporary file; it is
+        copied into UPLOAD_DIR in blocks and archives are unpacked entry by entry
+        in the job, within BULK_MAX_FILE_MB per document and BULK_MAX_TOTAL_MB
+        per upload, so no file is held in memory.
+        """
+        if not os.path.exists(settings.UPLOAD_DIR):
+            os.makedirs(settings.UPLOAD_DIR)
+
+        batch_id = uuid.uuid4().hex
+        saved, rejected = [], []
+        timer = StageTimer("upload")
         try:
-            content = DocParser.parse(file_path)
-            if not content:
+            with timer.stage("save"):
+                for i, file in enumerate(files):
+                    name = os.path.basename(file.filename or "")
+                    if not (DocService.is_supported(name) or DocService.is_archive(name)):
+                        rejected.append(name)
+                        continue
+                    # Hidden until unpacked and registered, like single uploads
+                    path = os.path.join(settings.UPLOAD_DIR, f".{batch_id}-{i}.bulk")
+                    saved.append((name, path))
+                    async with aiofiles.open(path, "wb") as buffer:
+                        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                            await buffer.write(chunk)
+        except Exception as e:
+            logger.error(f"File save error: {e}")
+            for _, path in saved:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise HTTPException(status_code=500, detail="File save failed")
+
+        if not saved:
+            raise HTTPException(status_code=400, detail=f"Unsupported file format. Allowed: {list(SUPPORTED_EXTS + ARCHIVE_EXTS)}")
+        job = JobService.submit(None, f"{len(saved)} uploads", lambda job: DocService.ingest_bulk(saved, job))
+        return BulkUploadResponse(
+            status="processing",
+            job_id=job.id,
+            accepted=len(saved),
+            rejected=rejected,
+            message="Files queued for processing"
+        )
+
+    @staticmethod
+    def ingest_bulk(uploads: list[tuple[str, str]], job: JobStatus):
+        """
+        Unpack, parse and vectorize a bulk upload (runs in the job pool).
+        Documents are parsed in parallel and all their chunks reach the index in
+        one write instead of one write per file.
+        """
+        results: dict[str, FileResult] = {}
+        docs: list[dict] = []
+        # In-batch duplicates by the document they are linked to; they take its final status
+        linked: dict[str, list[dict]] = {}
+        with JobService.stage(job, "extracting"):
+            by_hash: dict[str, dict] = {}
+            for entry, partial_path, file_hash in DocService._unpack(uploads, job):
+                doc_meta, original = DocService._register_upload(
+                    str(uuid.uuid4()), entry, partial_path, file_hash, original=by_hash.get(file_hash)
+                )
+                result = FileResult(name=entry, doc_id=doc_meta["id"], status="linked" if original else "pending")
+                results[doc_meta["id"]] = result
+                job.files.append(result)
+                if original is None:
+                    by_hash[file_hash] = doc_meta
+                    docs.append(doc_meta)
+                elif original["id"] in results:
+                    linked.setdefault(original["id"], []).append(doc_meta)
+
+        # Each thread drives one document through the shared parse pool
+        chunks_by_doc: dict[str, list[Document]] = {}
+        with JobService.stage(job, "parsing"):
+            with ThreadPoolExecutor(max_workers=settings.PARSE_WORKERS, thread_name_prefix="bulk-parse") as pool:
+                for doc_meta, outcome in zip(docs, pool.map(DocService._bulk_chunks, docs)):
+                    result = results[doc_meta["id"]]
+                    if isinstance(outcome, Exception):
+                        logger.error(f"Parse error in {doc_meta['name']}: {outcome}")
+                        DocService._finish_bulk([doc_meta], "解析失败", "failed", results, linked)
+                        result.error = f"File parse failed: {outcome}"
+                        continue
+                    chunks_by_doc[doc_meta["id"]] = outcome
+                    result.chunks = len(outcome)
+        parsed = [d for d in docs if d["id"] in chunks_by_doc]
+        all_chunks = [c for d in parsed for c in chunks_by_doc[d["id"]]]
+        job.chunks_total = len(all_chunks)
+        logger.info(f"Generated {len(all_chunks)} chunks for {len(parsed)} documents of bulk job {job.id}")
+        if not all_chunks:
+            return
+
+        if not settings.model_ready():
+            logger.warning("No DASHSCOPE_API_KEY found. Skipping vectorization.")
+            DocService._finish_bulk(parsed, "解析成功(未向量化)", "parsed", results, linked)
+            return
+        try:
+            with JobService.stage(job, "embedding"):
+                DocService._add_to_vector_store(all_chunks)
+            job.chunks_indexed = len(all_chunks)
+            DocService._finish_bulk(parsed, "已索引", "indexed", results, linked)
+        except Exception as e:
+            logger.error(f"Vectorization error: {e}")
+            DocService._finish_bulk(parsed, "向量化失败", "failed", results, linked)
+            for doc_meta in parsed:
+                results[doc_meta["id"]].error = str(e)
+            raise
+
+    @staticmethod
+    def _finish_bulk(docs: list[dict], status: str, outcome: str, results: dict[str, FileResult], linked: dict[str, list[dict]]):
+        """Final status of bulk documents, also applied to the in-batch duplicates linked to them"""
+        for doc_meta in docs:
+            if DocService._release_if_deleted(doc_meta):
+                results[doc_meta["id"]].status = "cancelled"
+                continue
+            DocService._set_status(doc_meta, status)
+            results[doc_meta["id"]].status = outcome
+            for duplicate in linked.get(doc_meta["id"], []):
+                DocService._set_status(duplicate, status)
+
+    @staticmethod
+    def _bulk_chunks(doc_meta: dict) -> list[Document] | Exception:
+        """Parsed, split and tagged chunks of one bulk document, or the error that stopped it"""
+        try:
+            pages = ContentStore.iter_pages(
+                doc_meta, parse_fn=lambda path: DocParser.iter_pages(path, JobService.parse_pool())
+            )
+            chunks = DocService._split_pages(pages, os.path.splitext(doc_meta["name"])[1].lower())
+            if not chunks:
                 raise ValueError("Empty content")
+            DocService._tag_chunks(chunks, doc_meta["id"], doc_meta["name"])
+            return chunks
         except Exception as e:
-            logger.error(f"Parse error: {e}")
-            raise HTTPException(status_code=400, detail=f"File parse failed: {str(e)}")
+            return e
 
-        # 3. Split Text
-        chunks = DocService._split_text(content, file_ext)
-        logger.info(f"Generated {len(chunks)} chunks for {file.filename}")
+    @staticmethod
+    def _unpack(uploads: list[tuple[str, str]], job: JobStatus) -> Iterator[tuple[str, str, str]]:
+        """
+        Yield (name, partial path, sha256) for each supported document of the
+        saved uploads, copying archive entries out one block at a time. Entries
+        that are unsupported, beyond BULK_MAX_FILES or over the size limits are
+        recorded as skipped; sizes are checked against the archive headers before
+        unpacking and again while copying, since headers can lie (zip bombs).
+        Each saved upload is removed once read.
+        """
+        accepted = 0
+        max_file = settings.BULK_MAX_FILE_MB * 1024 * 1024
+        budget = settings.BULK_MAX_TOTAL_MB * 1024 * 1024
+        for name, path in uploads:
+            try:
+                for entry, size, source in DocService._archive_entries(name, path):
+                    with source:
+                        # Only the base name is used, so entries cannot escape UPLOAD_DIR
+                        entry = os.path.basename(entry.replace("\\", "/"))
+                        if not entry or entry.startswith("."):
+                            continue
+                        if not DocService.is_supported(entry):
+                            job.files.append(FileResult(name=entry, status="skipped", error="Unsupported file format"))
+                            continue
+                        if accepted >= settings.BULK_MAX_FILES:
+                            job.files.append(FileResult(name=entry, status="skipped", error="Too many files in one upload"))
+                            continue
+                        if size > max_file:
+                            job.files.append(FileResult(name=entry, status="skipped", error="File too large"))
+                            continue
+                        if size > budget:
+                            job.files.append(FileResult(name=entry, status="skipped", error="Upload too large"))
+                            continue
+                        partial_path = os.path.join(settings.UPLOAD_DIR, f".{uuid.uuid4()}.part")
+                        sha = hashlib.sha256()
+                        written = 0
+                        try:
+                            with open(partial_path, "wb") as out:
+                                # One byte past the declared size is enough to tell it was wrong
+                                while written <= size and (block := source.read(min(UPLOAD_CHUNK_SIZE, size + 1 - written))):
+                                    sha.update(block)
+                                    out.write(block)
+                                    written += len(block)
+                        except zipfile.BadZipFile as e:
+                            # zipfile stops at the declared size itself and fails the CRC check
+                            os.remove(partial_path)
+                            job.files.append(FileResult(name=entry, status="failed", error=f"Unreadable archive entry: {e}"))
+                            continue
+                        except BaseException:
+                            os.remove(partial_path)
+                            raise
+                        if written != size:
+                            os.remove(partial_path)
+                            job.files.append(FileResult(name=entry, status="failed",
+                                                        error="Size does not match the archive header"))
+                            continue
+                        accepted += 1
+                        budget -= size
+                        yield entry, partial_path, sha.hexdigest()
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                logger.error(f"Unreadable archive {name}: {e}")
+                job.files.append(FileResult(name=name, status="failed", error=f"Unreadable archive: {e}"))
+            finally:
+                os.remove(path)
 
-        # 4. Vectorize & Store
-        vector_status = "解析成功(未向量化)"
+    @staticmethod
+    def _archive_entries(name: str, path: str) -> Iterator[tuple[str, int, IO[bytes]]]:
+        """
+        (entry name, unpacked size from the header, stream) of each file in an
+        archive; a plain document is its own only entry. The stream of an entry
+        that is skipped is closed unread, so it is never decompressed.
+        """
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        yield info.filename, info.file_size, archive.open(info)
+        elif DocService.is_archive(name):
+            # Stream mode reads members in order, never seeking back
+            with tarfile.open(path, "r|*") as archive:
+                for member in archive:
+                    if member.isfile():
+                        yield member.name, member.size, archive.extractfile(member)
+        else:
+            yield name, os.path.getsize(path), open(path, "rb")
+
+    @staticmethod
+    def is_supported(filename: str) -> bool:
+        return os.path.splitext(filename)[1].lower() in SUPPORTED_EXTS
+
+    @staticmethod
+    def is_archive(filename: str) -> bool:
+        return filename.lower().endswith(ARCHIVE_EXTS)
+
+    @staticmethod
+    def ingest_doc(doc_meta: dict, job: JobStatus):
+        """Parse, split and vectorize an uploaded document (runs in the job pool)"""
+        file_ext = os.path.splitext(doc_meta["name"])[1].lower()
+
+        # 1. Parse & Split Content
+        # Pages stream out of the parse pool and are split as they arrive;
+        # the parsed text is stored once as a sidecar for previews and reindexing
         try:
-            if settings.DASHSCOPE_API_KEY:
-                embeddings = DashScopeEmbeddings(
-                    model=settings.EMBEDDING_MODEL,
-                    dashscope_api_key=settings.DASHSCOPE_API_KEY
+            with JobService.stage(job, "parsing"):
+                # Files picked up from the upload dir are registered without one
+                DocService._ensure_hash(doc_meta)
+                pages = ContentStore.iter_pages(
+                    doc_meta, parse_fn=lambda path: DocParser.iter_pages(path, JobService.parse_pool())
                 )
-                DocService._add_to_vector_store(chunks, embeddings)
-                vector_status = "已索引"
-            else:
-                logger.warning("No DASHSCOPE_API_KEY found. Skipping vectorization.")
+                chunks = DocService._split_pages(pages, file_ext)
+            if not chunks:
+                raise ValueError("Empty content")
+        except Exception as e:
+            logger.error(f"Parse error: {e}")
+            DocService._finish_doc(doc_meta, "解析失败")
+            raise ValueError(f"File parse failed: {str(e)}")
+
+        DocService._tag_chunks(chunks, doc_meta["id"], doc_meta["name"])
+        job.chunks_total = len(chunks)
+        logger.info(f"Generated {len(chunks)} chunks for {doc_meta['name']}")
+
+        # 3. Vectorize & Store
+        if not settings.model_ready():
+            logger.warning("No DASHSCOPE_API_KEY found. Skipping vectorization.")
+            DocService._finish_doc(doc_meta, "解析成功(未向量化)")
+            return
+        try:
+            with JobService.stage(job, "embedding"):
+                # Replacing makes a requeued job safe to run over a partial earlier one
+                DocService._add_to_vector_store(chunks, replace_doc_id=doc_meta["id"])
+            job.chunks_indexed = len(chunks)
         except Exception as e:
             logger.error(f"Vectorization error: {e}")
-            vector_status = "向量化失败"
+            DocService._finish_doc(doc_meta, "向量化失败")
+            raise
+        DocService._finish_doc(doc_meta, "已索引")
 
-        # 5. Update Metadata
-        doc_meta = {
-            "id": doc_id,
-            "name": file.filename,
-            "upload_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "status": vector_status,
-            "size": os.path.getsize(file_path),
-            "path": file_path
-        }
-        DOCS_METADATA.append(doc_meta)
-        save_metadata(DOCS_METADATA)
+    @staticmethod
+    def _finish_doc(doc_meta: dict, status: str):
+        """Final status of an ingested document; cancels the job if the document was deleted meanwhile"""
+        if DocService._release_if_deleted(doc_meta):
+            raise JobCancelled(f"{doc_meta['name']} was deleted during ingestion")
+        DocService._set_status(doc_meta, status)
 
-        return UploadResponse(
-            status="success",
-            doc_id=doc_id,
-            length=len(content),
-            message="Document processed successfully"
-        )
+    @staticmethod
+    def _release_if_deleted(doc_meta: dict) -> bool:
+        """
+        Whether the document was deleted while its job ran. If so, the chunks and
+        parsed text the job stored after the delete released the document are dropped.
+        """
+        if DocRegistry.count_by_source(doc_meta["id"]) > 0:
+            return False
+        DocService._release_doc(doc_meta)
+        return True
+
+    @staticmethod
+    def _set_status(doc_meta: dict, status: str):
+        doc_meta["status"] = status
+        DocRegistry.update(doc_meta["id"], status=status)
+
+    @staticmethod
+    def _source_id(doc_meta: dict) -> str:
+        """ID under which a document's chunks are indexed (the original for deduplicated uploads)"""
+        return doc_meta.get("source_id") or doc_meta["id"]
+
+    @staticmethod
+    def vector_ids_for(doc_ids: list[str]) -> list[int]:
+        """Vector IDs of the documents' chunks (deduplicated uploads resolve to their source)"""
+        source_ids = set()
+        for doc_id in doc_ids:
+            doc = DocRegistry.get(doc_id)
+            if doc:
+                source_ids.add(DocService._source_id(doc))
+        vector_ids = []
+        for source_id in source_ids:
+            vector_ids.extend(ChunkStore.doc_vector_ids(source_id))
+        return vector_ids
+
+    @staticmethod
+    def _ensure_hash(doc_meta: dict):
+        """Fill in the content hash of documents registered before hashing existed"""
+        if not doc_meta.get("hash"):
+            doc_meta["hash"] = ContentStore.file_hash(doc_meta["path"])
+            DocRegistry.update(doc_meta["id"], hash=doc_meta["hash"])
 
     from fastapi import BackgroundTasks
 
     @staticmethod
     def rebuild_index():
-        """Rebuilds the vector index from scratch."""
+        """
+        Rebuilds the vector index from scratch.
+        Documents stream through parse -> split -> embed -> index in batches of
+        REBUILD_BATCH_SIZE chunks into a staging index, so memory does not grow
+        with the corpus; chat keeps searching the live index until the staged one
+        is promoted at the end. Progress is checkpointed every
+        REBUILD_CHECKPOINT_INTERVAL seconds and an interrupted rebuild resumes
+        from there. Re-embeds every document, so it is only used as an explicit
+        repair operation.
+        """
+        if not DocService._rebuild_lock.acquire(blocking=False):
+            logger.info("Index rebuild already running, skipping")
+            return
+        # Worker processes share the staging index, so only one of them rebuilds
+        staging_lock = StagingIndex.lock()
+        if not staging_lock.acquire(blocking=False):
+            DocService._rebuild_lock.release()
+            logger.info("Index rebuild running in another process, skipping")
+            return
+        timer = StageTimer("rebuild")
+        status = DocService._rebuild_status = {"state": "running", "started_at": time.time()}
         try:
-            logger.info("Starting background index rebuild...")
-            
-            # Reload metadata to ensure it's fresh
-            current_metadata = load_metadata()
-            
-            # Clear vector store directory
-            if os.path.exists(settings.VECTOR_DB_DIR):
-                try:
-                    shutil.rmtree(settings.VECTOR_DB_DIR)
-                except Exception as e:
-                    logger.warning(f"Failed to clean vector db dir: {e}")
-            
-            # Re-add all existing docs
-            all_chunks = []
-            valid_count = 0
-            
-            if settings.DASHSCOPE_API_KEY:
-                embeddings = DashScopeEmbeddings(
-                    model=settings.EMBEDDING_MODEL,
-                    dashscope_api_key=settings.DASHSCOPE_API_KEY
-                )
-                
-                for d in current_metadata:
-                    # Index documents that are marked as indexed or ready
-                    if d.get("status") in ["已索引", "解析成功(未向量化)"]:
-                        file_path = d["path"]
-                        # Ensure absolute path check if relative fails
-                        if not os.path.exists(file_path):
-                             file_path = os.path.abspath(file_path)
-                             
-                        if os.path.exists(file_path):
-                            try:
-                                logger.info(f"Processing {d['name']} for index...")
-                                content = DocParser.parse(file_path)
-                                ext = os.path.splitext(d["name"])[1].lower()
-                                chunks = DocService._split_text(content, ext)
-                                all_chunks.extend(chunks)
-                                valid_count += 1
-                            except Exception as e:
-                                logger.error(f"Failed to process {d['name']}: {e}")
-                        else:
-                            logger.error(f"File not found during rebuild: {file_path}")
-                
-                if all_chunks:
-                    logger.info(f"Vectorizing {len(all_chunks)} chunks from {valid_count} documents...")
-                    DocService._add_to_vector_store(all_chunks, embeddings)
-                else:
-                    logger.warning("No chunks available to index.")
-            else:
+            if not settings.model_ready():
                 logger.warning("Missing API KEY, cannot rebuild index.")
-                
-            logger.info("Background index rebuild completed.")
+                status.update(state="failed", error="Missing API key")
+                return
+            logger.info("Starting background index rebuild...")
+            try:
+                staging = StagingIndex.open()
+            except Exception as e:
+                logger.error(f"Cannot resume the staged rebuild, starting over: {e}")
+                StagingIndex.discard()
+                staging = StagingIndex.open()
+
+            # Index documents that are marked as indexed or ready,
+            # once per source so deduplicated uploads are not embedded twice
+            sources = {}
+            for d in DocRegistry.list_all(statuses=["已索引", "解析成功(未向量化)"]):
+                source_id = DocService._source_id(d)
+                # The source itself when it still exists, so chunks keep its name
+                if source_id not in sources or d["id"] == source_id:
+                    sources[source_id] = d
+            status.update(
+                docs_total=len(sources),
+                docs_done=len(staging.done & sources.keys()),
+                chunks_staged=staging.state["chunks"],
+                resumed=bool(staging.done)
+            )
+
+            pending, pending_sources = [], []
+            last_checkpoint = time.monotonic()
+            for source_id, d in sources.items():
+                if source_id in staging.done:
+                    continue
+                pending.extend(DocService._rebuild_chunks(source_id, d))
+                pending_sources.append(source_id)
+                if len(pending) >= settings.REBUILD_BATCH_SIZE:
+                    DocService._stage_batch(staging, pending, pending_sources, status)
+                    pending, pending_sources = [], []
+                    if time.monotonic() - last_checkpoint >= settings.REBUILD_CHECKPOINT_INTERVAL:
+                        staging.checkpoint()
+                        last_checkpoint = time.monotonic()
+            DocService._stage_batch(staging, pending, pending_sources, status)
+            if not staging.state["chunks"]:
+                logger.warning("No chunks available to index.")
+
+            status["state"] = "swapping"
+            with timer.stage("swap"):
+                VectorStoreManager.promote(staging)
+            # Documents deleted while the rebuild was reading them
+            for source_id in sources:
+                if DocRegistry.count_by_source(source_id) == 0:
+                    VectorStoreManager.delete_doc(source_id)
+            # Every document was re-chunked; cached answers may quote the old chunks
+            get_answer_cache().clear()
+
+            timer.record("total", timer.elapsed())
+            status.update(state="completed", finished_at=time.time(), timings=timer.timings)
+            logger.info(f"Background index rebuild completed: {timer.timings}")
         except Exception as e:
             logger.error(f"Failed to rebuild index: {e}")
+            status.update(state="failed", finished_at=time.time(), error=str(e))
+        finally:
+            staging_lock.release()
+            DocService._rebuild_lock.release()
+
+    @staticmethod
+    def _rebuild_chunks(source_id: str, d: dict) -> list[Document]:
+        """Parsed and split chunks of one source document, or none when it cannot be read"""
+        file_path = d["path"]
+        # Ensure absolute path check if relative fails
+        if not os.path.exists(file_path):
+            file_path = os.path.abspath(file_path)
+        if not os.path.exists(file_path):
+            logger.error(f"File not found during rebuild: {file_path}")
+            return []
+        start = time.perf_counter()
+        try:
+            logger.info(f"Processing {d['name']} for index...")
+            d["path"] = file_path
+            DocService._ensure_hash(d)
+            ext = os.path.splitext(d["name"])[1].lower()
+            chunks = DocService._split_pages(ContentStore.iter_pages(d), ext)
+            DocService._tag_chunks(chunks, source_id, d["name"])
+            return chunks
+        except Exception as e:
+            logger.error(f"Failed to process {d['name']}: {e}")
+            return []
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, pipeline="rebuild", stage="parse")
+
+    @staticmethod
+    def _stage_batch(staging: StagingIndex, chunks: list[Document], source_ids: list[str], status: dict):
+        """Embed and stage the chunks of some documents, then count those documents as done"""
+        for i in range(0, len(chunks), settings.REBUILD_BATCH_SIZE):
+            batch = chunks[i:i + settings.REBUILD_BATCH_SIZE]
+            start = time.perf_counter()
+            staging.add(batch, VectorStoreManager.embed_texts([c.page_content for c in batch]))
+            STAGE_SECONDS.observe(time.perf_counter() - start, pipeline="rebuild", stage="batch")
+            CHUNKS_EMBEDDED.inc(len(batch), pipeline="rebuild")
+        staging.mark_done(source_ids)
+        status.update(docs_done=status["docs_done"] + len(source_ids), chunks_staged=staging.state["chunks"])
+
+    @staticmethod
+    def schedule_rebuild() -> bool:
+        """Start a background rebuild unless one is running. Returns whether one was started."""
+        if DocService._rebuild_lock.locked():
+            return False
+        threading.Thread(target=DocService.rebuild_index, name="index-rebuild", daemon=True).start()
+        return True
+
+    @staticmethod
+    def resume_rebuild():
+        """
+        Continue a rebuild interrupted by a shutdown or crash, or start the one that
+        migrates the index of an earlier version (called at startup)
+        """
+        if StagingIndex.exists():
+            logger.info("Found an interrupted index rebuild, resuming it")
+            DocService.schedule_rebuild()
+        elif VectorStoreManager.has_legacy_index():
+            logger.info("Found a legacy LangChain index, rebuilding it from the document registry")
+            DocService.schedule_rebuild()
+
+    @staticmethod
+    def resume_ingestion():
+        """
+        Requeue documents left "处理中" by a shutdown or crash (called at startup).
+        Jobs live in the memory of the process that queued them, so only the first
+        worker process to start requeues; it keeps the lock for its lifetime so
+        workers starting alongside it do not queue the same documents again.
+        """
+        lock = FileLock(settings.DOC_REGISTRY_PATH + ".lock")
+        if not lock.acquire(blocking=False):
+            return
+        DocService._recovery_lock = lock
+        pending = DocRegistry.list_all(statuses=["处理中"])
+        for doc_meta in pending:
+            JobService.submit(doc_meta["id"], doc_meta["name"],
+                              lambda job, doc_meta=doc_meta: DocService.ingest_doc(doc_meta, job))
+        if pending:
+            logger.info(f"Requeued {len(pending)} documents whose ingestion was interrupted")
+
+    @staticmethod
+    def rebuild_status() -> dict:
+        """Progress of the running or last rebuild; an interrupted one reports its checkpoint"""
+        status = dict(DocService._rebuild_status)
+        if not DocService._rebuild_lock.locked() and StagingIndex.exists():
+            # Still locked while another worker process runs it, free once it was interrupted
+            staging_lock = StagingIndex.lock()
+            running = not staging_lock.acquire(blocking=False)
+            staging_lock.release()
+            status = {"state": "running" if running else "interrupted", **StagingIndex.saved_progress()}
+        return status
 
     @staticmethod
     def delete_doc(doc_id: str, background_tasks: BackgroundTasks) -> bool:
-        # 1. Find doc
-        doc = next((d for d in DOCS_METADATA if d["id"] == doc_id), None)
+        # 1. Remove from registry
+        doc = DocRegistry.delete(doc_id)
         if not doc:
             return False
             
+        # Deduplicated uploads share the file, parsed text and vectors; keep them while referenced
+        if DocRegistry.count_by_source(DocService._source_id(doc)) > 0:
+            return True
+            
         # 2. Delete file
         file_path = doc.get("path")
         if file_path and os.path.exists(file_path):
@@ -180,18 +648,28 @@ class DocService:
             except Exception as e:
                 logger.error(f"Failed to delete file {file_path}: {e}")
                 
-        # 3. Remove from metadata
-        DOCS_METADATA.remove(doc)
-        save_metadata(DOCS_METADATA)
-        
-        # 4. Trigger Async Rebuild
-        background_tasks.add_task(DocService.rebuild_index)
+        # 3. Drop parsed text and only this document's vectors
+        background_tasks.add_task(DocService._release_doc, doc)
 
         return True
 
+    @staticmethod
+    def _release_doc(doc: dict):
+        """Drop the parsed text and vectors of a document already removed from the registry"""
+        # Parsed text is shared by identical files
+        file_hash = doc.get("hash")
+        if file_hash and DocRegistry.count_by_hash(file_hash) == 0:
+            ContentStore.delete(file_hash)
+        source_id = DocService._source_id(doc)
+        if not VectorStoreManager.delete_doc(source_id) and doc.get("status") == "已索引":
+            # Indexed, yet none of its chunks carry its ID: only a rebuild can drop them
+            logger.warning(f"No chunks found for indexed doc {source_id}, rebuilding the index")
+            DocService.schedule_rebuild()
+        get_answer_cache().invalidate_docs([source_id])
+
     @staticmethod
     def get_doc_path(doc_id: str) -> str:
-        doc = next((d for d in DOCS_METADATA if d["id"] == doc_id), None)
+        doc = DocRegistry.get(doc_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
             
@@ -202,8 +680,12 @@ class DocService:
         return file_path
 
     @staticmethod
-    def get_doc_content(doc_id: str) -> str:
-        doc = next((d for d in DOCS_METADATA if d["id"] == doc_id), None)
+    def get_doc_content(doc_id: str, offset: int = 0, limit: int = None) -> dict:
+        """
+        Get parsed content of a document from the parsed-text store.
+        offset/limit page through the text in characters.
+        """
+        doc = DocRegistry.get(doc_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
             
@@ -212,54 +694,56 @@ class DocService:
             raise HTTPException(status_code=404, detail="File not found")
             
         try:
-            content = DocParser.parse(file_path)
-            return content
+            DocService._ensure_hash(doc)
+            content = ContentStore.get_text(doc)
+            end = len(content) if limit is None else offset + limit
+            return {
+                "content": content[offset:end],
+                "offset": offset,
+                "total": len(content),
+                "has_more": end < len(content)
+            }
         except Exception as e:
             logger.error(f"Failed to read doc content: {e}")
             raise HTTPException(status_code=500, detail="Failed to read document content")
 
     @staticmethod
     def _split_text(text: str, ext: str) -> list[Document]:
+        """Chunks of one page; each records its character offsets (and Markdown headers)"""
         if ext in [".md", ".markdown"]:
-            headers_to_split_on = [
-                ("#", "Header 1"),
-                ("##", "Header 2"),
-                ("###", "Header 3"),
-            ]
-            markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-            md_header_splits = markdown_splitter.split_text(text)
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.CHUNK_SIZE,
-                chunk_overlap=settings.CHUNK_OVERLAP
-            )
-            return text_splitter.split_documents(md_header_splits)
+            splitter = get_markdown_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
         else:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.CHUNK_SIZE,
-                chunk_overlap=settings.CHUNK_OVERLAP
-            )
-            return text_splitter.create_documents([text])
+            splitter = get_text_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        return splitter.split(text)
 
     @staticmethod
-    def _add_to_vector_store(chunks, embeddings):
-        if not os.path.exists(settings.VECTOR_DB_DIR):
-            os.makedirs(settings.VECTOR_DB_DIR)
-            
-        index_file = os.path.join(settings.VECTOR_DB_DIR, "index.faiss")
-        
-        if os.path.exists(index_file):
-            try:
-                vs = FAISS.load_local(settings.VECTOR_DB_DIR, embeddings, allow_dangerous_deserialization=True)
-                vs.add_documents(chunks)
-                vs.save_local(settings.VECTOR_DB_DIR)
-            except Exception as e:
-                logger.error(f"Failed to load vector store: {e}")
-                # Fallback to create new if load fails
-                vs = FAISS.from_documents(chunks, embeddings)
-                vs.save_local(settings.VECTOR_DB_DIR)
-        else:
-            vs = FAISS.from_documents(chunks, embeddings)
-            vs.save_local(settings.VECTOR_DB_DIR)
+    def _split_pages(pages: Iterable[dict], ext: str) -> list[Document]:
+        """Split pages one at a time as they arrive; each chunk records its page number"""
+        chunks = []
+        for page in pages:
+            if not page["text"].strip():
+                continue
+            page_chunks = DocService._split_text(page["text"], ext)
+            for chunk in page_chunks:
+                chunk.metadata["page"] = page["page"]
+            chunks.extend(page_chunks)
+        return chunks
+
+    @staticmethod
+    def _tag_chunks(chunks: list[Document], doc_id: str, name: str):
+        """Attach owning document info and a stable per-document ID to each chunk"""
+        for i, chunk in enumerate(chunks):
+            chunk.id = VectorStoreManager.chunk_id(doc_id, i)
+            chunk.metadata["doc_id"] = doc_id
+            chunk.metadata["name"] = name
+
+    @staticmethod
+    def _add_to_vector_store(chunks, replace_doc_id: str = None):
+        # The manager persists the new index and swaps it in for readers
+        VectorStoreManager.add_documents(chunks, replace_doc_id=replace_doc_id)
+        # Reindexed chunks keep their IDs, so answers built on the old text must go
+        if replace_doc_id:
+            get_answer_cache().invalidate_docs([replace_doc_id])
 
     @staticmethod
     def reindex_doc(doc_id: str) -> bool:
@@ -267,7 +751,7 @@ class DocService:
         Re-parse and vectorize an existing document
         """
         # Find doc metadata
-        doc_meta = next((d for d in DOCS_METADATA if d["id"] == doc_id), None)
+        doc_meta = DocRegistry.get(doc_id)
         if not doc_meta:
             logger.error(f"Doc {doc_id} not found")
             return False
@@ -278,27 +762,25 @@ class DocService:
             return False
             
         try:
-            # 1. Parse
-            content = DocParser.parse(file_path)
-            if not content:
+            # 1. Parse & Split (served from the parsed-text store when available)
+            DocService._ensure_hash(doc_meta)
+            ext = os.path.splitext(doc_meta["name"])[1].lower()
+            chunks = DocService._split_pages(ContentStore.iter_pages(doc_meta), ext)
+            if not chunks:
                 logger.error("Empty content during reindex")
                 return False
                 
-            # 2. Split
-            ext = os.path.splitext(doc_meta["name"])[1].lower()
-            chunks = DocService._split_text(content, ext)
+            source_id = DocService._source_id(doc_meta)
+            # Chunks shared by deduplicated uploads keep the name of the source they were indexed under
+            source = DocRegistry.get(source_id) if source_id != doc_id else None
+            DocService._tag_chunks(chunks, source_id, (source or doc_meta)["name"])
             
-            # 3. Vectorize
-            if settings.DASHSCOPE_API_KEY:
-                embeddings = DashScopeEmbeddings(
-                    model=settings.EMBEDDING_MODEL,
-                    dashscope_api_key=settings.DASHSCOPE_API_KEY
-                )
-                DocService._add_to_vector_store(chunks, embeddings)
+            # 3. Vectorize (replacing any chunks indexed for this doc before)
+            if settings.model_ready():
+                DocService._add_to_vector_store(chunks, replace_doc_id=source_id)
                 
                 # 4. Update Status
-                doc_meta["status"] = "已索引"
-                save_metadata(DOCS_METADATA)
+                DocService._set_status(doc_meta, "已索引")
                 return True
             else:
                 logger.warning("No API KEY during reindex")
@@ -308,68 +790,97 @@ class DocService:
             logger.error(f"Reindex failed: {e}")
             return False
 
+    @staticmethod
+    def is_upload_file(file_path: str) -> bool:
+        """Whether a path in the upload directory is a user document (not a partial upload or bookkeeping file)"""
+        filename = os.path.basename(file_path)
+        return not filename.startswith(".") and not filename.startswith("metadata.json")
+
+    @staticmethod
+    def register_file(file_path: str) -> bool:
+        """
+        Register a file that appeared in the upload directory outside the upload API.
+        Queues it for indexing when AUTO_INDEX_NEW_FILES is enabled.
+        """
+        if not DocService.is_upload_file(file_path) or not os.path.isfile(file_path):
+            return False
+        if DocRegistry.get_by_path(file_path):
+            return False
+
+        # Try to extract original name from UUID_filename format
+        filename = os.path.basename(file_path)
+        parts = filename.split("_", 1)
+        original_name = parts[1] if len(parts) > 1 else filename
+        doc_id = parts[0] if len(parts) > 1 else str(uuid.uuid4())
+        
+        doc_meta = {
+            "id": doc_id,
+            "name": original_name,
+            "upload_time": datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d %H:%M"),
+            "status": "未索引", # Assume unindexed for recovered files
+            "size": os.path.getsize(file_path),
+            "path": file_path
+        }
+        if not DocRegistry.add_if_absent(doc_meta):
+            return False
+        logger.info(f"Registered new file {file_path}")
+
+        if settings.AUTO_INDEX_NEW_FILES:
+            DocService._set_status(doc_meta, "处理中")
+            JobService.submit(doc_id, original_name, lambda job: DocService.ingest_doc(doc_meta, job))
+        return True
+
+    @staticmethod
+    def unregister_file(file_path: str) -> bool:
+        """Forget a document whose file was removed from the upload directory"""
+        if os.path.exists(file_path):
+            return False
+        # Deduplicated uploads share the path, so every document on it goes
+        removed = None
+        while True:
+            doc = DocRegistry.get_by_path(file_path)
+            # Uploads in progress are registered before their file is moved into place
+            if not doc or doc["status"] == "处理中":
+                break
+            DocRegistry.delete(doc["id"])
+            removed = doc
+        if removed is None:
+            return False
+        DocService._release_doc(removed)
+        logger.info(f"Unregistered removed file {file_path}")
+        return True
+
     @staticmethod
     def sync_docs_from_disk():
         """
-        Scan upload directory and sync missing files to metadata
+        Reconcile the registry with the upload directory: register files that
+        appeared and drop documents whose file is gone.
+        Full scan; the upload watcher runs it periodically as a fallback to file events.
         """
         if not os.path.exists(settings.UPLOAD_DIR):
             return
             
-        existing_files = {doc["path"] for doc in DOCS_METADATA}
-        updated = False
+        existing_files = DocRegistry.known_paths()
+        on_disk = set()
         
         for filename in os.listdir(settings.UPLOAD_DIR):
-            if filename == "metadata.json":
-                continue
-                
             file_path = os.path.join(settings.UPLOAD_DIR, filename)
-            if not os.path.isfile(file_path):
+            if not DocService.is_upload_file(file_path) or not os.path.isfile(file_path):
                 continue
-                
+            on_disk.add(file_path)
             if file_path not in existing_files:
-                # Try to extract original name from UUID_filename format
-                parts = filename.split("_", 1)
-                original_name = parts[1] if len(parts) > 1 else filename
-                doc_id = parts[0] if len(parts) > 1 else str(uuid.uuid4())
-                
-                doc_meta = {
-                    "id": doc_id,
-                    "name": original_name,
-                    "upload_time": datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d %H:%M"),
-                    "status": "未索引", # Assume unindexed for recovered files
-                    "size": os.path.getsize(file_path),
-                    "path": file_path
-                }
-                DOCS_METADATA.append(doc_meta)
-                updated = True
-        
-        if updated:
-            save_metadata(DOCS_METADATA)
+                DocService.register_file(file_path)
+
+        for file_path in existing_files - on_disk:
+            if file_path:
+                DocService.unregister_file(file_path)
 
     @staticmethod
     def get_doc_list(page: int = 1, size: int = 6, keyword: str = "") -> DocListResponse:
-        # Sync before listing
-        DocService.sync_docs_from_disk()
-        
+        # The upload watcher keeps the registry in sync, so listing only reads it
         try:
-            # 1. Filter
-            filtered_docs = DOCS_METADATA
-            if keyword:
-                keyword = keyword.lower()
-                filtered_docs = [
-                    doc for doc in DOCS_METADATA 
-                    if keyword in doc["name"].lower()
-                ]
-            
-            # 2. Sort (newest first)
-            filtered_docs.sort(key=lambda x: x["upload_time"], reverse=True)
-            
-            # 3. Paginate
-            total = len(filtered_docs)
-            start = (page - 1) * size
-            end = start + size
-            paginated_docs = filtered_docs[start:end]
+            # Filter, sort (newest first) and paginate in the registry
+            total, paginated_docs = DocRegistry.list_page(page=page, size=size, keyword=keyword)
             
             return DocListResponse(
                 total=total,
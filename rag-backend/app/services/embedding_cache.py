@@ -0,0 +1,134 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from array import array
+from typing import Optional
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of document embeddings.
+    Entries are keyed by sha256(model, text) and evicted least-recently-used
+    once the cache grows beyond max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(path)
+        if parent and not os.path.exists(parent):
+            os.makedirs(parent)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """Return the cached vector for each text, or None where it is missing"""
+        keys = [self.make_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        now = time.time()
+        rows = [
+            (self.make_key(model, t), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document embeddings from an EmbeddingCache.
+    Only texts missing from the cache reach the underlying client; query
+    embeddings are passed through unchanged.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        # Embed each distinct missing text once
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} to embed")
+            fresh = dict(zip(missing, self.underlying.embed_documents(missing)))
+            self.cache.put_many(self.model, missing, [fresh[t] for t in missing])
+            vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.underlying.embed_query(text)
@@ -0,0 +1,83 @@
+import time
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces request starts evenly so at most `rate` requests begin per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper for bulk ingestion.
+    Splits texts into provider-sized batches and embeds them concurrently on a
+    bounded pool, under a shared rate limit. A failed batch is retried with
+    exponential backoff, so one transient API error does not fail the document.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        batch_size: int = 25,
+        concurrency: int = 4,
+        rate_limit: float = 0.0,
+        max_retries: int = 3,
+        backoff: float = 1.0
+    ):
+        self.underlying = underlying
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate_limit)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} batches")
+        vectors = []
+        # map keeps batch order, so vectors line up with texts
+        for batch_vectors in self._executor.map(self._embed_batch, batches):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.underlying.embed_query(text)
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                return self.underlying.embed_documents(batch)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"Embedding batch failed after {attempt + 1} attempts: {e}")
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+                logger.warning(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
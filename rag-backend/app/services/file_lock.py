@@ -0,0 +1,46 @@
+import os
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, run a single worker process there
+    fcntl = None
+
+
+class FileLock:
+    """
+    Exclusive advisory lock (flock) on a file, shared by every process on the
+    host. Serializes the index writers of several worker processes; within a
+    process, callers serialize on their own locks first. A no-op without fcntl.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock, waiting for it unless blocking is False. Returns whether it was taken."""
+        if fcntl is None:
+            return True
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self):
+        if self._file is not None:
+            # Closing the file drops the lock
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,191 @@
+import os
+import logging
+from typing import Optional
+import faiss
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# faiss wants roughly this many training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def index_description(index_type: str, dim: int, n_vectors: int) -> str:
+    """
+    faiss index_factory string for `index_type` sized for n_vectors of dimension dim.
+    Falls back to exact Flat below INDEX_MIN_VECTORS, where approximate search
+    gains nothing and IVF training would be unreliable.
+    Every index is addressed by explicit vector IDs: IVF stores them natively,
+    Flat and HNSW go through an IDMap2.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    if index_type == "flat" or n_vectors < settings.INDEX_MIN_VECTORS:
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{settings.INDEX_HNSW_M},Flat"
+
+    nlist = ivf_nlist(n_vectors)
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    # PQ needs the sub-quantizer count to divide the dimension
+    pq_m = max(m for m in range(1, settings.INDEX_PQ_M + 1) if dim % m == 0)
+    # and enough training points for each sub-quantizer's 2^nbits centroids
+    nbits = settings.INDEX_PQ_NBITS
+    while nbits > 1 and n_vectors < (1 << nbits) * MIN_POINTS_PER_CENTROID:
+        nbits -= 1
+    return f"IVF{nlist},PQ{pq_m}x{nbits}"
+
+
+def ivf_nlist(n_vectors: int) -> int:
+    """Number of IVF lists for n_vectors: INDEX_NLIST, fewer when there is too little to train them"""
+    return max(1, min(settings.INDEX_NLIST, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def build_index(vectors: np.ndarray, index_type: Optional[str] = None) -> faiss.Index:
+    """
+    Create an empty index of the configured type for these vectors (L2 metric),
+    training it on them when the type needs it. Callers add the vectors afterwards.
+    """
+    index_type = index_type or settings.INDEX_TYPE
+    n_vectors, dim = vectors.shape
+    description = index_description(index_type, dim, n_vectors)
+    index = faiss.index_factory(dim, description)
+    if isinstance(base_index(index), faiss.IndexHNSW):
+        base_index(index).hnsw.efConstruction = settings.INDEX_EF_CONSTRUCTION
+    if not index.is_trained:
+        logger.info(f"Training {description} index on {n_vectors} vectors")
+        index.train(vectors)
+    enable_reconstruct(index)
+    apply_search_params(index)
+    logger.info(f"Built {description} index for {n_vectors} vectors")
+    return index
+
+
+def read_index(path: str, mmap: bool = True) -> faiss.Index:
+    """
+    Load an index file. With mmap the vectors stay in the OS page cache, shared by
+    every process that maps the file, instead of being copied into this process;
+    such an index is read-only, so writers load their own copy with mmap=False.
+    """
+    if mmap:
+        # Flat codes and IVF lists are mapped by different flags, each rejecting the other
+        for flags in (faiss.IO_FLAG_MMAP_IFC, faiss.IO_FLAG_MMAP):
+            try:
+                index = faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+                break
+            except RuntimeError:
+                continue
+        else:
+            index = faiss.read_index(path)
+    else:
+        index = faiss.read_index(path)
+    enable_reconstruct(index)
+    apply_search_params(index)
+    return index
+
+
+def write_index(index: faiss.Index, path: str):
+    """Write atomically: processes mapping the old file keep reading it until they reload"""
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The index under an IDMap2 wrapper"""
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def enable_reconstruct(index: faiss.Index):
+    """
+    Give IVF indexes a direct map from vector ID to list entry, so single vectors
+    can be fetched by ID (scoped searches). It is saved with the index; files
+    written without one get it on load.
+    """
+    ivf = faiss.try_extract_index_ivf(base_index(index))
+    if ivf is not None and ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def apply_search_params(index: faiss.Index):
+    """Set query-time parameters (nprobe / efSearch); they are not all persisted with the index"""
+    params = faiss.ParameterSpace()
+    base = base_index(index)
+    if faiss.try_extract_index_ivf(base) is not None:
+        params.set_index_parameter(base, "nprobe", settings.INDEX_NPROBE)
+    if isinstance(base, faiss.IndexHNSW):
+        params.set_index_parameter(base, "efSearch", settings.INDEX_EF_SEARCH)
+
+
+def is_exact(index: faiss.Index) -> bool:
+    return isinstance(base_index(index), faiss.IndexFlat)
+
+
+def needs_training(index: faiss.Index) -> bool:
+    """
+    Whether an index should be rebuilt as the configured type: a Flat one that has
+    reached INDEX_MIN_VECTORS, or an IVF one trained when it was much smaller and
+    now has at least twice the lists it was given.
+    """
+    if settings.INDEX_TYPE == "flat":
+        return False
+    if is_exact(index):
+        return index.ntotal >= settings.INDEX_MIN_VECTORS
+    ivf = faiss.try_extract_index_ivf(base_index(index))
+    return ivf is not None and ivf_nlist(index.ntotal) >= 2 * ivf.nlist
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """HNSW graphs cannot drop vectors; they are rebuilt instead"""
+    return not isinstance(base_index(index), faiss.IndexHNSW)
+
+
+def stored_vectors(index: faiss.Index) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """(vector IDs, exact vectors) of an IDMap2 index, or None when it cannot return them"""
+    if not isinstance(index, faiss.IndexIDMap2) or index.ntotal == 0:
+        return None
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    return ids, index.index.reconstruct_n(0, index.ntotal)
+
+
+def index_ids(index: faiss.Index) -> np.ndarray:
+    """Every vector ID an IDMap2 or IVF index holds"""
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    ivf = faiss.extract_index_ivf(index)
+    ids = [np.empty(0, dtype=np.int64)]
+    for list_no in range(ivf.nlist):
+        size = ivf.invlists.list_size(list_no)
+        if size:
+            list_ids = ivf.invlists.get_ids(list_no)
+            ids.append(faiss.rev_swig_ptr(list_ids, size).astype(np.int64))
+            ivf.invlists.release_ids(list_no, list_ids)
+    return np.concatenate(ids)
+
+
+def search_subset(index: faiss.Index, query: np.ndarray, k: int, vector_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k of query (1 x d) among vector_ids only, at a cost proportional to the
+    subset rather than the corpus: just those vectors are fetched by ID and
+    compared directly. Returns (squared L2 distances, vector IDs).
+    Exact on uncompressed shards; IVF-PQ vectors are decoded from their codes,
+    so their distances are estimates as in a normal search.
+    """
+    try:
+        vectors = index.reconstruct_batch(vector_ids)
+    except RuntimeError:
+        # Some IDs belong to rows this index does not hold (written or moved after
+        # it was published): keep the ones it does
+        vector_ids = vector_ids[np.isin(vector_ids, index_ids(index))]
+        if len(vector_ids) == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        vectors = index.reconstruct_batch(vector_ids)
+    distances, found = faiss.knn(query, vectors, min(k, len(vector_ids)))
+    return distances[0], vector_ids[found[0]]
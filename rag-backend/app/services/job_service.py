@@ -0,0 +1,112 @@
+import time
+import uuid
+import threading
+import logging
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Optional
+from app.core.config import get_settings
+from app.core.metrics import STAGE_SECONDS, DOCS_INGESTED
+from app.schemas.job import JobStatus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for status queries
+MAX_JOB_HISTORY = 1000
+
+
+class JobCancelled(Exception):
+    """Raised by a job whose work was abandoned, e.g. its document was deleted meanwhile"""
+
+
+class JobService:
+    """
+    Background ingestion queue.
+
+    Jobs run on a bounded thread pool so uploads return immediately; CPU-bound
+    parsing is pushed further out to a process pool so it does not hold the GIL
+    the API and embedding threads need.
+    """
+    _jobs: "OrderedDict[str, JobStatus]" = OrderedDict()
+    _lock = threading.Lock()
+    _executor: Optional[ThreadPoolExecutor] = None
+    _parse_pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def submit(cls, doc_id: Optional[str], name: str, fn: Callable[[JobStatus], None]) -> JobStatus:
+        """Queue fn(job) for execution and return the job tracking it"""
+        job = JobStatus(id=str(uuid.uuid4()), doc_id=doc_id, name=name, created_at=time.time())
+        with cls._lock:
+            cls._jobs[job.id] = job
+            while len(cls._jobs) > MAX_JOB_HISTORY:
+                cls._jobs.popitem(last=False)
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=settings.INGEST_WORKERS, thread_name_prefix="ingest"
+                )
+        cls._executor.submit(cls._run, job, fn)
+        return job
+
+    @classmethod
+    def get_job(cls, job_id: str) -> Optional[JobStatus]:
+        return cls._jobs.get(job_id)
+
+    @classmethod
+    def parse_pool(cls) -> ProcessPoolExecutor:
+        """Process pool shared by all jobs for CPU-bound parsing"""
+        if cls._parse_pool is None:
+            with cls._lock:
+                if cls._parse_pool is None:
+                    # spawn avoids forking the server's threads into the workers
+                    cls._parse_pool = ProcessPoolExecutor(
+                        max_workers=settings.PARSE_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return cls._parse_pool
+
+    @staticmethod
+    @contextmanager
+    def stage(job: JobStatus, name: str):
+        """Mark the job as being in `name` and record how long the stage took"""
+        job.stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            job.timings[name] = round(elapsed, 3)
+            STAGE_SECONDS.observe(elapsed, pipeline="ingest", stage=name)
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+        if cls._parse_pool is not None:
+            cls._parse_pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _run(job: JobStatus, fn: Callable[[JobStatus], None]):
+        job.status = "running"
+        STAGE_SECONDS.observe(time.time() - job.created_at, pipeline="ingest", stage="queued")
+        try:
+            fn(job)
+            job.status = "completed"
+            job.stage = "completed"
+        except JobCancelled as e:
+            logger.info(f"Job {job.id} ({job.name}) cancelled: {e}")
+            job.status = "cancelled"
+            job.stage = "cancelled"
+            job.error = str(e)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.name}) failed: {e}")
+            job.status = "failed"
+            job.stage = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.timings["total"] = round(job.finished_at - job.created_at, 3)
+            DOCS_INGESTED.inc(outcome=job.status)
+            STAGE_SECONDS.observe(job.finished_at - job.created_at, pipeline="ingest", stage="total")
@@ -0,0 +1,80 @@
+import zlib
+import asyncio
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import AsyncIterator
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.services.context_builder import estimate_tokens
+
+# Characters of the fake answer released per streamed chunk
+LOCAL_TOKEN_CHARS = 4
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings for benchmarks and development without a key.
+
+    Character unigrams and bigrams are hashed into `dim` signed buckets and the
+    result is unit-normalized, so texts sharing wording land close together and
+    the same text always gets the same vector, in any process.
+    """
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        text = text.casefold()
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in (*text, *(text[i:i + 2] for i in range(len(text) - 1))):
+            if feature.isspace():
+                continue
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+    async def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Async batch entry point matching DashScopeAsync.embed_queries"""
+        return self.embed_documents(texts)
+
+
+class LocalGeneration:
+    """
+    Stand-in for dashscope.AioGeneration: streams a deterministic answer quoting
+    the start of the prompt's reference content, in message format. Optional
+    delays (seconds) imitate model latency: prefill_delay per 1000 (estimated)
+    prompt tokens before the first chunk, token_delay per chunk.
+    """
+
+    def __init__(self, token_delay: float = 0.0, prefill_delay: float = 0.0):
+        self.token_delay = token_delay
+        self.prefill_delay = prefill_delay
+
+    async def call(self, model: str, prompt: str, stream: bool = True, incremental_output: bool = True, **kwargs):
+        return self._stream(prompt, incremental_output)
+
+    async def _stream(self, prompt: str, incremental_output: bool) -> AsyncIterator[SimpleNamespace]:
+        await asyncio.sleep(self.prefill_delay * estimate_tokens(prompt) / 1000)
+        context = prompt.split("参考内容：", 1)[-1].split("用户问题：", 1)[0].strip()
+        answer = f"根据参考内容：{context[:200]}"
+        sent = ""
+        for i in range(0, len(answer), LOCAL_TOKEN_CHARS):
+            await asyncio.sleep(self.token_delay)
+            delta = answer[i:i + LOCAL_TOKEN_CHARS]
+            sent += delta
+            message = SimpleNamespace(role="assistant", content=delta if incremental_output else sent)
+            yield SimpleNamespace(
+                status_code=HTTPStatus.OK,
+                code="",
+                message="",
+                output=SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="null")])
+            )
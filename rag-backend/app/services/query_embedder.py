@@ -0,0 +1,115 @@
+import time
+import asyncio
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbedder:
+    """
+    In-process LRU/TTL cache of question embeddings with request coalescing.
+
+    Questions are keyed by model and normalized text. The first miss of a window
+    schedules a flush `batch_window` seconds later; misses arriving meanwhile
+    join it (or the in-flight request for the same question), and the whole
+    batch is embedded with a single `embed_batch` call. The flush runs as its
+    own task, so a caller that goes away does not cancel it for the others.
+    All state lives on the event loop thread.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], Awaitable[list[list[float]]]],
+        model: str,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        batch_window: float = 0.005,
+        max_batch: int = 25
+    ):
+        self.embed_batch = embed_batch
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.batch_window = batch_window
+        self.max_batch = max(1, max_batch)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.batches = 0
+        self._cache: "OrderedDict[tuple, tuple[float, list[float]]]" = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._pending: list[tuple[tuple, str]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Fold width/case variants and whitespace so trivially different questions share an entry"""
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+    async def embed(self, text: str) -> list[float]:
+        normalized = self.normalize(text)
+        key = (self.model, normalized)
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            self._pending.append((key, normalized))
+            if len(self._pending) == 1:
+                self._flush_task = asyncio.create_task(self._flush())
+        # Shielded: cancelling one waiter must not fail the shared result
+        return await asyncio.shield(future)
+
+    async def _flush(self):
+        await asyncio.sleep(self.batch_window)
+        batch, self._pending = self._pending, []
+        await asyncio.gather(*(
+            self._embed_and_resolve(batch[i:i + self.max_batch])
+            for i in range(0, len(batch), self.max_batch)
+        ))
+
+    async def _embed_and_resolve(self, batch: list[tuple[tuple, str]]):
+        try:
+            vectors = await self.embed_batch([text for _, text in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} query embeddings, got {len(vectors)}")
+        except Exception as e:
+            logger.error(f"Query embedding failed for batch of {len(batch)}: {e}")
+            for key, _ in batch:
+                future = self._inflight.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        now = time.monotonic()
+        self.batches += 1
+        for (key, _), vector in zip(batch, vectors):
+            self._cache[key] = (now, vector)
+            self._cache.move_to_end(key)
+            future = self._inflight.pop(key)
+            if not future.done():
+                future.set_result(vector)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+from typing import Optional
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from app.core.config import get_settings
+from app.services.chunk_store import ChunkStore
+from app.services.file_lock import FileLock
+from app.services import index_factory
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class StagingIndex:
+    """
+    Index built by a full rebuild in VECTOR_DB_DIR/staging, next to the live one.
+
+    Chunks are appended in batches to Flat shards (compaction trains them once
+    live); a shard is written out and released as soon as it is full, so memory
+    stays bounded by one shard and one batch whatever the corpus size.
+    checkpoint() persists the open shard together with progress.json, which also
+    records the documents already staged; open() resumes from the last checkpoint
+    after a crash or restart, dropping rows written after it.
+    VectorStoreManager.promote() swaps the finished index in.
+    """
+
+    def __init__(self, state: dict, active: Optional[faiss.Index] = None):
+        self.state = state
+        self.active = active
+        self.done = set(state["done"])
+
+    @staticmethod
+    def directory() -> str:
+        return os.path.join(settings.VECTOR_DB_DIR, "staging")
+
+    @classmethod
+    def _progress_file(cls) -> str:
+        return os.path.join(cls.directory(), "progress.json")
+
+    @classmethod
+    def shard_file(cls, shard: str) -> str:
+        return os.path.join(cls.directory(), f"{shard}.faiss")
+
+    @staticmethod
+    def lock() -> FileLock:
+        """Held by the process running the rebuild, so worker processes never stage at once"""
+        return FileLock(os.path.join(settings.VECTOR_DB_DIR, "REBUILD"))
+
+    @classmethod
+    def exists(cls) -> bool:
+        return os.path.exists(cls._progress_file())
+
+    @classmethod
+    def open(cls) -> "StagingIndex":
+        """Resume the interrupted rebuild, or start a new one"""
+        if cls.exists():
+            with open(cls._progress_file(), "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state["shards"]:
+                ChunkStore.delete_shard_rows_after(state["shards"], state["last_id"])
+            active = None
+            if state["shards"]:
+                shard = state["shards"][-1]
+                active = index_factory.read_index(cls.shard_file(shard), mmap=False)
+                # The open shard may have been written after the last progress record
+                ids = faiss.vector_to_array(active.id_map)
+                active.remove_ids(ids[ids > state["last_id"]])
+                state["sizes"][shard] = active.ntotal
+            logger.info(f"Resuming index rebuild {state['id']}: {len(state['done'])} documents, "
+                        f"{state['chunks']} chunks already staged")
+            return cls(state, active)
+
+        cls.discard()
+        os.makedirs(cls.directory(), exist_ok=True)
+        staging = cls({
+            "id": uuid.uuid4().hex[:8],
+            # Rows newer than this in the live index were written during the rebuild
+            "marker": ChunkStore.max_vector_id(),
+            "started_at": time.time(),
+            "shards": [],
+            "sizes": {},
+            "done": [],
+            "chunks": 0,
+            "last_id": 0,
+        })
+        staging.checkpoint()
+        return staging
+
+    @classmethod
+    def discard(cls):
+        """Abandon a staged rebuild: drop the rows of its shards and the staging directory"""
+        if cls.exists():
+            with open(cls._progress_file(), "r", encoding="utf-8") as f:
+                shards = json.load(f)["shards"]
+            if shards:
+                ChunkStore.delete_shard_rows_after(shards, 0)
+        cls.cleanup()
+
+    @classmethod
+    def cleanup(cls):
+        """Remove the staging directory once its shards are promoted"""
+        shutil.rmtree(cls.directory(), ignore_errors=True)
+
+    @property
+    def marker(self) -> int:
+        return self.state["marker"]
+
+    @property
+    def shards(self) -> list[str]:
+        return self.state["shards"]
+
+    def add(self, chunks: list[Document], vectors: np.ndarray):
+        """Append chunks (rows first, then vectors) to the open shard, sealing it once full"""
+        if not chunks:
+            return
+        if self.active is None or self.active.ntotal >= settings.SHARD_MAX_VECTORS:
+            self._seal()
+            self.shards.append(f"shard-{self.state['id']}-{len(self.shards) + 1:03d}")
+            self.active = index_factory.build_index(vectors, "flat")
+            # Record the new shard before any of its rows exist
+            self.checkpoint()
+        shard = self.shards[-1]
+        ids = ChunkStore.add(chunks, shard=shard)
+        self.active.add_with_ids(vectors, np.array(ids, dtype=np.int64))
+        self.state["sizes"][shard] = self.active.ntotal
+        self.state["chunks"] += len(chunks)
+        self.state["last_id"] = max(self.state["last_id"], ids[-1])
+
+    def remove(self, by_shard: dict[str, list[int]]):
+        """Remove staged vectors and their rows, e.g. for documents rewritten during the rebuild"""
+        for shard, ids in by_shard.items():
+            if shard not in self.state["sizes"]:
+                continue
+            index = self._load(shard)
+            index.remove_ids(np.array(ids, dtype=np.int64))
+            self._store(shard, index)
+            ChunkStore.delete(ids)
+
+    def drop_orphans(self):
+        """Remove vectors whose rows were deleted while the rebuild ran (documents deleted meanwhile)"""
+        counts = ChunkStore.count_by_shard(self.shards)
+        for shard in self.shards:
+            if counts[shard] >= self.state["sizes"][shard]:
+                continue
+            index = self._load(shard)
+            ids = faiss.vector_to_array(index.id_map)
+            index.remove_ids(ids[~np.isin(ids, ChunkStore.shard_vector_ids(shard))])
+            self._store(shard, index)
+
+    def mark_done(self, source_ids: list[str]):
+        self.done.update(source_ids)
+        self.state["done"] = sorted(self.done)
+
+    def checkpoint(self):
+        """Persist the open shard and the progress; work after this point is redone on resume"""
+        if self.active is not None:
+            index_factory.write_index(self.active, self.shard_file(self.shards[-1]))
+        self.state["checkpointed_at"] = time.time()
+        tmp_path = self._progress_file() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._progress_file())
+
+    def finish(self) -> dict[str, str]:
+        """
+        Write out the open shard; returns the files of the non-empty shards to
+        promote. The rebuild is no longer resumable from here on, since promotion
+        moves those files away.
+        """
+        self._seal()
+        os.remove(self._progress_file())
+        return {shard: self.shard_file(shard) for shard in self.shards if self.state["sizes"].get(shard)}
+
+    def progress(self) -> dict:
+        return {
+            "id": self.state["id"],
+            "started_at": self.state["started_at"],
+            "docs_done": len(self.done),
+            "chunks_staged": self.state["chunks"],
+            "shards": len(self.shards),
+            "checkpointed_at": self.state.get("checkpointed_at"),
+        }
+
+    @classmethod
+    def saved_progress(cls) -> dict:
+        """Progress as of the last checkpoint, without opening the staged rebuild"""
+        with open(cls._progress_file(), "r", encoding="utf-8") as f:
+            return cls(json.load(f)).progress()
+
+    def _load(self, shard: str) -> faiss.Index:
+        if self.active is not None and shard == self.shards[-1]:
+            return self.active
+        return index_factory.read_index(self.shard_file(shard), mmap=False)
+
+    def _store(self, shard: str, index: faiss.Index):
+        self.state["sizes"][shard] = index.ntotal
+        if index is not self.active:
+            index_factory.write_index(index, self.shard_file(shard))
+
+    def _seal(self):
+        if self.active is not None:
+            index_factory.write_index(self.active, self.shard_file(self.shards[-1]))
+            self.active = None
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import logging
+from typing import Optional
+from app.core.config import get_settings
+from app.services.doc_service import DocService
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # Declared dependency; if it is missing only periodic reconciliation runs
+    Observer = None
+    FileSystemEventHandler = object
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Seconds a path must stay quiet before its events are applied (lets copies finish)
+EVENT_SETTLE_SECONDS = 1.0
+
+
+class _UploadDirHandler(FileSystemEventHandler):
+    def on_created(self, event):
+        if not event.is_directory:
+            UploadWatcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            UploadWatcher.notify(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            UploadWatcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            UploadWatcher.notify(event.src_path)
+            UploadWatcher.notify(event.dest_path)
+
+
+class UploadWatcher:
+    """
+    Keeps the document registry in sync with UPLOAD_DIR in the background.
+
+    File events (inotify through watchdog, when installed) register or drop
+    single files as they change; a full reconciliation scan runs every
+    UPLOAD_SYNC_INTERVAL seconds to catch anything the events missed.
+    """
+    _observer = None
+    _thread: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _pending: dict = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls):
+        if cls._thread is not None:
+            return
+        if not os.path.exists(settings.UPLOAD_DIR):
+            os.makedirs(settings.UPLOAD_DIR)
+
+        cls._stop.clear()
+        if Observer is not None:
+            try:
+                cls._observer = Observer()
+                cls._observer.schedule(_UploadDirHandler(), settings.UPLOAD_DIR, recursive=False)
+                cls._observer.start()
+            except Exception as e:
+                logger.warning(f"File events unavailable, using periodic sync only: {e}")
+                cls._observer = None
+        else:
+            logger.warning(f"watchdog not installed: file changes in the upload dir are only picked up "
+                           f"by the full scan every {settings.UPLOAD_SYNC_INTERVAL}s")
+
+        cls._thread = threading.Thread(target=cls._loop, name="upload-watcher", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        cls._stop.set()
+        if cls._observer is not None:
+            cls._observer.stop()
+            cls._observer.join(timeout=5)
+            cls._observer = None
+        if cls._thread is not None:
+            cls._thread.join(timeout=5)
+            cls._thread = None
+
+    @classmethod
+    def notify(cls, path: str):
+        """Record a change to `path`; it is applied once the path has settled"""
+        with cls._lock:
+            cls._pending[path] = time.monotonic()
+
+    @classmethod
+    def _loop(cls):
+        # Reconcile once at startup, then on every interval
+        next_sync = 0.0
+        while not cls._stop.is_set():
+            now = time.monotonic()
+            if now >= next_sync:
+                try:
+                    DocService.sync_docs_from_disk()
+                except Exception as e:
+                    logger.error(f"Upload dir reconciliation failed: {e}")
+                next_sync = now + settings.UPLOAD_SYNC_INTERVAL
+            cls._apply_settled(now)
+            cls._stop.wait(0.5)
+
+    @classmethod
+    def _apply_settled(cls, now: float):
+        with cls._lock:
+            settled = [p for p, t in cls._pending.items() if now - t >= EVENT_SETTLE_SECONDS]
+            for path in settled:
+                del cls._pending[path]
+        for path in settled:
+            try:
+                if os.path.isfile(path):
+                    DocService.register_file(path)
+                else:
+                    DocService.unregister_file(path)
+            except Exception as e:
+                logger.error(f"Failed to sync {path}: {e}")
@@ -0,0 +1,662 @@
+import os
+import json
+import time
+import heapq
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import faiss
+import numpy as np
+from app.core.config import get_settings
+from langchain_community.embeddings import DashScopeEmbeddings
+from langchain_community.embeddings.dashscope import BATCH_SIZE
+from langchain_core.documents import Document
+from app.services.embedding_cache import EmbeddingCache, CachedEmbeddings
+from app.services.embedding_pipeline import BatchedEmbeddings
+from app.services.query_embedder import QueryEmbedder
+from app.services.dashscope_async import DashScopeAsync
+from app.services.local_models import LocalEmbeddings
+from app.services.chunk_store import ChunkStore
+from app.services.file_lock import FileLock
+from app.services import index_factory
+from app.core.metrics import STAGE_SECONDS, CHUNKS_EMBEDDED
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Index files of the LangChain-based versions (save_local); replaced by a full rebuild
+LEGACY_INDEX_FILES = ("index.faiss", "index.pkl")
+
+# Points at the manifest of the current snapshot; replaced atomically on publish
+CURRENT_FILE = "CURRENT"
+
+# Held (flock) by the process writing a snapshot, from reading the manifest to the swap
+LOCK_FILE = "LOCK"
+
+# Sealed shards smaller than this fraction of SHARD_MAX_VECTORS are merged by compaction
+SHARD_MERGE_FRACTION = 0.25
+
+
+class IndexedStore:
+    """
+    Read view over one published set of index shards: vectors in (memory-mapped)
+    FAISS indexes, chunk text and metadata fetched from the ChunkStore for the
+    hits only. Queries fan out across shards and the per-shard top-k are merged.
+    """
+
+    def __init__(self, shards: dict[str, faiss.Index], executor: ThreadPoolExecutor):
+        self.shards = shards
+        self.executor = executor
+
+    @property
+    def ntotal(self) -> int:
+        return sum(index.ntotal for index in self.shards.values())
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, vector_ids: Optional[list[int]] = None
+    ) -> list[tuple[Document, float]]:
+        """
+        Top-k chunks for a query vector with their squared L2 distances (lower is closer),
+        each with its vector ID in metadata["vector_id"].
+        With vector_ids, only those vectors are searched.
+        """
+        query = np.array([embedding], dtype=np.float32)
+        if vector_ids is not None:
+            if not vector_ids:
+                return []
+            tasks = self._subset_tasks(vector_ids)
+        else:
+            tasks = [(index, None) for index in self.shards.values() if index.ntotal > 0]
+        if not tasks:
+            return []
+
+        def search(task):
+            index, ids = task
+            if ids is None:
+                distances, found = index.search(query, k)
+                return list(zip(distances[0], found[0]))
+            return list(zip(*index_factory.search_subset(index, query, k, ids)))
+
+        # faiss releases the GIL while searching, so shards are searched on separate cores
+        if len(tasks) == 1:
+            results = [search(tasks[0])]
+        else:
+            results = list(self.executor.map(search, tasks))
+        hits = heapq.nsmallest(k, (
+            (float(d), int(i)) for result in results for d, i in result if i != -1
+        ))
+        docs = ChunkStore.get_many(i for _, i in hits)
+        # A row can be gone when a writer removed it after these shards were published
+        hits = [(d, i) for d, i in hits if i in docs]
+        for _, i in hits:
+            docs[i].metadata["vector_id"] = i
+        return [(docs[i], d) for d, i in hits]
+
+    def _subset_tasks(self, vector_ids: list[int]) -> list[tuple[faiss.Index, np.ndarray]]:
+        tasks, unplaced = [], []
+        for shard, ids in ChunkStore.shards_of(vector_ids).items():
+            if shard in self.shards:
+                tasks.append((self.shards[shard], np.array(sorted(ids), dtype=np.int64)))
+            else:
+                unplaced.extend(ids)
+        # Rows moved by a compaction newer than this view: look for them everywhere
+        if unplaced:
+            ids = np.array(sorted(unplaced), dtype=np.int64)
+            tasks.extend((index, ids) for index in self.shards.values())
+        return tasks
+
+
+class VectorStoreManager:
+    """
+    Process-wide owner of the sharded FAISS vector store.
+
+    The store is a sequence of immutable snapshots. Each snapshot is a manifest
+    under manifests/ listing its shards and their index files under shards/;
+    CURRENT names the manifest of the latest one. New chunks go to the last
+    (active) shard until it holds SHARD_MAX_VECTORS, then a new shard is opened,
+    so a write only rewrites the shards it touches; unchanged shard files are
+    shared between snapshots.
+
+    All writes go through a single writer thread (the write queue), so they never
+    interleave; each holds the LOCK file while it runs, which keeps the writers
+    of other worker processes out until it has published. A write puts its new
+    shard files and manifest next to the old ones (write then rename) and then
+    replaces CURRENT, which is the swap: a crash at any point leaves the previous
+    snapshot intact. Readers memory-map the
+    shards of the snapshot they loaded and keep serving it until they see CURRENT
+    change; a request keeps the store it fetched for its whole lifetime. The last
+    SNAPSHOTS_RETAINED snapshots are kept for readers still on them, older
+    manifests and unreferenced shard files are garbage-collected.
+    Shards are compacted on the same queue: trained into the configured index
+    type once they reach INDEX_MIN_VECTORS, sealed ones merged once deletes have
+    left them small.
+    """
+    _store: Optional[IndexedStore] = None
+    _loaded: bool = False
+    _stamp: Optional[tuple] = None
+    _version: int = 0
+    _mapped: dict = {}
+    _generation: int = 0
+    _embeddings: Optional[CachedEmbeddings] = None
+    _embedding_cache: Optional[EmbeddingCache] = None
+    _query_embedder: Optional[QueryEmbedder] = None
+    _search_pool: Optional[ThreadPoolExecutor] = None
+    _writer: Optional[ThreadPoolExecutor] = None
+    _compaction_pending = False
+    _lock = threading.RLock()
+
+    @classmethod
+    def get_embeddings(cls) -> CachedEmbeddings:
+        """
+        Shared embeddings client: repeated chunk text is served from the on-disk
+        cache, misses go through the batched, rate-limited pipeline
+        """
+        if cls._embeddings is None:
+            with cls._lock:
+                if cls._embeddings is None:
+                    if settings.MODEL_PROVIDER == "local":
+                        client = LocalEmbeddings(settings.LOCAL_EMBEDDING_DIM)
+                    else:
+                        # Retries are handled per batch by the pipeline
+                        client = DashScopeEmbeddings(
+                            model=settings.EMBEDDING_MODEL,
+                            dashscope_api_key=settings.DASHSCOPE_API_KEY,
+                            max_retries=1
+                        )
+                    pipeline = BatchedEmbeddings(
+                        client,
+                        batch_size=min(settings.EMBEDDING_BATCH_SIZE, BATCH_SIZE.get(settings.EMBEDDING_MODEL, 25)),
+                        concurrency=settings.EMBEDDING_CONCURRENCY,
+                        rate_limit=settings.EMBEDDING_RATE_LIMIT,
+                        max_retries=settings.EMBEDDING_MAX_RETRIES
+                    )
+                    cls._embeddings = CachedEmbeddings(pipeline, cls.get_embedding_cache(), cls.embedding_model())
+        return cls._embeddings
+
+    @classmethod
+    def get_embedding_cache(cls) -> EmbeddingCache:
+        """The on-disk embedding cache alone, e.g. for its stats without a configured model"""
+        if cls._embedding_cache is None:
+            with cls._lock:
+                if cls._embedding_cache is None:
+                    cls._embedding_cache = EmbeddingCache(
+                        settings.EMBEDDING_CACHE_PATH,
+                        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+                    )
+        return cls._embedding_cache
+
+    @classmethod
+    def get_query_embedder(cls) -> QueryEmbedder:
+        """Shared question embedder: cached in memory, concurrent misses batched into one call"""
+        if cls._query_embedder is None:
+            with cls._lock:
+                if cls._query_embedder is None:
+                    if settings.MODEL_PROVIDER == "local":
+                        embed_batch = LocalEmbeddings(settings.LOCAL_EMBEDDING_DIM).embed_queries
+                    else:
+                        model = settings.EMBEDDING_MODEL
+                        embed_batch = lambda texts: DashScopeAsync.embed_queries(texts, model)
+                    cls._query_embedder = QueryEmbedder(
+                        embed_batch,
+                        cls.embedding_model(),
+                        max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+                        ttl=settings.QUERY_CACHE_TTL,
+                        batch_window=settings.QUERY_BATCH_WINDOW_MS / 1000,
+                        max_batch=BATCH_SIZE.get(settings.EMBEDDING_MODEL, 25)
+                    )
+        return cls._query_embedder
+
+    @staticmethod
+    def embedding_model() -> str:
+        """Cache key of the embedding model, so local vectors never mix with real ones"""
+        if settings.MODEL_PROVIDER == "local":
+            return f"local-hash-{settings.LOCAL_EMBEDDING_DIM}"
+        return settings.EMBEDDING_MODEL
+
+    @classmethod
+    async def embed_query(cls, question: str) -> list[float]:
+        """Question embedding, unit-normalized like the indexed vectors"""
+        vector = np.array([await cls.get_query_embedder().embed(question)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector[0].tolist()
+
+    @classmethod
+    def embed_texts(cls, texts: list[str]) -> np.ndarray:
+        """
+        Chunk embeddings through the shared cache and pipeline, as a float32 matrix.
+        Rows are unit-normalized (DashScope vectors are not), so L2 distances map to cosine similarity.
+        """
+        start = time.perf_counter()
+        vectors = np.array(cls.get_embeddings().embed_documents(texts), dtype=np.float32)
+        if len(vectors):
+            faiss.normalize_L2(vectors)
+        STAGE_SECONDS.observe(time.perf_counter() - start, pipeline="index", stage="embed")
+        return vectors
+
+    @classmethod
+    def get_store(cls) -> Optional[IndexedStore]:
+        """
+        Return the current store, mapping the shards from disk on first use and
+        again whenever a new snapshot has been published (by any process).
+        Returns None when no index has been built yet.
+        """
+        if not cls._loaded or cls._file_stamp(cls._current_file()) != cls._stamp:
+            with cls._lock:
+                if not cls._loaded or cls._file_stamp(cls._current_file()) != cls._stamp:
+                    cls._store = cls._load_from_disk()
+                    cls._loaded = True
+        return cls._store
+
+    @classmethod
+    def add_documents(cls, chunks: list[Document], replace_doc_id: Optional[str] = None):
+        """
+        Embed chunks and append them to the active shard as a new snapshot.
+        All vectors are computed first and added to the index in one bulk operation.
+        With replace_doc_id, that document's previous chunks are dropped in the same swap.
+        """
+        if not chunks:
+            return
+        # Embed before queueing so concurrent writers only serialize on the swap
+        vectors = cls.embed_texts([c.page_content for c in chunks])
+        cls._write(cls._add, chunks, vectors, replace_doc_id)
+        CHUNKS_EMBEDDED.inc(len(chunks), pipeline="ingest")
+        cls.schedule_compaction()
+
+    @classmethod
+    def delete_doc(cls, doc_id: str) -> int:
+        """Remove one document's vectors and chunks. Returns the number removed."""
+        removed = cls._write(cls._delete, doc_id)
+        if removed:
+            cls.schedule_compaction()
+        return removed
+
+    @classmethod
+    def promote(cls, staging):
+        """
+        Replace the whole index with a finished StagingIndex (full rebuilds), in
+        one snapshot. Writes that reached the live index while the rebuild ran win
+        over the staged copies of their documents and are carried over.
+        """
+        cls._write(cls._promote, staging)
+        cls.schedule_compaction()
+
+    @classmethod
+    def schedule_compaction(cls):
+        """Queue one compaction pass behind the pending writes unless one is already waiting"""
+        with cls._lock:
+            if cls._compaction_pending:
+                return
+            cls._compaction_pending = True
+        cls._writer_executor().submit(cls._compact_all)
+
+    @staticmethod
+    def has_legacy_index() -> bool:
+        """
+        Whether the LangChain index of an earlier version is still on disk. It is
+        never loaded: its chunks carry no document IDs, so it is migrated by a full
+        rebuild from the document registry, and removed once that is published.
+        """
+        return any(os.path.exists(os.path.join(settings.VECTOR_DB_DIR, f)) for f in LEGACY_INDEX_FILES)
+
+    @classmethod
+    def stats(cls) -> dict:
+        store = cls.get_store()
+        shards = []
+        if store is not None:
+            for name, index in store.shards.items():
+                base = index_factory.base_index(index)
+                shards.append({"name": name, "vectors": index.ntotal, "type": type(base).__name__})
+        return {
+            "generation": cls._generation,
+            "snapshot": cls._version,
+            "vectors": sum(s["vectors"] for s in shards),
+            "shards": shards
+        }
+
+    @classmethod
+    def shutdown(cls):
+        if cls._writer is not None:
+            # An interrupted write never reached its swap, so it is simply lost
+            cls._writer.shutdown(wait=False, cancel_futures=True)
+        if cls._search_pool is not None:
+            cls._search_pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def chunk_id(doc_id: str, ordinal: int) -> str:
+        """Stable ID of a chunk: owning document plus chunk ordinal."""
+        return f"{doc_id}:{ordinal}"
+
+    @classmethod
+    def _writer_executor(cls) -> ThreadPoolExecutor:
+        if cls._writer is None:
+            with cls._lock:
+                if cls._writer is None:
+                    cls._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-writer")
+        return cls._writer
+
+    @classmethod
+    def _write(cls, fn, *args):
+        """Run fn on the writer thread after the writes queued before it, and wait for its result"""
+        return cls._writer_executor().submit(cls._timed, fn, time.perf_counter(), *args).result()
+
+    @classmethod
+    def _timed(cls, fn, queued_at: float, *args):
+        # Queue time includes waiting for writers in other processes
+        with cls._store_lock():
+            start = time.perf_counter()
+            STAGE_SECONDS.observe(start - queued_at, pipeline="index", stage="write_queue")
+            try:
+                return fn(*args)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, pipeline="index", stage=fn.__name__.lstrip("_"))
+
+    @staticmethod
+    def _store_lock() -> FileLock:
+        return FileLock(os.path.join(settings.VECTOR_DB_DIR, LOCK_FILE))
+
+    # The methods below run on the writer thread only
+
+    @classmethod
+    def _add(cls, chunks: list[Document], vectors: np.ndarray, replace_doc_id: Optional[str]):
+        cls.get_store()
+        manifest = cls._read_manifest()
+        stale = ChunkStore.shards_of(ChunkStore.doc_vector_ids(replace_doc_id)) if replace_doc_id else {}
+        changed = cls._remove_from_shards(manifest, stale)
+
+        active = manifest["shards"][-1] if manifest["shards"] else None
+        if active is not None and active not in changed:
+            changed[active] = cls._writable_shard(manifest, active)
+        if active is None or changed[active].ntotal >= settings.SHARD_MAX_VECTORS:
+            active = cls._new_shard_name(manifest)
+            # New shards start Flat; compaction trains them once they are large enough
+            changed[active] = index_factory.build_index(vectors, "flat")
+            manifest["shards"].append(active)
+
+        # Rows first: a reader on the old snapshot never sees the new IDs
+        ids = np.array(ChunkStore.add(chunks, shard=active), dtype=np.int64)
+        changed[active].add_with_ids(vectors, ids)
+        cls._publish(manifest, changed)
+        ChunkStore.delete([i for ids in stale.values() for i in ids])
+
+    @classmethod
+    def _delete(cls, doc_id: str) -> int:
+        if cls.get_store() is None:
+            return 0
+        stale = ChunkStore.shards_of(ChunkStore.doc_vector_ids(doc_id))
+        removed = sum(len(ids) for ids in stale.values())
+        if not removed:
+            logger.info(f"No chunks indexed for doc {doc_id}")
+            return 0
+        manifest = cls._read_manifest()
+        cls._publish(manifest, cls._remove_from_shards(manifest, stale))
+        ChunkStore.delete([i for ids in stale.values() for i in ids])
+        logger.info(f"Removed {removed} chunks of doc {doc_id} from the index")
+        return removed
+
+    @classmethod
+    def _promote(cls, staging):
+        newer = ChunkStore.chunks_after(staging.marker, exclude_shards=staging.shards)
+        if newer:
+            logger.info(f"Carrying over {len(newer)} chunks written during the rebuild")
+            staged_ids = [i for doc_id in {c.metadata.get("doc_id") for c in newer}
+                          for i in ChunkStore.doc_vector_ids(doc_id)]
+            staging.remove(ChunkStore.shards_of(staged_ids))
+            # Just embedded by their own writes, so served from the embedding cache
+            staging.add(newer, cls.embed_texts([c.page_content for c in newer]))
+        staging.drop_orphans()
+        files = staging.finish()
+
+        cls.get_store()
+        manifest = cls._read_manifest()
+        manifest["shards"] = list(files)
+        cls._publish(manifest, {}, moved=files)
+        ChunkStore.delete_outside_shards(manifest["shards"])
+        staging.cleanup()
+        # Only now that CURRENT names the rebuilt index is a legacy one no longer needed
+        for file_name in LEGACY_INDEX_FILES:
+            path = os.path.join(settings.VECTOR_DB_DIR, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"Removed legacy index file {file_name}")
+
+    @classmethod
+    def _compact_all(cls):
+        with cls._lock:
+            cls._compaction_pending = False
+        try:
+            # One step per queue slot, so writes queued meanwhile are not held up
+            with cls._store_lock():
+                compacted = cls._compact_step()
+            if compacted:
+                cls.schedule_compaction()
+        except Exception as e:
+            logger.error(f"Shard compaction failed: {e}")
+
+    @classmethod
+    def _compact_step(cls) -> bool:
+        store = cls.get_store()
+        if store is None:
+            return False
+        manifest = cls._read_manifest()
+        shards = [shard for shard in manifest["shards"] if shard in store.shards]
+        sealed = shards[:-1]
+
+        # Shards (the active one included) are trained into the configured approximate
+        # type once they reach INDEX_MIN_VECTORS, and IVF ones retrained as they grow
+        for shard in shards:
+            if index_factory.needs_training(store.shards[shard]):
+                logger.info(f"Compaction: building {settings.INDEX_TYPE} index for shard {shard}")
+                ids, vectors = cls._shard_contents(manifest, shard)
+                trained = index_factory.build_index(vectors)
+                trained.add_with_ids(vectors, ids)
+                cls._publish(manifest, {shard: trained})
+                return True
+
+        # Shards thinned out by deletes are merged pairwise
+        small = sorted((store.shards[shard].ntotal, shard) for shard in sealed
+                       if store.shards[shard].ntotal < settings.SHARD_MAX_VECTORS * SHARD_MERGE_FRACTION)
+        if len(small) < 2:
+            return False
+        (_, first), (_, second) = small[:2]
+        ids, vectors = [], []
+        for shard in (first, second):
+            shard_ids, shard_vectors = cls._shard_contents(manifest, shard)
+            ids.append(shard_ids)
+            vectors.append(shard_vectors)
+        ids, vectors = np.concatenate(ids), np.concatenate(vectors)
+        merged = index_factory.build_index(vectors)
+        merged.add_with_ids(vectors, ids)
+        logger.info(f"Compaction: merging shards {first} and {second} ({len(ids)} vectors)")
+        manifest["shards"] = [s for s in manifest["shards"] if s != second]
+        cls._publish(manifest, {first: merged})
+        ChunkStore.set_shard(ids.tolist(), first)
+        return True
+
+    @classmethod
+    def _remove_from_shards(cls, manifest: dict, stale: dict[str, list[int]]) -> dict[str, faiss.Index]:
+        """Private copies of the shards in `stale` with those vector IDs removed"""
+        changed = {}
+        for shard, ids in stale.items():
+            if shard in manifest["files"]:
+                changed[shard] = cls._without(cls._writable_shard(manifest, shard), ids)
+        return changed
+
+    @classmethod
+    def _publish(cls, manifest: dict, changed: dict[str, faiss.Index], moved: Optional[dict[str, str]] = None):
+        """
+        Write the next snapshot: new files for the changed shards (dropping the ones
+        left empty) or moved in from elsewhere, then its manifest, then the CURRENT
+        swap. Reloads this process's view and garbage-collects old snapshots.
+        """
+        version = manifest["version"] + 1
+        os.makedirs(cls._shards_dir(), exist_ok=True)
+        for shard, path in (moved or {}).items():
+            file_name = f"{shard}.v{version:08d}.faiss"
+            os.replace(path, os.path.join(cls._shards_dir(), file_name))
+            manifest["files"][shard] = file_name
+        for shard, index in changed.items():
+            if index.ntotal == 0:
+                manifest["shards"] = [s for s in manifest["shards"] if s != shard]
+            else:
+                file_name = f"{shard}.v{version:08d}.faiss"
+                index_factory.write_index(index, os.path.join(cls._shards_dir(), file_name))
+                manifest["files"][shard] = file_name
+        manifest["version"] = version
+        manifest["files"] = {shard: manifest["files"][shard] for shard in manifest["shards"]}
+        cls._write_manifest(manifest)
+
+        with cls._lock:
+            cls._store = cls._load_from_disk()
+            cls._loaded = True
+            cls._generation += 1
+        logger.info(f"Vector store snapshot {version}: "
+                    f"{cls._store.ntotal if cls._store else 0} vectors in {len(manifest['shards'])} shards")
+        cls._collect_garbage()
+
+    @classmethod
+    def _collect_garbage(cls):
+        """Drop manifests older than the retained snapshots and shard files none of them uses"""
+        try:
+            manifests = sorted(f for f in os.listdir(cls._manifests_dir()) if f.endswith(".json"))
+            retained = manifests[-max(1, settings.SNAPSHOTS_RETAINED):]
+            referenced = set()
+            for name in retained:
+                with open(os.path.join(cls._manifests_dir(), name), "r", encoding="utf-8") as f:
+                    referenced.update(json.load(f)["files"].values())
+            stale = [os.path.join(cls._manifests_dir(), name) for name in manifests if name not in retained]
+            if os.path.exists(cls._shards_dir()):
+                # Includes .tmp files of writes interrupted by a crash
+                stale += [os.path.join(cls._shards_dir(), name) for name in os.listdir(cls._shards_dir())
+                          if name not in referenced]
+            for path in stale:
+                os.remove(path)
+        except Exception as e:
+            logger.warning(f"Snapshot garbage collection failed: {e}")
+
+    @staticmethod
+    def _current_file() -> str:
+        return os.path.join(settings.VECTOR_DB_DIR, CURRENT_FILE)
+
+    @staticmethod
+    def _manifests_dir() -> str:
+        return os.path.join(settings.VECTOR_DB_DIR, "manifests")
+
+    @staticmethod
+    def _shards_dir() -> str:
+        return os.path.join(settings.VECTOR_DB_DIR, "shards")
+
+    @classmethod
+    def _shard_file(cls, manifest: dict, shard: str) -> str:
+        return os.path.join(cls._shards_dir(), manifest["files"][shard])
+
+    @staticmethod
+    def _file_stamp(path: str) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @classmethod
+    def _read_manifest(cls) -> dict:
+        """Manifest of the current snapshot: {"version", "shards" (ordered), "files", "next_shard"}"""
+        try:
+            with open(cls._current_file(), "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return {"version": 0, "shards": [], "files": {}, "next_shard": 1}
+        with open(os.path.join(cls._manifests_dir(), name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def _write_manifest(cls, manifest: dict):
+        """Write the snapshot's manifest, then point CURRENT at it; each step is write then rename"""
+        os.makedirs(cls._manifests_dir(), exist_ok=True)
+        name = f"manifest-{manifest['version']:08d}.json"
+        path = os.path.join(cls._manifests_dir(), name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        tmp_path = cls._current_file() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, cls._current_file())
+
+    @staticmethod
+    def _new_shard_name(manifest: dict) -> str:
+        name = f"shard-{manifest['next_shard']:05d}"
+        manifest["next_shard"] += 1
+        return name
+
+    @classmethod
+    def _writable_shard(cls, manifest: dict, shard: str) -> faiss.Index:
+        """Private in-memory copy of a published shard for a writer to modify"""
+        return index_factory.read_index(cls._shard_file(manifest, shard), mmap=False)
+
+    @classmethod
+    def _shard_contents(cls, manifest: dict, shard: str) -> tuple[np.ndarray, np.ndarray]:
+        """(vector IDs, vectors) of a shard; IVF shards get theirs back from the embedding cache"""
+        stored = index_factory.stored_vectors(cls._writable_shard(manifest, shard))
+        if stored is not None:
+            return stored
+        ids = ChunkStore.shard_vector_ids(shard)
+        docs = ChunkStore.get_many(ids)
+        ids = [i for i in ids if i in docs]
+        return np.array(ids, dtype=np.int64), cls.embed_texts([docs[i].page_content for i in ids])
+
+    @classmethod
+    def _without(cls, index: faiss.Index, stale_ids: list[int]) -> faiss.Index:
+        if index_factory.supports_removal(index):
+            index.remove_ids(np.array(stale_ids, dtype=np.int64))
+            return index
+        return cls._rebuilt(index, stale_ids)
+
+    @staticmethod
+    def _rebuilt(index: faiss.Index, stale_ids: list[int]) -> faiss.Index:
+        """Rebuild an ID-mapped index of the configured type from its own vectors, minus stale_ids"""
+        ids, vectors = index_factory.stored_vectors(index)
+        keep = ~np.isin(ids, np.array(stale_ids, dtype=np.int64))
+        ids, vectors = ids[keep], vectors[keep]
+        if len(ids) == 0:
+            return faiss.index_factory(index.d, "IDMap2,Flat")
+        new_index = index_factory.build_index(vectors)
+        new_index.add_with_ids(vectors, ids)
+        return new_index
+
+    @classmethod
+    def _load_from_disk(cls) -> Optional[IndexedStore]:
+        cls._stamp = cls._file_stamp(cls._current_file())
+        if cls._stamp is None:
+            cls._mapped = {}
+            return None
+        try:
+            manifest = cls._read_manifest()
+            cls._version = manifest["version"]
+            # Shard files are immutable: keep the mappings of files still in use
+            mapped = {}
+            for shard in manifest["shards"]:
+                file_name = manifest["files"][shard]
+                index = cls._mapped.get(file_name)
+                if index is None:
+                    index = index_factory.read_index(os.path.join(cls._shards_dir(), file_name))
+                mapped[file_name] = index
+            cls._mapped = mapped
+            if not mapped:
+                return None
+            if cls._search_pool is None:
+                cls._search_pool = ThreadPoolExecutor(
+                    max_workers=settings.SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search"
+                )
+            store = IndexedStore({shard: mapped[manifest["files"][shard]] for shard in manifest["shards"]},
+                                 cls._search_pool)
+            logger.info(f"Mapped snapshot {cls._version}: {len(mapped)} index shards with {store.ntotal} vectors")
+            return store
+        except Exception as e:
+            logger.error(f"Failed to load vector store: {e}")
+            return None
@@ -1,5 +1,6 @@
 import os
-from typing import List
+from concurrent.futures import Executor
+from typing import List, Iterator, Optional
 import logging
 import pdfplumber
 import docx
@@ -10,14 +11,57 @@ import chardet
 # Suppress pdfminer warnings about FontBBox
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
+# Bump when parsing output changes so cached parsed text is regenerated
+PARSER_VERSION = 1
+
+# Pages extracted per worker task when a PDF is parsed in parallel
+PDF_PAGES_PER_TASK = 16
+
 class DocParser:
     @staticmethod
     def parse_pdf(file_path: str) -> str:
-        text = ""
+        return "\n".join(p["text"] for p in DocParser.iter_pdf_pages(file_path))
+
+    @staticmethod
+    def pdf_page_count(file_path: str) -> int:
         with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
+            return len(pdf.pages)
+
+    @staticmethod
+    def extract_pdf_pages(file_path: str, start: int, end: int) -> List[dict]:
+        """Extract pages start..end (1-based, inclusive). Runs inside parse workers."""
+        pages = []
+        with pdfplumber.open(file_path) as pdf:
+            for number in range(start, end + 1):
+                page = pdf.pages[number - 1]
+                # extract_text() returns None for pages without a text layer
+                pages.append({"page": number, "text": page.extract_text() or ""})
+                # Release the page's parsed objects; long PDFs otherwise keep them all
+                page.close()
+        return pages
+
+    @staticmethod
+    def iter_pdf_pages(file_path: str, executor: Optional[Executor] = None) -> Iterator[dict]:
+        """
+        Yield PDF pages in order as {"page": n, "text": ...}.
+        With an executor, page ranges are extracted in parallel and each range is
+        yielded as soon as it and the ranges before it are done.
+        """
+        total = DocParser.pdf_page_count(file_path)
+        if executor is None or total <= PDF_PAGES_PER_TASK:
+            for start in range(1, total + 1, PDF_PAGES_PER_TASK):
+                yield from DocParser.extract_pdf_pages(file_path, start, min(start + PDF_PAGES_PER_TASK - 1, total))
+            return
+        futures = [
+            executor.submit(DocParser.extract_pdf_pages, file_path, start, min(start + PDF_PAGES_PER_TASK - 1, total))
+            for start in range(1, total + 1, PDF_PAGES_PER_TASK)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
 
     @staticmethod
     def parse_docx(file_path: str) -> str:
@@ -41,6 +85,29 @@ class DocParser:
         
         return raw_data.decode(encoding)
 
+    @staticmethod
+    def iter_pages(file_path: str, executor: Optional[Executor] = None) -> Iterator[dict]:
+        """
+        Stream a document as pages: {"page": 1, "text": "..."}, ...
+        Formats without real pages are yielded as a single page.
+        With an executor, the parsing work runs there.
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == ".pdf":
+            yield from DocParser.iter_pdf_pages(file_path, executor)
+        elif executor is not None:
+            yield {"page": 1, "text": executor.submit(DocParser.parse, file_path).result()}
+        else:
+            yield {"page": 1, "text": DocParser.parse(file_path)}
+
+    @staticmethod
+    def parse_pages(file_path: str) -> List[dict]:
+        return list(DocParser.iter_pages(file_path))
+
+    @staticmethod
+    def join_pages(pages: List[dict]) -> str:
+        return "\n".join(p["text"] for p in pages)
+
     @staticmethod
     def parse(file_path: str) -> str:
         ext = os.path.splitext(file_path)[1].lower()
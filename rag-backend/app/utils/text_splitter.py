@@ -0,0 +1,168 @@
+import re
+from functools import lru_cache
+from typing import List, Tuple
+from langchain_core.documents import Document
+
+# Places a chunk may end, by level, best first: paragraph, sentence (Chinese
+# and Latin punctuation), line, clause, word. A break lies right after the
+# separator. Sentences rank above lines because extracted PDF text wraps lines
+# mid-sentence.
+BREAK_LEVELS = (
+    ("\n\n",),
+    ("。", "！", "？", "!", "?", "…", "；", ";", ". ", ".\n"),
+    ("\n",),
+    ("，", "、", ",", "：", ":"),
+    (" ", "\t"),
+)
+# Closing quotes and brackets stay with the sentence they end
+CLOSING = frozenset("”’」』》）)\"'")
+
+# A break closer than this share of chunk_size to the chunk start is ignored
+# in favour of a weaker break further on, so chunks do not end up tiny
+MIN_CHUNK_FILL = 0.3
+
+# Header levels split on in Markdown, with the metadata key each one sets
+MARKDOWN_HEADERS = (("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3"))
+MARKDOWN_HEADER_RE = re.compile(r"(#{1,6})[ \t]+(.*?)[ \t#]*$")
+
+
+class TextSplitter:
+    """
+    Single-pass chunker working on character offsets.
+
+    Each chunk ends at the strongest break that fits in chunk_size, found by
+    searching backwards from the size limit (str.rfind, so the text is only
+    scanned where a chunk ends), and the next one starts at the first break
+    inside the overlap window. Only the chunks themselves are sliced out of the
+    text. Stateless, so one instance serves every thread.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int = 0):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.min_fill = int(chunk_size * MIN_CHUNK_FILL)
+
+    def split_offsets(self, text: str, lo: int = 0, hi: int = None) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the chunks of text[lo:hi], whitespace trimmed"""
+        hi = len(text) if hi is None else hi
+        spans = []
+        start = self._skip_space(text, lo, hi)
+        while start < hi:
+            end = self._chunk_end(text, start, hi)
+            trimmed = end
+            while trimmed > start and text[trimmed - 1].isspace():
+                trimmed -= 1
+            spans.append((start, trimmed))
+            if end >= hi:
+                break
+            start = self._skip_space(text, self._next_start(text, start, end), hi)
+        return spans
+
+    def split(self, text: str, metadata: dict = None) -> List[Document]:
+        """Chunks of text carrying their start/end offsets (plus `metadata`)"""
+        return [
+            Document(page_content=text[start:end], metadata={**(metadata or {}), "start": start, "end": end})
+            for start, end in self.split_offsets(text)
+        ]
+
+    def _chunk_end(self, text: str, start: int, hi: int) -> int:
+        limit = start + self.chunk_size
+        if limit >= hi:
+            return hi
+        earliest = start + self.min_fill
+        for separators in BREAK_LEVELS:
+            end = max(text.rfind(sep, earliest, limit) + len(sep) for sep in separators)
+            if end > earliest:
+                return self._after_closing(text, end, limit)
+        # Nothing to break on (e.g. one long unpunctuated run): cut at the size
+        return limit
+
+    def _next_start(self, text: str, start: int, end: int) -> int:
+        if not self.chunk_overlap:
+            return end
+        window = max(end - self.chunk_overlap, start + 1)
+        # The earliest break in the overlap window keeps the most context that starts cleanly
+        for separators in BREAK_LEVELS:
+            found = [pos + len(sep) for sep in separators if (pos := text.find(sep, window, end)) != -1]
+            if found and min(found) < end:
+                return self._after_closing(text, min(found), end)
+        return window
+
+    @staticmethod
+    def _after_closing(text: str, pos: int, limit: int) -> int:
+        while pos < limit and text[pos] in CLOSING:
+            pos += 1
+        return pos
+
+    @staticmethod
+    def _skip_space(text: str, pos: int, hi: int) -> int:
+        while pos < hi and text[pos].isspace():
+            pos += 1
+        return pos
+
+
+class MarkdownSplitter:
+    """
+    Splits Markdown into sections at the configured header levels (ignoring
+    fenced code blocks) in one pass over the lines, then chunks each section
+    with a TextSplitter. Header lines are not part of the chunks; the headers
+    in effect are kept as metadata, and offsets refer to the whole text.
+    """
+
+    def __init__(self, text_splitter: TextSplitter, headers: tuple = MARKDOWN_HEADERS):
+        self.text_splitter = text_splitter
+        self.headers = dict(headers)
+        self.levels = {key: len(marker) for marker, key in headers}
+
+    def split(self, text: str, metadata: dict = None) -> List[Document]:
+        chunks = []
+        for lo, hi, section_meta in self.sections(text):
+            for start, end in self.text_splitter.split_offsets(text, lo, hi):
+                chunks.append(Document(
+                    page_content=text[start:end],
+                    metadata={**(metadata or {}), **section_meta, "start": start, "end": end}
+                ))
+        return chunks
+
+    def sections(self, text: str) -> List[Tuple[int, int, dict]]:
+        """(start, end, headers in effect) of the text between header lines"""
+        sections = []
+        # Header key -> title of the headers in effect
+        current: dict = {}
+        section_start = 0
+        fence = None
+        pos = 0
+        while pos < len(text):
+            line_end = text.find("\n", pos)
+            line_end = len(text) if line_end == -1 else line_end
+            line = text[pos:line_end].strip()
+            if fence:
+                if line.startswith(fence):
+                    fence = None
+            elif line.startswith(("```", "~~~")):
+                fence = line[:3]
+            elif line.startswith("#"):
+                match = MARKDOWN_HEADER_RE.match(line)
+                if match and match.group(1) in self.headers:
+                    if pos > section_start:
+                        sections.append((section_start, pos, dict(current)))
+                    key = self.headers[match.group(1)]
+                    current = {k: v for k, v in current.items() if self.levels[k] < self.levels[key]}
+                    current[key] = match.group(2)
+                    section_start = line_end + 1
+            pos = line_end + 1
+        if section_start < len(text):
+            sections.append((section_start, len(text), dict(current)))
+        return sections
+
+
+@lru_cache(maxsize=8)
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> TextSplitter:
+    return TextSplitter(chunk_size, chunk_overlap)
+
+
+@lru_cache(maxsize=8)
+def get_markdown_splitter(chunk_size: int, chunk_overlap: int) -> MarkdownSplitter:
+    return MarkdownSplitter(get_text_splitter(chunk_size, chunk_overlap))
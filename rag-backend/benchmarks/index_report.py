@@ -0,0 +1,117 @@
+"""
+Offline recall/latency report for the configurable FAISS index types.
+
+Every configuration is built over the same vectors and compared with exact
+(Flat) search: recall@k is the share of the exact top-k neighbours it returns.
+
+Usage (from rag-backend/):
+    python -m benchmarks.index_report                      # vectors of the current index shards
+    python -m benchmarks.index_report --synthetic 100000   # random vectors, no index needed
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import get_settings
+from app.services import index_factory
+from app.services.vector_store import VectorStoreManager
+
+settings = get_settings()
+
+# (index type, overrides of the vector_db.index settings)
+CONFIGURATIONS = [
+    ("ivf_flat", {"INDEX_NPROBE": 8}),
+    ("ivf_flat", {"INDEX_NPROBE": 32}),
+    ("ivf_pq", {"INDEX_NPROBE": 16}),
+    ("ivf_pq", {"INDEX_NPROBE": 64}),
+    ("hnsw", {"INDEX_EF_SEARCH": 32}),
+    ("hnsw", {"INDEX_EF_SEARCH": 128}),
+]
+
+
+def load_vectors(synthetic: int, dim: int) -> np.ndarray:
+    if synthetic:
+        rng = np.random.default_rng(0)
+        return rng.standard_normal((synthetic, dim)).astype(np.float32)
+    store = VectorStoreManager.get_store()
+    if store is None:
+        sys.exit(f"No index under {settings.VECTOR_DB_DIR}; build one or pass --synthetic N")
+    vectors = []
+    for shard, index in store.shards.items():
+        stored = index_factory.stored_vectors(index)
+        if stored is None:
+            sys.exit(f"Shard {shard} cannot return its vectors (IVF); use --synthetic N")
+        vectors.append(stored[1])
+    return np.concatenate(vectors)
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int) -> tuple[np.ndarray, list[float]]:
+    """Search one query at a time (as chat does) and return the labels and per-query latencies"""
+    labels, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, found = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        labels.append(found[0])
+    return np.array(labels), latencies
+
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, exact))
+    return hits / exact.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of the current index")
+    parser.add_argument("--dim", type=int, default=1536, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=settings.TOP_K)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.synthetic, args.dim)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, like questions close to some chunk
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, 0.05, (len(picks), vectors.shape[1])).astype(np.float32)
+
+    # Report every configuration regardless of the Flat fallback threshold
+    settings.INDEX_MIN_VECTORS = 0
+
+    rows = []
+    ids = np.arange(len(vectors), dtype=np.int64)
+    flat = index_factory.build_index(vectors, "flat")
+    flat.add_with_ids(vectors, ids)
+    exact, latencies = search(flat, queries, args.k)
+    rows.append(("flat", "Flat", 0.0, 1.0, latencies, flat))
+
+    defaults = {field: getattr(settings, field) for _, overrides in CONFIGURATIONS for field in overrides}
+    for index_type, overrides in CONFIGURATIONS:
+        for field, value in {**defaults, **overrides}.items():
+            setattr(settings, field, value)
+        start = time.perf_counter()
+        index = index_factory.build_index(vectors, index_type)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - start
+        found, latencies = search(index, queries, args.k)
+        params = ", ".join(f"{f.removeprefix('INDEX_').lower()}={v}" for f, v in overrides.items())
+        label = index_factory.index_description(index_type, vectors.shape[1], len(vectors))
+        rows.append((index_type, f"{label} ({params})", build_seconds, recall(found, exact), latencies, index))
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}\n")
+    print(f"{'type':<10} {'index':<36} {'build s':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'MB':>8}")
+    for index_type, label, build_seconds, rec, latencies, index in rows:
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        print(
+            f"{index_type:<10} {label:<36} {build_seconds:>8.2f} {rec:>7.3f} "
+            f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 95):>8.3f} {size_mb:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+End-to-end offline benchmark: ingestion and question answering over a synthetic
+corpus, with the local embedding and generation stand-ins (no API key needed).
+
+Generates PDF/DOCX/MD/TXT documents, ingests them stage by stage into a fresh
+data directory, then asks questions through the chat pipeline. Per-stage timings
+(parse, split, embed, index write, load, query embedding, search, first token,
+answer) are reported as p50/p95/p99 together with throughput, and written as
+JSON so runs can be compared between releases.
+
+Usage (from rag-backend/):
+    python -m benchmarks.run_benchmark
+    python -m benchmarks.run_benchmark --docs 200 --paragraphs 60 --queries 500 -o results.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+FORMATS = ("pdf", "docx", "md", "txt")
+
+# Synthetic vocabulary; PDFs use the ASCII one since the minimal writer has no CJK font
+ZH_WORDS = [
+    "向量", "索引", "检索", "文档", "模型", "分块", "嵌入", "缓存", "延迟", "吞吐", "查询", "知识库",
+    "系统", "数据", "服务", "配置", "性能", "存储", "问答", "上下文", "相似度", "召回", "排序", "快照",
+]
+EN_WORDS = [
+    "vector", "index", "retrieval", "document", "model", "chunk", "embedding", "cache", "latency",
+    "throughput", "query", "knowledge", "system", "data", "service", "config", "performance",
+    "storage", "answer", "context", "similarity", "recall", "ranking", "snapshot", "shard", "token",
+]
+
+
+def sentence(rng: random.Random, chinese: bool) -> str:
+    words = rng.choices(ZH_WORDS if chinese else EN_WORDS, k=rng.randint(8, 20))
+    if chinese:
+        return "".join(words) + "。"
+    return " ".join(words).capitalize() + "."
+
+
+def paragraphs(rng: random.Random, count: int, chinese: bool) -> list[str]:
+    return [(" " if not chinese else "").join(sentence(rng, chinese) for _ in range(rng.randint(3, 8)))
+            for _ in range(count)]
+
+
+def write_pdf(path: str, pages: list[list[str]]):
+    """Minimal text-only PDF (Helvetica, one line per string) that pdfplumber can read"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        text = "".join(
+            f"({line.replace(chr(92), '').replace('(', '').replace(')', '')}) Tj T* " for line in lines
+        )
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def wrap(text: str, width: int = 95) -> list[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    return lines + [line] if line else lines
+
+
+def generate_corpus(directory: str, docs: int, paragraph_count: int, formats: list[str], seed: int) -> list[str]:
+    import docx
+
+    rng = random.Random(seed)
+    paths = []
+    for i in range(docs):
+        fmt = formats[i % len(formats)]
+        path = os.path.join(directory, f"doc-{i:05d}.{fmt}")
+        if fmt == "pdf":
+            lines = [line for p in paragraphs(rng, paragraph_count, chinese=False) for line in wrap(p) + [""]]
+            write_pdf(path, [lines[j:j + 70] for j in range(0, len(lines), 70)])
+        elif fmt == "docx":
+            document = docx.Document()
+            for p in paragraphs(rng, paragraph_count, chinese=True):
+                document.add_paragraph(p)
+            document.save(path)
+        elif fmt == "md":
+            with open(path, "w", encoding="utf-8") as f:
+                for j, p in enumerate(paragraphs(rng, paragraph_count, chinese=True)):
+                    if j % 5 == 0:
+                        f.write(f"## 第 {j // 5 + 1} 节\n\n")
+                    f.write(p + "\n\n")
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(paragraphs(rng, paragraph_count, chinese=True)))
+        paths.append(path)
+    return paths
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ms = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "total_s": round(float(ms.sum()) / 1000, 3),
+    }
+
+
+def configure(workdir: str, args):
+    """Point every store at workdir and switch to the local model stand-ins (before services are imported)"""
+    settings.MODEL_PROVIDER = "local"
+    settings.LOCAL_EMBEDDING_DIM = args.dim
+    settings.LOCAL_TOKEN_DELAY_MS = args.token_delay_ms
+    settings.LOCAL_PREFILL_MS_PER_1K_TOKENS = args.prefill_ms_per_1k_tokens
+    settings.EMBEDDING_RATE_LIMIT = 0
+    settings.UPLOAD_DIR = os.path.join(workdir, "docs")
+    settings.VECTOR_DB_DIR = os.path.join(workdir, "vector_db")
+    settings.PARSED_DIR = os.path.join(workdir, "parsed")
+    settings.DOC_REGISTRY_PATH = os.path.join(workdir, "registry.sqlite")
+    settings.EMBEDDING_CACHE_PATH = os.path.join(workdir, "embedding_cache.sqlite")
+    if args.index_type:
+        settings.INDEX_TYPE = args.index_type
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+
+
+def ingest(paths: list[str], timings: dict) -> tuple[int, list[str]]:
+    """Ingest documents stage by stage; returns the chunk count and some chunk texts to ask about"""
+    from app.utils.doc_parser import DocParser
+    from app.services.doc_service import DocService
+    from app.services.vector_store import VectorStoreManager
+
+    embeddings = VectorStoreManager.get_embeddings()
+    total_chunks, texts = 0, []
+    for path in paths:
+        doc_id = str(uuid.uuid4())
+        ext = os.path.splitext(path)[1].lower()
+
+        start = time.perf_counter()
+        pages = list(DocParser.iter_pages(path))
+        timings["parse"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chunks = DocService._split_pages(pages, ext)
+        timings["split"].append(time.perf_counter() - start)
+        DocService._tag_chunks(chunks, doc_id, os.path.basename(path))
+
+        start = time.perf_counter()
+        embeddings.embed_documents([c.page_content for c in chunks])
+        timings["embed"].append(time.perf_counter() - start)
+
+        # Vectors now come from the embedding cache, so this is the index write
+        start = time.perf_counter()
+        VectorStoreManager.add_documents(chunks)
+        timings["index_write"].append(time.perf_counter() - start)
+
+        total_chunks += len(chunks)
+        texts.extend(c.page_content for c in chunks)
+    return total_chunks, texts
+
+
+def measure_load(runs: int, timings: dict):
+    """Cold load of the published snapshot, as a fresh worker process does it"""
+    from app.services.vector_store import VectorStoreManager
+
+    for _ in range(runs):
+        VectorStoreManager._store, VectorStoreManager._loaded, VectorStoreManager._mapped = None, False, {}
+        start = time.perf_counter()
+        VectorStoreManager.get_store()
+        timings["load"].append(time.perf_counter() - start)
+
+
+async def ask(questions: list[str], top_k: int, timings: dict, prompt_tokens: list):
+    from app.services.vector_store import VectorStoreManager
+    from app.services.chat_service import ChatService
+
+    store = VectorStoreManager.get_store()
+    for question in questions:
+        # Retrieval stages on their own, then the full pipeline as a client sees it
+        start = time.perf_counter()
+        vector = await VectorStoreManager.embed_query(question)
+        timings["query_embed"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        store.similarity_search_with_score_by_vector(vector, k=top_k)
+        timings["search"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first_token = None
+        async for line in ChatService.chat_stream(question, top_k=top_k, threshold=-1.0):
+            event = json.loads(line)
+            if event["step"] == "answer" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif event["step"] == "completed":
+                prompt_tokens.append(event["context"]["tokens"])
+            elif event["step"] == "error":
+                raise RuntimeError(event["message"])
+        timings["answer"].append(time.perf_counter() - start)
+        if first_token is not None:
+            timings["first_token"].append(first_token)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40, help="documents in the synthetic corpus")
+    parser.add_argument("--paragraphs", type=int, default=30, help="paragraphs per document")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma-separated, assigned round-robin")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=settings.TOP_K)
+    parser.add_argument("--dim", type=int, default=settings.LOCAL_EMBEDDING_DIM, help="local embedding dimension")
+    parser.add_argument("--index-type", default=None, help="override vector_db.index.type")
+    parser.add_argument("--token-delay-ms", type=float, default=settings.LOCAL_TOKEN_DELAY_MS,
+                        help="simulated generation latency per streamed chunk")
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=settings.LOCAL_PREFILL_MS_PER_1K_TOKENS,
+                        help="simulated prompt processing time, so prompt size shows in first_token")
+    parser.add_argument("--load-runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="data directory to use (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus and index")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        sys.exit(f"Unknown formats {sorted(unknown)}, expected some of {FORMATS}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    configure(workdir, args)
+    timings = {name: [] for name in (
+        "parse", "split", "embed", "index_write", "load", "query_embed", "search", "first_token", "answer"
+    )}
+    try:
+        start = time.perf_counter()
+        paths = generate_corpus(settings.UPLOAD_DIR, args.docs, args.paragraphs, formats, args.seed)
+        corpus_bytes = sum(os.path.getsize(p) for p in paths)
+        print(f"Generated {len(paths)} documents ({corpus_bytes / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        chunks, texts = ingest(paths, timings)
+        ingest_seconds = time.perf_counter() - start
+        print(f"Ingested {chunks} chunks in {ingest_seconds:.1f}s")
+
+        measure_load(args.load_runs, timings)
+
+        rng = random.Random(args.seed + 1)
+        # Questions quote part of a chunk, like a user asking about a passage
+        questions = [t[:rng.randint(20, 60)] for t in rng.choices(texts, k=args.queries)]
+        start = time.perf_counter()
+        prompt_tokens = []
+        asyncio.run(ask(questions, args.k, timings, prompt_tokens))
+        query_seconds = time.perf_counter() - start
+    finally:
+        from app.services.vector_store import VectorStoreManager
+        VectorStoreManager.shutdown()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "docs": args.docs, "paragraphs": args.paragraphs, "formats": formats, "queries": args.queries,
+            "top_k": args.k, "dim": args.dim, "index_type": settings.INDEX_TYPE,
+            "chunk_size": settings.CHUNK_SIZE, "chunk_overlap": settings.CHUNK_OVERLAP,
+            "token_delay_ms": args.token_delay_ms, "prefill_ms_per_1k_tokens": args.prefill_ms_per_1k_tokens,
+            "seed": args.seed,
+        },
+        "corpus": {"documents": len(paths), "bytes": corpus_bytes, "chunks": chunks},
+        "stages": {name: summarize(samples) for name, samples in timings.items()},
+        "prompt_tokens": {
+            "mean": round(float(np.mean(prompt_tokens)), 1) if prompt_tokens else 0.0,
+            "max": max(prompt_tokens, default=0),
+        },
+        "throughput": {
+            "ingest_docs_per_s": round(len(paths) / ingest_seconds, 3),
+            "ingest_chunks_per_s": round(chunks / ingest_seconds, 3),
+            "ingest_mb_per_s": round(corpus_bytes / 1e6 / ingest_seconds, 3),
+            "queries_per_s": round(len(questions) / query_seconds, 3) if questions else 0.0,
+        },
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'stage':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in report["stages"].items():
+        if stats["count"]:
+            print(f"{name:<12} {stats['count']:>6} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    print("\n" + ", ".join(f"{k}={v}" for k, v in report["throughput"].items()))
+    print(f"prompt tokens: mean {report['prompt_tokens']['mean']}, max {report['prompt_tokens']['max']}")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from app.core.config import get_settings
+from app.services import doc_registry
+from app.services.vector_store import VectorStoreManager
+from app.services.chunk_store import ChunkStore
+from app.services.doc_registry import DocRegistry
+from app.services.answer_cache import get_answer_cache
+from app.services.doc_service import DocService
+from app.services.content_store import ContentStore
+from app.services.job_service import JobService
+
+settings = get_settings()
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Local model stand-ins and every store under tmp_path, with fresh service state"""
+    monkeypatch.setattr(settings, "MODEL_PROVIDER", "local")
+    monkeypatch.setattr(settings, "LOCAL_EMBEDDING_DIM", 64)
+    monkeypatch.setattr(settings, "LOCAL_TOKEN_DELAY_MS", 0)
+    monkeypatch.setattr(settings, "LOCAL_PREFILL_MS_PER_1K_TOKENS", 0)
+    monkeypatch.setattr(settings, "EMBEDDING_RATE_LIMIT", 0)
+    for name, path in [("UPLOAD_DIR", "docs"),
+                       ("VECTOR_DB_DIR", "vector_db"),
+                       ("PARSED_DIR", "parsed"),
+                       ("DOC_REGISTRY_PATH", "registry.sqlite"),
+                       ("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")]:
+        monkeypatch.setattr(settings, name, str(tmp_path / path))
+    os.makedirs(settings.UPLOAD_DIR)
+    monkeypatch.setattr(doc_registry, "LEGACY_METADATA_FILE", str(tmp_path / "docs" / "metadata.json"))
+
+    for name, value in [("_store", None), ("_loaded", False), ("_stamp", None), ("_version", 0),
+                        ("_mapped", {}), ("_embeddings", None), ("_embedding_cache", None),
+                        ("_query_embedder", None), ("_writer", None), ("_compaction_pending", False)]:
+        monkeypatch.setattr(VectorStoreManager, name, value)
+    # SQLite connections are per thread and tied to the old paths
+    monkeypatch.setattr(ChunkStore, "_local", threading.local())
+    monkeypatch.setattr(DocRegistry, "_local", threading.local())
+    monkeypatch.setattr(DocRegistry, "_initialized", False)
+    monkeypatch.setattr(DocService, "_recovery_lock", None)
+    monkeypatch.setattr(ContentStore, "_texts", OrderedDict())
+    monkeypatch.setattr(ContentStore, "_text_chars", 0)
+    get_answer_cache.cache_clear()
+
+    yield tmp_path
+
+    if DocService._recovery_lock is not None:
+        DocService._recovery_lock.release()
+    # Let queued compaction finish before the next test repoints the stores
+    if VectorStoreManager._writer is not None:
+        VectorStoreManager._writer.shutdown(wait=True)
+    get_answer_cache.cache_clear()
+
+
+@pytest.fixture
+def client(workspace):
+    """The API without its lifespan: no upload watcher or rebuild at startup"""
+    from app.main import app
+    return TestClient(app)
+
+
+def make_chunks(doc_id: str, texts: list[str], name: str = None) -> list[Document]:
+    """Chunks of one document as DocService tags them"""
+    return [
+        Document(
+            id=VectorStoreManager.chunk_id(doc_id, i),
+            page_content=text,
+            metadata={"doc_id": doc_id, "name": name or f"{doc_id}.txt", "page": 1}
+        )
+        for i, text in enumerate(texts)
+    ]
+
+
+def wait_for_writes():
+    """Block until the writes and compaction queued so far have run"""
+    VectorStoreManager._writer_executor().submit(lambda: None).result()
+
+
+def wait_for_jobs(timeout: float = 30):
+    """Block until every submitted ingestion job has finished"""
+    deadline = time.monotonic() + timeout
+    while any(job.finished_at is None for job in list(JobService._jobs.values())):
+        assert time.monotonic() < deadline, "jobs did not finish"
+        time.sleep(0.05)
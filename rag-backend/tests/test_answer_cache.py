@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import asyncio
+from app.core.config import get_settings
+from app.services.answer_cache import AnswerCache, get_answer_cache
+from app.services.chat_service import ChatService
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.chunk_store import ChunkStore
+from app.services.vector_store import VectorStoreManager
+
+settings = get_settings()
+
+CONTEXT = {"chunks": 1, "passages": 1, "tokens": 10}
+
+
+def store(cache: AnswerCache, vector, chunk_ids=("a:0",), doc_ids=("a",), model="m", parts=("答案",)):
+    cache.put(vector, list(chunk_ids), model, doc_ids, list(parts), CONTEXT, cache.version)
+
+
+def test_near_identical_question_with_same_chunks_hits():
+    cache = AnswerCache(similarity=0.95)
+    store(cache, [1.0, 0.0])
+    assert cache.get([1.0, 0.01], ["a:0"], "m")["parts"] == ["答案"]
+    assert cache.get([0.0, 1.0], ["a:0"], "m") is None
+    # Other chunks, another order or another model mean another prompt
+    assert cache.get([1.0, 0.0], ["a:1"], "m") is None
+    assert cache.get([1.0, 0.0], ["a:0", "b:0"], "m") is None
+    assert cache.get([1.0, 0.0], ["a:0"], "other") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidation_drops_answers_drawing_on_the_documents():
+    cache = AnswerCache()
+    store(cache, [1.0, 0.0], chunk_ids=("a:0", "b:0"), doc_ids=("a", "b"))
+    store(cache, [0.0, 1.0], chunk_ids=("c:0",), doc_ids=("c",))
+    cache.invalidate_docs(["b"])
+    assert cache.get([1.0, 0.0], ["a:0", "b:0"], "m") is None
+    assert cache.get([0.0, 1.0], ["c:0"], "m") is not None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_answer_generated_across_an_invalidation_is_not_stored():
+    cache = AnswerCache()
+    version = cache.version
+    cache.invalidate_docs(["a"])
+    cache.put([1.0, 0.0], ["a:0"], "m", ["a"], ["旧答案"], CONTEXT, version)
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    cache = AnswerCache(max_entries=2, ttl=60)
+    for i in range(3):
+        store(cache, [1.0, float(i)], chunk_ids=(f"a:{i}",))
+    assert cache.stats()["entries"] == 2
+    assert cache.get([1.0, 0.0], ["a:0"], "m") is None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get([1.0, 2.0], ["a:2"], "m") is None
+    assert cache.stats()["entries"] == 1
+
+
+def add_doc(doc_id: str, text: str):
+    path = os.path.join(settings.UPLOAD_DIR, f"{doc_id}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    DocRegistry.add({"id": doc_id, "name": f"{doc_id}.txt", "upload_time": "2025-01-01 00:00:00",
+                     "status": "解析成功(未向量化)", "size": len(text), "path": path})
+    assert DocService.reindex_doc(doc_id)
+
+
+async def ask(question: str) -> dict:
+    events = [json.loads(line) async for line in ChatService.chat_stream(question, top_k=2, threshold=-1)]
+    assert events[-1]["step"] == "completed", events[-1]
+    return events[-1]
+
+
+def test_reindex_and_delete_invalidate_cached_answers(workspace):
+    add_doc("apple", "苹果是一种常见的水果，富含维生素。")
+    add_doc("rocket", "火箭依靠燃料燃烧产生推力。")
+    question = "苹果富含什么？"
+
+    async def scenario():
+        first = await ask(question)
+        assert not first["cached"]
+        assert (await ask(question))["cached"]
+
+        # Reindexing a document the answer drew on drops it
+        assert DocService.reindex_doc("apple")
+        assert not (await ask(question))["cached"]
+        assert (await ask(question))["cached"]
+
+        # So does deleting one
+        DocService._release_doc(DocRegistry.delete("rocket"))
+        assert get_answer_cache().stats()["entries"] == 0
+        assert not (await ask(question))["cached"]
+
+    asyncio.run(scenario())
+    assert get_answer_cache().stats()["invalidations"] == 2
+
+
+def test_rebuild_clears_the_cache(workspace):
+    add_doc("apple", "苹果是一种常见的水果，富含维生素。")
+
+    async def scenario():
+        await ask("苹果富含什么？")
+        assert (await ask("苹果富含什么？"))["cached"]
+
+    asyncio.run(scenario())
+    DocService.rebuild_index()
+    assert get_answer_cache().stats()["entries"] == 0
+
+
+def test_reindex_by_another_process_is_a_miss(workspace):
+    add_doc("apple", "苹果是一种常见的水果，富含维生素。")
+    question = "苹果富含什么？"
+
+    async def scenario():
+        await ask(question)
+        assert (await ask(question))["cached"]
+
+        # Another worker rewrites the same chunks; its invalidation never reaches this cache
+        chunks = list(ChunkStore.get_many(ChunkStore.doc_vector_ids("apple")).values())
+        VectorStoreManager.add_documents(chunks, replace_doc_id="apple")
+        assert get_answer_cache().stats()["invalidations"] == 0
+        assert not (await ask(question))["cached"]
+        assert (await ask(question))["cached"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import json
+import pytest
+from app.core.config import get_settings
+from app.services.vector_store import VectorStoreManager
+from test_answer_cache import add_doc
+
+settings = get_settings()
+
+
+@pytest.fixture
+def no_api_key(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_PROVIDER", "dashscope")
+    monkeypatch.setattr(settings, "DASHSCOPE_API_KEY", "")
+
+
+def test_status_without_api_key(client, no_api_key):
+    response = client.get("/api/status")
+    assert response.status_code == 200
+    status = response.json()
+    assert status["is_model_ready"] is False
+    assert status["api_key_configured"] is False
+    assert status["embedding_cache"]["hits"] == 0
+    assert status["vector_store"]["vectors"] == 0
+
+
+def test_metrics_without_api_key(client, no_api_key):
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert 'rag_cache_lookups_total{cache="embedding",result="miss"} 0' in response.text
+
+
+def scrape(client) -> dict[str, float]:
+    """Samples of /api/metrics by name and labels"""
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_follow_chat_and_the_index(client):
+    add_doc("apple", "苹果是一种常见的水果，富含维生素。")
+    before = scrape(client)
+    for _ in range(2):
+        response = client.post("/api/chat/stream", json={"question": "苹果富含什么？", "threshold": -1})
+        assert json.loads(response.text.splitlines()[-1])["step"] == "completed"
+    after = scrape(client)
+
+    def grew(sample: str) -> float:
+        return after[sample] - before.get(sample, 0)
+
+    assert grew('rag_chat_requests_total{outcome="completed"}') == 1
+    assert grew('rag_chat_requests_total{outcome="cached"}') == 1
+    assert grew('rag_stage_duration_seconds_count{pipeline="chat",stage="search"}') == 2
+    assert grew('rag_stage_duration_seconds_count{pipeline="chat",stage="generate"}') == 1
+    assert after['rag_cache_lookups_total{cache="answer",result="hit"}'] == 1
+    assert after['rag_cache_lookups_total{cache="query",result="hit"}'] == 1
+    assert after["rag_index_vectors"] == VectorStoreManager.stats()["vectors"] > 0
+    assert after["rag_chat_streams_in_flight"] == before.get("rag_chat_streams_in_flight", 0)
+
+
+def test_status_reports_caches_and_index(client):
+    add_doc("apple", "苹果是一种常见的水果，富含维生素。")
+    status = client.get("/api/status").json()
+    assert status["is_model_ready"] is True
+    assert status["vector_store"]["vectors"] == VectorStoreManager.stats()["vectors"] > 0
+    assert status["embedding_cache"]["misses"] > 0
+    assert {"query_cache", "answer_cache", "dedup"} <= status.keys()
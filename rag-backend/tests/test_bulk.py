@@ -0,0 +1,107 @@
+import io
+import os
+import time
+import struct
+import tarfile
+import zipfile
+from app.core.config import get_settings
+from app.schemas.job import JobStatus
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.chunk_store import ChunkStore
+
+settings = get_settings()
+
+APPLE = "苹果是一种常见的水果，富含维生素。".encode("utf-8")
+ROCKET = "火箭依靠燃料燃烧产生推力。".encode("utf-8")
+MB = 1024 * 1024
+
+
+def saved_upload(name: str, data: bytes) -> tuple[str, str]:
+    """An upload as process_bulk leaves it for the job: (original name, hidden path)"""
+    path = os.path.join(settings.UPLOAD_DIR, f".{name}.bulk")
+    with open(path, "wb") as f:
+        f.write(data)
+    return name, path
+
+
+def zip_of(entries: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def tar_of(entries: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def new_job() -> JobStatus:
+    return JobStatus(id="job", name="bulk", created_at=time.time())
+
+
+def unpack(uploads: list[tuple[str, str]]) -> tuple[list[str], JobStatus]:
+    """Names of the documents unpacked from the uploads, and the job recording the rest"""
+    job = new_job()
+    names = []
+    for name, partial_path, _ in DocService._unpack(uploads, job):
+        names.append(name)
+        os.remove(partial_path)
+    return names, job
+
+
+def test_bulk_upload_indexes_documents_and_links_duplicates(workspace):
+    job = new_job()
+    DocService.ingest_bulk([
+        saved_upload("docs.zip", zip_of({"dir/apple.txt": APPLE, "copy.txt": APPLE, "tool.exe": b"MZ"})),
+        saved_upload("more.tar.gz", tar_of({"rocket.md": ROCKET})),
+        saved_upload("notes.txt", "海洋覆盖了地球表面的大部分。".encode("utf-8")),
+    ], job)
+
+    results = {f.name: f for f in job.files}
+    assert results["apple.txt"].status == results["rocket.md"].status == results["notes.txt"].status == "indexed"
+    assert results["copy.txt"].status == "linked"
+    assert results["tool.exe"].status == "skipped"
+    apple, copy = DocRegistry.get(results["apple.txt"].doc_id), DocRegistry.get(results["copy.txt"].doc_id)
+    assert copy["source_id"] == apple["id"] and copy["status"] == "已索引"
+    assert ChunkStore.doc_vector_ids(apple["id"]) and not ChunkStore.doc_vector_ids(copy["id"])
+    # The saved uploads are gone, only the registered documents remain
+    assert [f for f in os.listdir(settings.UPLOAD_DIR) if f.startswith(".")] == []
+
+
+def test_oversized_entries_are_skipped_before_unpacking(workspace, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_MAX_FILE_MB", 1)
+    monkeypatch.setattr(settings, "BULK_MAX_TOTAL_MB", 2)
+    # Compresses to a few KB each
+    bomb = zip_of({"big.txt": b"0" * (3 * MB), "a.txt": b"a" * (MB - 1), "b.txt": b"b" * (MB - 1)})
+    names, job = unpack([saved_upload("bomb.zip", bomb), saved_upload("c.txt", b"c" * 100)])
+
+    assert names == ["a.txt", "b.txt"]
+    errors = {f.name: f.error for f in job.files}
+    assert errors == {"big.txt": "File too large", "c.txt": "Upload too large"}
+
+
+def test_entry_larger_than_its_header_fails_alone(workspace):
+    data = bytearray(zip_of({"liar.txt": b"x" * 100000, "apple.txt": APPLE}))
+    # Claim 1000 bytes in both the local header and the central directory
+    data[22:26] = struct.pack("<I", 1000)
+    central = data.find(b"PK\x01\x02")
+    data[central + 24:central + 28] = struct.pack("<I", 1000)
+    names, job = unpack([saved_upload("liar.zip", bytes(data))])
+
+    assert names == ["apple.txt"]
+    assert [(f.name, f.status) for f in job.files] == [("liar.txt", "failed")]
+    assert [f for f in os.listdir(settings.UPLOAD_DIR) if f.endswith(".part")] == []
+
+
+def test_unreadable_archive_is_reported(workspace):
+    names, job = unpack([saved_upload("broken.zip", b"not a zip")])
+    assert names == []
+    assert job.files[0].name == "broken.zip" and job.files[0].status == "failed"
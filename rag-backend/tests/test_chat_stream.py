@@ -0,0 +1,99 @@
+import json
+import time
+import asyncio
+import pytest
+from app.api import chat
+from app.core.config import get_settings
+from app.core.metrics import CHAT_STREAMS_IN_FLIGHT
+from app.services.chat_service import ChatService
+from app.services.local_models import LocalGeneration
+from test_answer_cache import add_doc
+
+settings = get_settings()
+
+QUESTION = "苹果富含什么？"
+
+
+def stream(client, **body) -> list[dict]:
+    response = client.post("/api/chat/stream", json={"question": QUESTION, "threshold": -1, **body})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert all(lines)
+    return [json.loads(line) for line in lines]
+
+
+@pytest.fixture
+def indexed(workspace, monkeypatch):
+    # Generate every time: a cached replay is covered by the answer cache tests
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+    add_doc("apple", "苹果是一种常见的水果，富含维生素和膳食纤维。" * 5)
+
+
+def test_delta_mode_sends_only_new_text(client, indexed):
+    events = stream(client, stream_mode="delta")
+    steps = [e["step"] for e in events]
+    assert "retrieved" in steps and steps[-1] == "completed"
+    answers = [e["data"] for e in events if e["step"] == "answer"]
+    assert len(answers) > 1
+    completed = events[-1]
+    assert "".join(answers) == completed["data"] and completed["done"]
+    # No chunk repeats what was already sent
+    assert not any(b.startswith(a) for a, b in zip(answers, answers[1:]))
+
+
+def test_full_mode_resends_the_answer_so_far(client, indexed):
+    events = stream(client, stream_mode="full")
+    answers = [e["data"] for e in events if e["step"] == "answer"]
+    assert all(b.startswith(a) and len(b) > len(a) for a, b in zip(answers, answers[1:]))
+    assert answers[-1] == events[-1]["data"]
+    assert events[-1]["data"] == "".join(e["data"] for e in stream(client, stream_mode="delta") if e["step"] == "answer")
+
+
+class Client:
+    """The part of a Starlette request the disconnect watcher polls"""
+
+    def __init__(self):
+        self.gone = False
+
+    async def is_disconnected(self) -> bool:
+        return self.gone
+
+
+class TrackedGeneration(LocalGeneration):
+    def __init__(self):
+        super().__init__(token_delay=0.05)
+        self.chunks_sent = 0
+        self.closed = False
+
+    async def _stream(self, prompt: str, incremental_output: bool):
+        try:
+            async for response in super()._stream(prompt, incremental_output):
+                self.chunks_sent += 1
+                yield response
+        finally:
+            self.closed = True
+
+
+def test_disconnect_cancels_generation(indexed, monkeypatch):
+    monkeypatch.setattr(chat, "DISCONNECT_POLL_SECONDS", 0.01)
+    generation = TrackedGeneration()
+    monkeypatch.setattr(ChatService, "_local_generation", generation)
+    in_flight = CHAT_STREAMS_IN_FLIGHT._values.get((), 0)
+    client = Client()
+
+    async def scenario() -> list[dict]:
+        events = []
+        async for line in chat._cancel_on_disconnect(client, ChatService.chat_stream(QUESTION, threshold=-1)):
+            events.append(json.loads(line))
+            if events[-1]["step"] == "answer":
+                client.gone = True
+        return events
+
+    started = time.perf_counter()
+    events = asyncio.run(scenario())
+    # Dropped within a poll or two, not after the whole answer
+    assert time.perf_counter() - started < 1.0
+    assert "completed" not in [e["step"] for e in events]
+    assert generation.closed and generation.chunks_sent <= 2
+    assert CHAT_STREAMS_IN_FLIGHT._values.get((), 0) == in_flight
@@ -0,0 +1,86 @@
+import pytest
+from langchain_core.documents import Document
+from app.core.config import get_settings
+from app.services.context_builder import ContextBuilder, estimate_tokens, MIN_PASSAGE_TOKENS
+
+settings = get_settings()
+
+PAGE = "".join(f"第{i}句介绍了系统的一个组成部分。" for i in range(60))
+
+
+def chunk(text: str, doc_id: str = "a", page: int = 1, start: int = None, end: int = None) -> Document:
+    metadata = {"doc_id": doc_id, "name": f"{doc_id}.txt", "page": page}
+    if start is not None:
+        metadata.update(start=start, end=end)
+    return Document(page_content=text, metadata=metadata)
+
+
+def span(start: int, end: int, **kwargs) -> Document:
+    return chunk(PAGE[start:end], start=start, end=end, **kwargs)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("苹果") == 2
+    assert estimate_tokens("hello world") == 4
+    assert estimate_tokens("a, b") == 3
+    # Numbers are tokenized one digit at a time
+    assert estimate_tokens("2024年") == 5
+    assert estimate_tokens("abc123") == 4
+    assert estimate_tokens("") == 0
+
+
+def test_overlapping_chunks_of_a_page_merge_into_one_passage():
+    passages = ContextBuilder.merge([span(100, 200), span(0, 120), span(300, 400)])
+    assert [(p["start"], p["end"]) for p in passages] == [(0, 200), (300, 400)]
+    assert passages[0]["text"] == PAGE[0:200]
+    assert passages[0]["chunks"] == 2
+    # A merged passage ranks with its best chunk
+    assert [p["rank"] for p in passages] == [0, 2]
+
+
+def test_chunks_of_other_pages_or_without_offsets_are_not_merged():
+    passages = ContextBuilder.merge([span(0, 100), span(50, 150, page=2), chunk(PAGE[60:120])])
+    assert len(passages) == 3
+
+
+def test_near_duplicate_passages_are_dropped(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_DEDUP_THRESHOLD", 0.9)
+    text = PAGE[:300]
+    passages = ContextBuilder.merge([
+        chunk(text, doc_id="a"),
+        chunk(text + "附注。", doc_id="b"),
+        chunk(PAGE[600:900], doc_id="c"),
+    ])
+    kept = ContextBuilder.drop_near_duplicates(passages)
+    assert [p["doc_id"] for p in kept] == ["a", "c"]
+
+
+def test_passages_are_packed_into_the_budget_in_rank_order(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_MAX_TOKENS", 300)
+    chunks = [chunk(PAGE[i * 200:(i + 1) * 200], doc_id=f"d{i}") for i in range(4)]
+    context = ContextBuilder.build("系统由哪些部分组成？", chunks)
+
+    passages = context["passages"]
+    assert [p["doc_id"] for p in passages] == ["d0", "d1"]
+    assert sum(p["tokens"] for p in passages) <= 300
+    # The passage that does not fit whole is cut at a sentence end
+    assert passages[-1]["text"].endswith("。")
+    assert len(passages[-1]["text"]) < 200
+    assert context["tokens"] == estimate_tokens(context["prompt"])
+
+
+def test_a_remainder_too_small_for_a_passage_is_left_unused(monkeypatch):
+    first = PAGE[:200]
+    monkeypatch.setattr(settings, "CONTEXT_MAX_TOKENS", estimate_tokens(first) + MIN_PASSAGE_TOKENS - 1)
+    context = ContextBuilder.build("问题", [chunk(first, doc_id="a"), chunk(PAGE[400:600], doc_id="b")])
+    assert [p["doc_id"] for p in context["passages"]] == ["a"]
+
+
+@pytest.mark.parametrize("question", ["问题", "很长的问题" * 2000])
+def test_prompt_plus_answer_fits_the_context_window(monkeypatch, question):
+    monkeypatch.setattr(settings, "LLM_CONTEXT_WINDOW", 2000)
+    monkeypatch.setattr(settings, "LLM_MAX_OUTPUT_TOKENS", 500)
+    monkeypatch.setattr(settings, "CONTEXT_MAX_TOKENS", 3000)
+    chunks = [chunk(PAGE[i * 300:(i + 1) * 300], doc_id=f"d{i}") for i in range(3)] * 3
+    context = ContextBuilder.build(question, chunks)
+    assert estimate_tokens(context["prompt"]) + 500 <= 2000
@@ -0,0 +1,65 @@
+import io
+import os
+import asyncio
+from fastapi import BackgroundTasks, UploadFile
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.chunk_store import ChunkStore
+from app.services.vector_store import VectorStoreManager
+from conftest import wait_for_jobs
+
+TEXT = "苹果是一种常见的水果，富含维生素。".encode("utf-8")
+
+
+def upload(name: str, data: bytes = TEXT) -> str:
+    response = asyncio.run(DocService.process_doc(UploadFile(file=io.BytesIO(data), filename=name)))
+    wait_for_jobs()
+    return response.doc_id
+
+
+def delete(doc_id: str):
+    tasks = BackgroundTasks()
+    assert DocService.delete_doc(doc_id, tasks)
+    asyncio.run(tasks())
+
+
+def chunk_names(source_id: str) -> set[str]:
+    return {doc.metadata["name"] for doc in ChunkStore.get_many(ChunkStore.doc_vector_ids(source_id)).values()}
+
+
+def test_identical_upload_is_linked_to_the_indexed_original(workspace):
+    original = upload("apple.txt")
+    vectors = VectorStoreManager.stats()["vectors"]
+    copy = upload("copy.txt")
+
+    doc = DocRegistry.get(copy)
+    assert doc["source_id"] == original and doc["status"] == "已索引"
+    assert doc["path"] == DocRegistry.get(original)["path"]
+    assert VectorStoreManager.stats()["vectors"] == vectors
+    assert DocService.vector_ids_for([copy]) == ChunkStore.doc_vector_ids(original)
+    assert DocRegistry.dedup_stats()["linked_docs"] == 1
+
+
+def test_reindexing_a_linked_upload_keeps_the_source_name(workspace):
+    original = upload("apple.txt")
+    copy = upload("copy.txt")
+    assert DocService.reindex_doc(copy)
+    assert chunk_names(original) == {"apple.txt"}
+
+
+def test_dedup_survives_deleting_the_original(workspace):
+    original = upload("apple.txt")
+    copy = upload("copy.txt")
+    path = DocRegistry.get(original)["path"]
+    delete(original)
+    # The linked upload still holds the file and vectors
+    assert os.path.exists(path) and ChunkStore.doc_vector_ids(original)
+
+    third = upload("third.txt")
+    assert DocRegistry.get(third)["source_id"] == original
+    assert DocRegistry.count_by_source(original) == 2
+
+    delete(copy)
+    delete(third)
+    assert not os.path.exists(path)
+    assert ChunkStore.doc_vector_ids(original) == []
@@ -0,0 +1,34 @@
+from app.services import content_store
+from app.services.content_store import ContentStore
+from app.services.doc_service import DocService
+from test_ingest import write_upload
+
+TEXT = "".join(f"第{i}行内容。\n" for i in range(500))
+
+
+def test_paging_decodes_the_sidecar_once(workspace, monkeypatch):
+    write_upload("notes", TEXT, status="已索引")
+    loads = []
+    load = ContentStore.load
+    monkeypatch.setattr(ContentStore, "load", staticmethod(lambda file_hash: loads.append(file_hash) or load(file_hash)))
+
+    pages, offset = [], 0
+    while True:
+        page = DocService.get_doc_content("notes", offset=offset, limit=1000)
+        pages.append(page["content"])
+        offset += 1000
+        if not page["has_more"]:
+            break
+    assert "".join(pages) == DocService.get_doc_content("notes")["content"]
+    assert page["total"] == len("".join(pages))
+    assert len(pages) > 3
+    assert len(loads) == 1
+
+
+def test_decoded_texts_are_evicted_beyond_the_budget(workspace, monkeypatch):
+    monkeypatch.setattr(content_store, "TEXT_CACHE_MAX_CHARS", len(TEXT) + 10)
+    for doc_id in ("a", "b"):
+        write_upload(doc_id, doc_id + TEXT, status="已索引")
+        DocService.get_doc_content(doc_id, limit=10)
+    assert len(ContentStore._texts) == 1
+    assert ContentStore._text_chars <= len(TEXT) + 10
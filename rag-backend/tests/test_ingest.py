@@ -0,0 +1,54 @@
+import os
+from app.core.config import get_settings
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.chunk_store import ChunkStore
+from app.services.vector_store import VectorStoreManager
+from conftest import wait_for_jobs
+
+settings = get_settings()
+
+
+def write_upload(doc_id: str, text: str, status: str = "处理中") -> dict:
+    path = os.path.join(settings.UPLOAD_DIR, f"{doc_id}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    doc_meta = {"id": doc_id, "name": f"{doc_id}.txt", "upload_time": "2025-01-01 00:00:00",
+                "status": status, "size": len(text.encode("utf-8")), "path": path}
+    DocRegistry.add(doc_meta)
+    return doc_meta
+
+
+def test_documents_left_processing_are_requeued_at_startup(workspace):
+    write_upload("apple", "苹果是一种常见的水果，富含维生素。" * 20)
+    write_upload("done", "已经索引过的文档。", status="已索引")
+
+    DocService.resume_ingestion()
+    wait_for_jobs()
+
+    assert DocRegistry.get("apple")["status"] == "已索引"
+    assert DocRegistry.get("done")["status"] == "已索引"
+    vectors = len(ChunkStore.doc_vector_ids("apple"))
+    assert vectors > 0
+
+    # Running the same ingestion again replaces the chunks instead of adding a second copy
+    DocRegistry.update("apple", status="处理中")
+    DocService._recovery_lock.release()
+    DocService.resume_ingestion()
+    wait_for_jobs()
+    assert len(ChunkStore.doc_vector_ids("apple")) == vectors
+    assert VectorStoreManager.stats()["vectors"] == ChunkStore.count()
+
+
+def test_only_one_worker_requeues(workspace):
+    write_upload("apple", "苹果是一种常见的水果。")
+    DocService.resume_ingestion()
+    lock = DocService._recovery_lock
+    DocService._recovery_lock = None
+    try:
+        # A second worker starting alongside finds the lock held
+        DocService.resume_ingestion()
+        assert DocService._recovery_lock is None
+    finally:
+        DocService._recovery_lock = lock
+    wait_for_jobs()
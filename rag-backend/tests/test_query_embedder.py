@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from app.services.query_embedder import QueryEmbedder
+
+
+class FakeEmbeddings:
+    def __init__(self, fail: bool = False):
+        self.calls: list[list[str]] = []
+        self.fail = fail
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(texts)
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("service unavailable")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def embedder(backend: FakeEmbeddings, **kwargs) -> QueryEmbedder:
+    return QueryEmbedder(backend.embed_batch, "m", **kwargs)
+
+
+def test_concurrent_misses_share_one_request():
+    backend = FakeEmbeddings()
+    query_embedder = embedder(backend)
+
+    async def scenario():
+        return await asyncio.gather(*(query_embedder.embed(q) for q in ["苹果", " 苹果 ", "ＡＢＣ", "abc"]))
+
+    results = asyncio.run(scenario())
+    # Width, case and whitespace variants are one question
+    assert backend.calls == [["苹果", "abc"]]
+    assert results[0] == results[1] and results[2] == results[3]
+    stats = query_embedder.stats()
+    assert stats["misses"] == 4 and stats["coalesced"] == 2 and stats["batches"] == 1
+
+
+def test_large_windows_are_split_into_batches():
+    backend = FakeEmbeddings()
+    query_embedder = embedder(backend, max_batch=2)
+
+    async def scenario():
+        await asyncio.gather(*(query_embedder.embed(f"问题{i}") for i in range(5)))
+
+    asyncio.run(scenario())
+    assert [len(call) for call in backend.calls] == [2, 2, 1]
+
+
+def test_entries_expire_and_are_evicted():
+    backend = FakeEmbeddings()
+    query_embedder = embedder(backend, ttl=0.5, max_entries=2)
+
+    async def scenario():
+        for q in ["a", "b", "a"]:
+            await query_embedder.embed(q)
+        assert len(backend.calls) == 2 and query_embedder.stats()["hits"] == 1
+        await query_embedder.embed("c")
+        # "b" was least recently used
+        assert query_embedder.stats()["entries"] == 2
+        await query_embedder.embed("b")
+        assert len(backend.calls) == 4
+
+        # The event loop runs on the monotonic clock too, so let the time pass for real
+        await asyncio.sleep(0.5)
+        await query_embedder.embed("b")
+        assert len(backend.calls) == 5
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    backend = FakeEmbeddings(fail=True)
+    query_embedder = embedder(backend)
+
+    async def scenario():
+        results = await asyncio.gather(query_embedder.embed("a"), query_embedder.embed("a"), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        backend.fail = False
+        assert await query_embedder.embed("a") == [1.0, 1.0]
+
+    asyncio.run(scenario())
+    assert len(backend.calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    backend = FakeEmbeddings()
+    query_embedder = embedder(backend)
+
+    async def scenario():
+        first = asyncio.create_task(query_embedder.embed("a"))
+        second = asyncio.create_task(query_embedder.embed("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == [1.0, 1.0]
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
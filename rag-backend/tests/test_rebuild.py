@@ -0,0 +1,84 @@
+import os
+import pytest
+from app.core.config import get_settings
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.staging_index import StagingIndex
+from app.services.vector_store import VectorStoreManager
+from app.services.chunk_store import ChunkStore
+
+settings = get_settings()
+
+TOPICS = ["苹果", "火箭", "海洋", "音乐", "森林"]
+
+
+def register_docs() -> list[str]:
+    """Indexed documents on disk, one topic each; returns their IDs"""
+    doc_ids = []
+    for i, topic in enumerate(TOPICS):
+        doc_id = f"doc{i}"
+        path = os.path.join(settings.UPLOAD_DIR, f"{doc_id}_{topic}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"这是关于{topic}的第{i}篇文档。" * 40)
+        DocRegistry.add({"id": doc_id, "name": f"{topic}.txt", "upload_time": "2025-01-01 00:00:00",
+                         "status": "已索引", "size": os.path.getsize(path), "path": path})
+        doc_ids.append(doc_id)
+    return doc_ids
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # One batch per document, each followed by a checkpoint
+    monkeypatch.setattr(settings, "REBUILD_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "REBUILD_CHECKPOINT_INTERVAL", 0)
+
+
+def test_rebuild_indexes_every_registered_document(workspace, small_batches):
+    doc_ids = register_docs()
+    DocService.rebuild_index()
+
+    status = DocService.rebuild_status()
+    assert status["state"] == "completed"
+    assert status["docs_total"] == status["docs_done"] == len(doc_ids)
+    assert not StagingIndex.exists()
+    assert VectorStoreManager.stats()["vectors"] == ChunkStore.count()
+    for doc_id in doc_ids:
+        assert ChunkStore.doc_vector_ids(doc_id)
+
+
+def test_interrupted_rebuild_resumes_from_its_checkpoint(workspace, small_batches, monkeypatch):
+    doc_ids = register_docs()
+    stage_batch = DocService._stage_batch
+    staged = []
+
+    def crash_on_third(staging, chunks, source_ids, status):
+        stage_batch(staging, chunks, source_ids, status)
+        staged.extend(source_ids)
+        if len(staged) == 3:
+            # Staged, but killed before the checkpoint that would have recorded it
+            raise RuntimeError("killed")
+
+    monkeypatch.setattr(DocService, "_stage_batch", staticmethod(crash_on_third))
+    DocService.rebuild_index()
+
+    assert DocService.rebuild_status()["state"] == "interrupted"
+    assert StagingIndex.saved_progress()["docs_done"] == 2
+    assert VectorStoreManager.get_store() is None
+
+    def record(staging, chunks, source_ids, status):
+        stage_batch(staging, chunks, source_ids, status)
+        staged.extend(source_ids)
+
+    staged.clear()
+    monkeypatch.setattr(DocService, "_stage_batch", staticmethod(record))
+    DocService.rebuild_index()
+
+    status = DocService.rebuild_status()
+    assert status["state"] == "completed" and status["resumed"]
+    # Only the documents after the checkpoint were staged again
+    assert staged == doc_ids[2:]
+    # The rows staged after the checkpoint were dropped, not duplicated
+    assert VectorStoreManager.stats()["vectors"] == ChunkStore.count()
+    chunk_ids = [doc.id for doc in ChunkStore.get_many(range(1, ChunkStore.max_vector_id() + 1)).values()]
+    assert len(chunk_ids) == len(set(chunk_ids))
+    assert {chunk_id.split(":")[0] for chunk_id in chunk_ids} == set(doc_ids)
@@ -0,0 +1,83 @@
+import json
+import asyncio
+import pytest
+from app.core.config import get_settings
+from app.services.chat_service import ChatService
+from app.services.vector_store import VectorStoreManager
+from app.services.chunk_store import ChunkStore
+from conftest import make_chunks, wait_for_writes
+from test_answer_cache import add_doc
+
+settings = get_settings()
+
+APPLES = [f"第{i}个苹果品种的果皮颜色和甜度各不相同。" for i in range(30)]
+ROCKETS = [f"第{i}枚火箭的燃料和推力都经过测试。" for i in range(30)]
+
+
+def query(text: str) -> list[float]:
+    return VectorStoreManager.embed_texts([text])[0].tolist()
+
+
+@pytest.mark.parametrize("index_type,expected", [("flat", "IndexFlatL2"), ("hnsw", "IndexHNSWFlat"),
+                                                 ("ivf_flat", "IndexIVFFlat"), ("ivf_pq", "IndexIVFPQ")])
+def test_scoped_search_only_returns_the_subset(workspace, monkeypatch, index_type, expected):
+    monkeypatch.setattr(settings, "INDEX_TYPE", index_type)
+    monkeypatch.setattr(settings, "INDEX_MIN_VECTORS", 40)
+    VectorStoreManager.add_documents(make_chunks("apple", APPLES))
+    VectorStoreManager.add_documents(make_chunks("rocket", ROCKETS))
+    wait_for_writes()
+    store = VectorStoreManager.get_store()
+    assert VectorStoreManager.stats()["shards"][0]["type"] == expected
+
+    rocket_ids = ChunkStore.doc_vector_ids("rocket")
+    hits = store.similarity_search_with_score_by_vector(query(APPLES[3]), k=5, vector_ids=rocket_ids)
+    assert len(hits) == 5
+    assert all(doc.metadata["doc_id"] == "rocket" for doc, _ in hits)
+    # Ranked by distance, as an unscoped search would
+    assert [d for _, d in hits] == sorted(d for _, d in hits)
+
+    hits = store.similarity_search_with_score_by_vector(query(ROCKETS[7]), k=3, vector_ids=rocket_ids)
+    # PQ distances are estimated from the codes
+    if index_type != "ivf_pq":
+        assert hits[0][0].id == "rocket:7" and hits[0][1] == pytest.approx(0, abs=1e-5)
+
+
+def test_scoped_search_skips_rows_newer_than_the_view(workspace):
+    VectorStoreManager.add_documents(make_chunks("apple", APPLES[:5]))
+    store = VectorStoreManager.get_store()
+    VectorStoreManager.add_documents(make_chunks("rocket", ROCKETS[:5]))
+    wait_for_writes()
+
+    # The rocket rows were written after this view was published
+    vector_ids = ChunkStore.doc_vector_ids("apple") + ChunkStore.doc_vector_ids("rocket")
+    hits = store.similarity_search_with_score_by_vector(query(ROCKETS[0]), k=10, vector_ids=vector_ids)
+    assert sorted(doc.id for doc, _ in hits) == [f"apple:{i}" for i in range(5)]
+    assert store.similarity_search_with_score_by_vector(
+        query(ROCKETS[0]), k=10, vector_ids=ChunkStore.doc_vector_ids("rocket")) == []
+
+
+async def retrieved(question: str, **kwargs) -> list[dict]:
+    async for line in ChatService.chat_stream(question, **kwargs):
+        event = json.loads(line)
+        if event["step"] == "retrieved":
+            return event["data"]
+        assert event["step"] != "error", event
+
+
+def test_chat_applies_scope_and_threshold(workspace):
+    add_doc("apple", "".join(APPLES))
+    add_doc("rocket", "".join(ROCKETS))
+
+    async def scenario():
+        scoped = await retrieved("苹果的甜度", top_k=3, doc_ids=["rocket"], threshold=-1)
+        assert scoped and {s["source"] for s in scoped} == {"rocket.txt"}
+
+        everything = await retrieved("苹果的甜度", top_k=3, threshold=-1)
+        assert all(s["similarity"] >= everything[-1]["similarity"] for s in everything)
+        cutoff = everything[0]["similarity"]
+        # Hits below the threshold are dropped
+        strict = await retrieved("苹果的甜度", top_k=3, threshold=cutoff)
+        assert [s["similarity"] for s in strict] == [cutoff]
+        assert await retrieved("苹果的甜度", top_k=3, threshold=cutoff + 0.01) == []
+
+    asyncio.run(scenario())
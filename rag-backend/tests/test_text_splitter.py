@@ -0,0 +1,79 @@
+import pytest
+from app.utils.text_splitter import TextSplitter, get_text_splitter, get_markdown_splitter
+
+SENTENCES = "".join(f"第{i}句话讲的是一个不太长的事情。" for i in range(40))
+PROSE = "\n\n".join(
+    " ".join(f"Sentence {p}.{i} says something, then adds a clause." for i in range(6)) for p in range(8)
+)
+
+
+@pytest.mark.parametrize("text", [SENTENCES, PROSE, "x" * 1234])
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(100, 0), (100, 20), (300, 50)])
+def test_offsets_slice_the_text_and_cover_it(text, chunk_size, chunk_overlap):
+    splitter = TextSplitter(chunk_size, chunk_overlap)
+    chunks = splitter.split(text)
+    assert chunks
+    covered = set()
+    for chunk in chunks:
+        start, end = chunk.metadata["start"], chunk.metadata["end"]
+        assert chunk.page_content == text[start:end]
+        assert 0 < end - start <= chunk_size
+        assert chunk.page_content == chunk.page_content.strip()
+        covered.update(range(start, end))
+    assert all(i in covered for i, c in enumerate(text) if not c.isspace())
+
+
+@pytest.mark.parametrize("text", [SENTENCES, PROSE, "x" * 1234])
+def test_overlap_is_bounded(text):
+    spans = TextSplitter(100, 20).split_offsets(text)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert start < next_start
+        # Either an overlap of at most chunk_overlap, or only whitespace in between
+        assert end - next_start <= 20
+        assert next_start <= end or text[end:next_start].isspace()
+
+
+def test_without_overlap_chunks_are_contiguous():
+    spans = TextSplitter(100, 0).split_offsets(PROSE)
+    for (_, end), (next_start, _) in zip(spans, spans[1:]):
+        assert PROSE[end:next_start].strip() == ""
+
+
+def test_chunks_end_at_sentences():
+    chunks = TextSplitter(100, 20).split(SENTENCES)
+    assert all(c.page_content.endswith("。") for c in chunks)
+    # The overlap repeats the last sentence, starting at the break inside the window
+    for chunk, nxt in zip(chunks, chunks[1:]):
+        assert nxt.metadata["start"] < chunk.metadata["end"]
+        assert nxt.page_content.startswith("第")
+
+
+def test_closing_quote_stays_with_its_sentence():
+    text = "他说：“今天下雨了。”" * 30
+    chunks = TextSplitter(50, 0).split(text)
+    assert all(c.page_content.endswith("。”") for c in chunks[:-1])
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        TextSplitter(100, 100)
+
+
+def test_splitters_are_shared():
+    assert get_text_splitter(100, 10) is get_text_splitter(100, 10)
+    assert get_markdown_splitter(100, 10).text_splitter is get_text_splitter(100, 10)
+
+
+def test_markdown_sections_keep_headers_and_global_offsets():
+    text = (
+        "# 指南\n\n简介段落。\n\n"
+        "## 安装\n\n```bash\n# 这不是标题\npip install rag\n```\n\n"
+        "## 使用\n\n调用接口即可。\n"
+    )
+    chunks = get_markdown_splitter(200, 20).split(text, {"source": "guide.md"})
+    assert [c.metadata.get("Header 2") for c in chunks] == [None, "安装", "使用"]
+    assert all(c.metadata["Header 1"] == "指南" and c.metadata["source"] == "guide.md" for c in chunks)
+    for chunk in chunks:
+        assert chunk.page_content == text[chunk.metadata["start"]:chunk.metadata["end"]]
+        assert not chunk.page_content.startswith("#")
+    assert "# 这不是标题" in chunks[1].page_content
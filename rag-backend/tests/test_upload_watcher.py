@@ -0,0 +1,89 @@
+import os
+import time
+import pytest
+from app.core.config import get_settings
+from app.services.doc_service import DocService
+from app.services.doc_registry import DocRegistry
+from app.services.content_store import ContentStore
+from app.services.chunk_store import ChunkStore
+from app.services.upload_watcher import UploadWatcher, EVENT_SETTLE_SECONDS
+from conftest import wait_for_jobs
+
+settings = get_settings()
+
+
+def drop_file(filename: str, text: str = "苹果是一种常见的水果，富含维生素。") -> str:
+    """A file copied into the upload directory directly, not through the API"""
+    path = os.path.join(settings.UPLOAD_DIR, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+@pytest.fixture
+def auto_index(monkeypatch):
+    monkeypatch.setattr(settings, "AUTO_INDEX_NEW_FILES", True)
+
+
+def test_new_file_is_registered_and_indexed_with_its_hash(workspace, auto_index):
+    path = drop_file("abc123_苹果.txt")
+    assert DocService.register_file(path)
+    assert not DocService.register_file(path)
+    wait_for_jobs()
+
+    doc = DocRegistry.get("abc123")
+    assert doc["name"] == "苹果.txt" and doc["status"] == "已索引"
+    assert doc["hash"] == ContentStore.file_hash(path)
+    assert ChunkStore.doc_vector_ids("abc123")
+
+
+def test_new_file_waits_for_indexing_unless_enabled(workspace):
+    path = drop_file("notes.txt")
+    assert DocService.register_file(path)
+    doc = DocRegistry.get_by_path(path)
+    assert doc["name"] == "notes.txt" and doc["status"] == "未索引"
+
+
+def test_removed_file_is_unregistered_with_its_chunks(workspace, auto_index):
+    path = drop_file("abc123_苹果.txt")
+    DocService.register_file(path)
+    wait_for_jobs()
+    os.remove(path)
+
+    assert DocService.unregister_file(path)
+    assert DocRegistry.get("abc123") is None
+    assert ChunkStore.doc_vector_ids("abc123") == []
+
+
+def test_upload_in_progress_is_not_unregistered(workspace):
+    path = os.path.join(settings.UPLOAD_DIR, "abc123_苹果.txt")
+    DocRegistry.add({"id": "abc123", "name": "苹果.txt", "upload_time": "2025-01-01 00:00:00",
+                     "status": "处理中", "size": 0, "path": path})
+    assert not DocService.unregister_file(path)
+    assert DocRegistry.get("abc123")
+
+
+def test_full_scan_reconciles_the_registry(workspace):
+    kept = drop_file("kept.txt")
+    gone = drop_file("gone.txt")
+    DocService.sync_docs_from_disk()
+    os.remove(gone)
+    added = drop_file("added.txt")
+    DocService.sync_docs_from_disk()
+    assert DocRegistry.known_paths() == {kept, added}
+
+
+def test_file_events_are_applied_once_settled(workspace, monkeypatch):
+    monkeypatch.setattr(UploadWatcher, "_pending", {})
+    path = drop_file("notes.txt")
+    UploadWatcher.notify(path)
+    UploadWatcher._apply_settled(time.monotonic())
+    # Still settling: a copy may be in progress
+    assert DocRegistry.get_by_path(path) is None
+    UploadWatcher._apply_settled(time.monotonic() + EVENT_SETTLE_SECONDS)
+    assert DocRegistry.get_by_path(path)
+
+    os.remove(path)
+    UploadWatcher.notify(path)
+    UploadWatcher._apply_settled(time.monotonic() + EVENT_SETTLE_SECONDS)
+    assert DocRegistry.get_by_path(path) is None
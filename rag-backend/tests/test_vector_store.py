@@ -0,0 +1,110 @@
+import os
+import json
+import faiss
+import pytest
+from app.core.config import get_settings
+from app.services.vector_store import VectorStoreManager
+from app.services.chunk_store import ChunkStore
+from conftest import make_chunks, wait_for_writes
+
+settings = get_settings()
+
+
+def current_manifest() -> str:
+    with open(os.path.join(settings.VECTOR_DB_DIR, "CURRENT"), "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def search(store, text: str, k: int = 10) -> list[str]:
+    vector = VectorStoreManager.embed_texts([text])[0].tolist()
+    return [doc.id for doc, _ in store.similarity_search_with_score_by_vector(vector, k=k)]
+
+
+def test_every_write_publishes_a_new_snapshot(workspace):
+    VectorStoreManager.add_documents(make_chunks("a", ["苹果是一种水果。", "苹果富含维生素。"]))
+    first = current_manifest()
+    VectorStoreManager.add_documents(make_chunks("b", ["火箭需要燃料。"]))
+    wait_for_writes()
+
+    assert current_manifest() != first
+    assert VectorStoreManager.stats()["snapshot"] == 2
+    assert VectorStoreManager.stats()["vectors"] == 3
+    assert search(VectorStoreManager.get_store(), "火箭需要燃料。", k=1) == ["b:0"]
+
+
+def test_delete_removes_only_that_document(workspace):
+    VectorStoreManager.add_documents(make_chunks("a", ["苹果是一种水果。", "苹果富含维生素。"]))
+    VectorStoreManager.add_documents(make_chunks("b", ["火箭需要燃料。"]))
+
+    assert VectorStoreManager.delete_doc("a") == 2
+    assert VectorStoreManager.delete_doc("a") == 0
+    assert search(VectorStoreManager.get_store(), "苹果") == ["b:0"]
+    assert ChunkStore.count() == 1
+
+
+def test_replace_doc_swaps_its_chunks_in_one_snapshot(workspace):
+    VectorStoreManager.add_documents(make_chunks("a", ["旧的内容。", "旧的结尾。"]))
+    VectorStoreManager.add_documents(make_chunks("a", ["新的内容。"]), replace_doc_id="a")
+    wait_for_writes()
+
+    assert VectorStoreManager.stats()["snapshot"] == 2
+    assert VectorStoreManager.stats()["vectors"] == 1
+    assert ChunkStore.doc_vector_ids("a") and ChunkStore.count() == 1
+
+
+def test_old_snapshots_are_garbage_collected(workspace, monkeypatch):
+    monkeypatch.setattr(settings, "SNAPSHOTS_RETAINED", 2)
+    monkeypatch.setattr(settings, "SHARD_MAX_VECTORS", 2)
+    VectorStoreManager.add_documents(make_chunks("a", ["第一段。", "第二段。"]))
+    early = VectorStoreManager.get_store()
+    # Left behind by a write that crashed before its rename
+    shards_dir = os.path.join(settings.VECTOR_DB_DIR, "shards")
+    open(os.path.join(shards_dir, "shard-00009.v00000009.faiss.tmp"), "wb").close()
+    for doc_id in ("b", "c", "d"):
+        VectorStoreManager.add_documents(make_chunks(doc_id, [f"文档{doc_id}的内容。"]))
+    wait_for_writes()
+
+    manifests = sorted(os.listdir(os.path.join(settings.VECTOR_DB_DIR, "manifests")))
+    assert len(manifests) == 2
+    assert manifests[-1] == current_manifest()
+    referenced = set()
+    for name in manifests:
+        with open(os.path.join(settings.VECTOR_DB_DIR, "manifests", name), "r", encoding="utf-8") as f:
+            referenced.update(json.load(f)["files"].values())
+    assert set(os.listdir(shards_dir)) == referenced
+    # A reader still holding a collected snapshot keeps its mapping
+    assert search(early, "第一段。", k=1) == ["a:0"]
+    assert VectorStoreManager.stats()["vectors"] == 5
+
+
+@pytest.mark.parametrize("index_type,expected", [("hnsw", "IndexHNSWFlat"), ("ivf_flat", "IndexIVFFlat")])
+def test_active_shard_is_trained_once_large_enough(workspace, monkeypatch, index_type, expected):
+    monkeypatch.setattr(settings, "INDEX_TYPE", index_type)
+    monkeypatch.setattr(settings, "INDEX_MIN_VECTORS", 40)
+    VectorStoreManager.add_documents(make_chunks("a", [f"第{i}段讲述了话题{i}。" for i in range(30)]))
+    wait_for_writes()
+    assert [s["type"] for s in VectorStoreManager.stats()["shards"]] == ["IndexFlatL2"]
+
+    VectorStoreManager.add_documents(make_chunks("b", [f"第{i}条记录了事件{i}。" for i in range(50)]))
+    wait_for_writes()
+    # Still the only (active) shard, now of the configured type
+    assert [s["type"] for s in VectorStoreManager.stats()["shards"]] == [expected]
+    assert VectorStoreManager.stats()["vectors"] == 80
+    assert search(VectorStoreManager.get_store(), "第7条记录了事件7。", k=1) == ["b:7"]
+
+
+def test_ivf_shard_is_retrained_as_it_grows(workspace, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "INDEX_MIN_VECTORS", 40)
+
+    def nlist() -> int:
+        index = next(iter(VectorStoreManager.get_store().shards.values()))
+        return faiss.extract_index_ivf(index).nlist
+
+    VectorStoreManager.add_documents(make_chunks("a", [f"第{i}段讲述了话题{i}。" for i in range(40)]))
+    wait_for_writes()
+    assert nlist() == 1
+    VectorStoreManager.add_documents(make_chunks("b", [f"第{i}条记录了事件{i}。" for i in range(80)]))
+    wait_for_writes()
+    assert nlist() == 3
+    assert VectorStoreManager.stats()["vectors"] == ChunkStore.count() == 120
@@ -1,15 +1,19 @@
 export interface ChatRequest {
   question: string;
   doc_id?: string;
+  doc_ids?: string[]; // restrict retrieval to these documents
   top_k?: number;
-  threshold?: number;
+  threshold?: number; // minimum similarity of a retrieved chunk
+  // 'delta': answer steps carry only new text, 'full': the whole answer so far
+  stream_mode?: 'delta' | 'full';
 }
 
 export interface ChatStep {
   step: 'init' | 'retrieving' | 'retrieved' | 'generating' | 'answer' | 'completed' | 'error';
   message?: string;
-  data?: any; // sources or answer content
+  data?: any; // sources, answer delta, or full answer on 'completed'
   done?: boolean;
+  timings?: Record<string, number>; // ms per stage on 'completed'; first_token is from request start
 }
 
 // Stream reader helper
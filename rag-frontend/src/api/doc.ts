@@ -3,10 +3,32 @@ import request from '@/utils/request'
 export interface UploadResponse {
   status: string
   doc_id: string
-  length: number
+  length?: number
+  job_id?: string
   message?: string
 }
 
+export interface JobStatus {
+  id: string
+  doc_id: string
+  name: string
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled'
+  stage: string
+  chunks_total: number
+  chunks_indexed: number
+  error?: string
+  timings: Record<string, number>
+  created_at: number
+  finished_at?: number
+}
+
+export const getJob = async (jobId: string) => {
+  return request<any, JobStatus>({
+    url: `/jobs/${jobId}`,
+    method: 'get'
+  })
+}
+
 export function uploadDocument(formData: FormData) {
   return request<any, UploadResponse>({
     url: '/upload',
@@ -47,12 +69,16 @@ export const reindexDoc = async (docId: string) => {
 
 export interface DocContentResponse {
   content: string
+  offset: number
+  total: number
+  has_more: boolean
 }
 
-export const getDocContent = async (docId: string) => {
+export const getDocContent = async (docId: string, params?: { offset?: number; limit?: number }) => {
   return request<any, DocContentResponse>({
     url: `/docs/content/${docId}`,
-    method: 'get'
+    method: 'get',
+    params
   })
 }
 
@@ -15,6 +15,7 @@ export interface Message {
   loading?: boolean
   process?: ProcessStep[]
   showProcess?: boolean
+  timings?: Record<string, number>
 }
 
 export const useChatStore = defineStore('chat', () => {
@@ -42,7 +43,7 @@ export const useChatStore = defineStore('chat', () => {
     loading.value = true
 
     try {
-      await streamChat({ question }, (step: ChatStep) => {
+      await streamChat({ question, stream_mode: 'delta' }, (step: ChatStep) => {
         const currentProcess = assistantMsg.value.process || []
         
         // Update previous step status to done
@@ -80,15 +81,20 @@ export const useChatStore = defineStore('chat', () => {
             if (generatingStep) {
                generatingStep.status = 'done'
             }
-            // Append answer content
+            // Append answer delta
             if (step.data) {
-               assistantMsg.value.content = step.data 
+               assistantMsg.value.content += step.data
             }
             // Collapse process when answer starts streaming
             assistantMsg.value.showProcess = false
             break
             
           case 'completed':
+            // Completed carries the full answer; trust it over the appended deltas
+            if (step.data) {
+               assistantMsg.value.content = step.data
+            }
+            assistantMsg.value.timings = step.timings
             loading.value = false
             assistantMsg.value.loading = false
             break